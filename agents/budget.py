@@ -0,0 +1,188 @@
+"""
+Prompt token budgets.
+
+Prompt sizes are estimated locally (characters / BUDGET_CHARS_PER_TOKEN)
+before each LLM call, and the variable parts are fitted to the calling
+node's budget:
+
+- Researcher: retrieval depth (k) follows the per-step budget, and the
+  retrieved evidence is packed best-ranked first; the first block that
+  does not fit is cut, the rest dropped.
+- Writer / Verifier: research notes are trimmed one fact line at a time
+  from the longest note, dropping its least relevant fact first
+  (fact_score: uncited lines, then the fewest words of the plan step),
+  until the prompt fits; the critique carried into a revision is capped.
+
+What was dropped is reported in each node's metrics. TOKEN_BUDGET=0 turns
+budgeting off.
+"""
+import math
+import os
+import re
+
+from agents.evidence import cited_ids, format_evidence_index
+
+_WORD_RE = re.compile(r"[a-z0-9]{3,}")
+
+TOKEN_BUDGET_ENABLED = os.environ.get("TOKEN_BUDGET", "1") == "1"
+CHARS_PER_TOKEN = float(os.environ.get("BUDGET_CHARS_PER_TOKEN", "4"))
+
+# Prompt tokens per LLM call (the Researcher's is per plan step)
+TOKEN_BUDGETS = {
+    "Researcher": int(os.environ.get("TOKEN_BUDGET_RESEARCHER", "3000")),
+    "Writer": int(os.environ.get("TOKEN_BUDGET_WRITER", "12000")),
+    "Verifier": int(os.environ.get("TOKEN_BUDGET_VERIFIER", "8000")),
+}
+
+# Retrieval depth bounds, and the estimated size of one evidence block
+# (a 2000-character chunk plus its header)
+RETRIEVAL_MIN_K = int(os.environ.get("RETRIEVAL_MIN_K", "2"))
+RETRIEVAL_MAX_K = int(os.environ.get("RETRIEVAL_MAX_K", "8"))
+CHUNK_TOKENS = int(os.environ.get("BUDGET_CHUNK_TOKENS", "530"))
+# A cut evidence block shorter than this is dropped instead
+MIN_PARTIAL_TOKENS = 100
+CRITIQUE_MAX_TOKENS = int(os.environ.get("BUDGET_CRITIQUE_TOKENS", "400"))
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def budget_for(agent):
+    """
+    Prompt token budget of `agent`, or None when budgeting is off.
+    """
+    return TOKEN_BUDGETS.get(agent) if TOKEN_BUDGET_ENABLED else None
+
+def adaptive_k(budget, overhead, default=5):
+    """
+    How many chunks fit in `budget` tokens next to `overhead` tokens of
+    fixed prompt, within [RETRIEVAL_MIN_K, RETRIEVAL_MAX_K].
+    """
+    if budget is None:
+        return default
+    return max(RETRIEVAL_MIN_K, min(RETRIEVAL_MAX_K, (budget - overhead) // CHUNK_TOKENS))
+
+def pack_blocks(blocks, budget, separator="\n"):
+    """
+    Keeps ranked blocks (best first) while they fit in `budget` tokens.
+    The first block that doesn't fit is cut to the remaining space (if at
+    least MIN_PARTIAL_TOKENS remain); the rest are dropped.
+
+    Returns (kept blocks, {"blocks": dropped, "cut": 0/1, "tokens": dropped tokens}).
+    """
+    if budget is None:
+        return list(blocks), {"blocks": 0, "cut": 0, "tokens": 0}
+    limit = int(budget * CHARS_PER_TOKEN)
+    kept = []
+    used = 0
+    dropped = {"blocks": 0, "cut": 0, "tokens": 0}
+    for n, block in enumerate(blocks):
+        cost = len(block) + (len(separator) if kept else 0)
+        if used + cost <= limit:
+            kept.append(block)
+            used += cost
+            continue
+        room = limit - used - (len(separator) if kept else 0)
+        rest = blocks[n:]
+        if room >= MIN_PARTIAL_TOKENS * CHARS_PER_TOKEN:
+            kept.append(block[:room - 4].rstrip() + " ...")
+            dropped["cut"] = 1
+            dropped["tokens"] += estimate_tokens(block[room - 4:])
+            rest = blocks[n + 1:]
+        dropped["blocks"] = len(rest)
+        dropped["tokens"] += sum(estimate_tokens(block) for block in rest)
+        break
+    return kept, dropped
+
+def split_notes(text):
+    """
+    Splits joined research notes back into one block per "### Research for" header.
+    """
+    notes = []
+    for line in text.splitlines():
+        if line.startswith("###") or not notes:
+            notes.append([line])
+        else:
+            notes[-1].append(line)
+    return ["\n".join(lines) for lines in notes]
+
+def fact_score(line, step_terms):
+    """
+    How much a fact line is worth keeping: blank lines nothing, a line
+    citing evidence ([E3]) one point more than an uncited one, plus the
+    share of the plan step's words it contains.
+    """
+    if not line.strip():
+        return -1.0
+    words = set(_WORD_RE.findall(line.lower()))
+    overlap = len(words & step_terms) / len(step_terms) if step_terms else 0.0
+    return (1.0 if cited_ids(line) else 0.0) + overlap
+
+def trim_notes(notes, budget, separator="\n\n"):
+    """
+    Fits research notes (one per plan step: a "### Research for: <step>"
+    header line, then facts) into `budget` tokens. Facts are removed one at
+    a time from whichever note is longest, lowest fact_score first (later
+    lines first on ties), so every step keeps its most relevant cited
+    facts; the remaining lines keep their order. Only if the headers alone
+    don't fit are whole notes dropped, last first.
+
+    Returns (notes, {"lines": dropped fact lines, "notes": dropped notes, "tokens": dropped tokens}).
+    """
+    dropped = {"lines": 0, "notes": 0, "tokens": 0}
+    if budget is None:
+        return list(notes), dropped
+    limit = max(0, int(budget * CHARS_PER_TOKEN))
+    blocks = [note.splitlines() for note in notes]
+    sizes = [len(note) for note in notes]
+    total = sum(sizes) + len(separator) * max(0, len(notes) - 1)
+    # Per note, the fact lines in removal order (worst last, for pop())
+    removable = []
+    for lines in blocks:
+        step_terms = set(_WORD_RE.findall(lines[0].split(":", 1)[-1].lower())) if lines else set()
+        order = sorted(range(1, len(lines)), key=lambda i: (fact_score(lines[i], step_terms), -i), reverse=True)
+        removable.append(order)
+    removed = [set() for _ in blocks]
+    dropped_chars = 0
+    while total > limit:
+        longest = max(range(len(blocks)), key=lambda n: sizes[n] if removable[n] else -1, default=None)
+        if longest is None or not removable[longest]:
+            break
+        index = removable[longest].pop()
+        removed[longest].add(index)
+        line = blocks[longest][index]
+        sizes[longest] -= len(line) + 1
+        total -= len(line) + 1
+        dropped_chars += len(line) + 1
+        if line.strip():
+            dropped["lines"] += 1
+    blocks = [[line for i, line in enumerate(lines) if i not in gone] for lines, gone in zip(blocks, removed)]
+    while total > limit and blocks:
+        lines = blocks.pop()
+        total -= sizes.pop() + (len(separator) if blocks else 0)
+        dropped_chars += len("\n".join(lines))
+        dropped["notes"] += 1
+    dropped["tokens"] = math.ceil(dropped_chars / CHARS_PER_TOKEN)
+    return ["\n".join(lines) for lines in blocks], dropped
+
+def fit_notes(render, notes, evidence, budget, separator="\n\n"):
+    """
+    Builds `render(research_notes, evidence_index)` with the notes trimmed
+    (trim_notes) to what `budget` leaves after the rest of the prompt. The
+    evidence index lists only the IDs the kept notes cite.
+
+    Returns (prompt, dropped) as trim_notes reports it.
+    """
+    all_notes = separator.join(notes)
+    reserved = estimate_tokens(render("", "")) + estimate_tokens(format_evidence_index(evidence, cited_ids(all_notes)))
+    kept, dropped = trim_notes(notes, budget - reserved if budget is not None else None, separator)
+    research_notes = separator.join(kept)
+    return render(research_notes, format_evidence_index(evidence, cited_ids(research_notes))), dropped
+
+def cap_text(text, max_tokens=CRITIQUE_MAX_TOKENS):
+    """
+    `text` cut to `max_tokens` (critique carried into revision prompts).
+    """
+    if not TOKEN_BUDGET_ENABLED or not text:
+        return text
+    limit = int(max_tokens * CHARS_PER_TOKEN)
+    return text if len(text) <= limit else text[:limit - 4].rstrip() + " ..."
@@ -0,0 +1,148 @@
+import difflib
+import re
+
+from agents.evidence import cited_ids
+
+# (Source: DocumentName, Page X), optionally several joined by ";" in one pair of parentheses
+_CITATION_GROUP_RE = re.compile(r"\(\s*Source:\s*([^()]*?)\)", re.IGNORECASE)
+_CITATION_RE = re.compile(r"(?:Source:\s*)?(.+?),\s*Pages?\s*([^;,]+)", re.IGNORECASE)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z\"'*\[])")
+# Figures worth a citation: percentages, currency amounts, multi-digit numbers
+_FIGURE_RE = re.compile(r"\d+(?:\.\d+)?\s*%|[$€£]\s*\d|\b\d{2,}(?:[.,]\d+)?\b")
+_YEAR_RE = re.compile(r"\b(?:19|20)\d{2}\b")
+_PAGE_REF_RE = re.compile(r"\bpages?\s*\d", re.IGNORECASE)
+
+NOT_FOUND_MARKER = "not found in sources"
+
+def normalize_source(name):
+    name = re.sub(r"\.pdf$", "", str(name).strip().lower())
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", name).split())
+
+def page_numbers(page):
+    return {int(n) for n in re.findall(r"\d+", str(page))}
+
+def source_matches(cited, known):
+    """
+    Fuzzy document-name match: the Writer tends to drop extensions and
+    underscores, or shorten a file name to its title.
+    """
+    cited, known = normalize_source(cited), normalize_source(known)
+    if not cited or not known:
+        return False
+    if cited == known or set(cited.split()) <= set(known.split()) or set(known.split()) <= set(cited.split()):
+        return True
+    return difflib.SequenceMatcher(None, cited, known).ratio() >= 0.85
+
+def extract_claims(draft):
+    """
+    Splits a draft into claims (sentences, list items, table rows) and parses
+    the (Source: X, Page Y) citations attached to each.
+
+    Returns [{"claim": str, "citations": [{"source", "page"}]}]. Headings and
+    "Not found in sources" statements are skipped.
+    """
+    claims = []
+    for line in draft.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or set(line) <= set("-|: "):
+            continue
+        segments = [line] if line.startswith("|") else _SENTENCE_SPLIT_RE.split(line)
+        for segment in segments:
+            if NOT_FOUND_MARKER in segment.lower():
+                continue
+            citations = []
+            for group in _CITATION_GROUP_RE.findall(segment):
+                for part in group.split(";"):
+                    match = _CITATION_RE.search(part.strip())
+                    if match:
+                        citations.append({"source": match.group(1).strip(), "page": match.group(2).strip()})
+            text = re.sub(r"\s+([.,;:])", r"\1", _CITATION_GROUP_RE.sub("", segment)).strip()
+            if text or citations:
+                claims.append({"claim": text, "citations": citations})
+    return claims
+
+def has_uncited_figure(claim):
+    """
+    A sentence quoting a statistic (outside of tables, which hold owners,
+    dates and confidence scores, and source listings) should carry a citation.
+    """
+    text = claim["claim"]
+    if text.startswith("|") or claim["citations"] or _PAGE_REF_RE.search(text):
+        return False
+    return bool(_FIGURE_RE.search(_YEAR_RE.sub("", text)))
+
+def check_citations(draft, research_notes, evidence):
+    """
+    Matches every citation in the draft against the evidence the research
+    notes cite (by evidence ID), plus any (Source, Page) citations written in
+    the notes directly.
+
+    Returns a report:
+        {"claims": [{"claim", "citations": [{"source", "page", "status"}], "status"}],
+         "cited_claims": int, "citations": int, "flagged": [claim, ...]}
+    Citation status is "ok", "unknown_source" (no such document in the
+    notes) or "unknown_page" (document is cited, page is not). A claim is
+    flagged if any citation fails or it quotes a figure without a citation.
+    """
+    backed = {}
+    for evidence_id in cited_ids(research_notes):
+        entry = evidence.get(evidence_id)
+        if entry:
+            backed.setdefault(entry["source"], set()).update(page_numbers(entry["page"]))
+    for claim in extract_claims(research_notes):
+        for citation in claim["citations"]:
+            backed.setdefault(citation["source"], set()).update(page_numbers(citation["page"]))
+
+    report = {"claims": [], "cited_claims": 0, "citations": 0, "flagged": []}
+    for claim in extract_claims(draft):
+        flagged = has_uncited_figure(claim)
+        for citation in claim["citations"]:
+            sources = [source for source in backed if source_matches(citation["source"], source)]
+            if not sources:
+                citation["status"] = "unknown_source"
+            elif page_numbers(citation["page"]) & set().union(*(backed[source] for source in sources)):
+                citation["status"] = "ok"
+            else:
+                citation["status"] = "unknown_page"
+            flagged = flagged or citation["status"] != "ok"
+        claim["status"] = "flagged" if flagged else "ok"
+        report["claims"].append(claim)
+        report["citations"] += len(claim["citations"])
+        report["cited_claims"] += 1 if claim["citations"] else 0
+        if flagged:
+            report["flagged"].append(claim)
+    return report
+
+def format_flagged_claims(flagged):
+    lines = []
+    for i, claim in enumerate(flagged, start=1):
+        problems = [
+            f"(Source: {c['source']}, Page {c['page']}) -> {c['status']}" for c in claim["citations"] if c["status"] != "ok"
+        ] or ["statistic without citation"]
+        section = f"[{claim['section']}] " if claim.get("section") else ""
+        lines.append(f"{i}. {section}{claim['claim']}\n   Issues: {'; '.join(problems)}")
+    return "\n".join(lines)
+
+def relevant_notes(research_notes, evidence, flagged):
+    """
+    Note lines whose evidence comes from a document cited by a flagged
+    claim. Falls back to all notes when a flagged claim names no known
+    document (or has no citation at all), since any note may back it.
+    """
+    cited_sources = [c["source"] for claim in flagged for c in claim["citations"]]
+    if not cited_sources or any(c["status"] == "unknown_source" for claim in flagged for c in claim["citations"]):
+        return research_notes
+    lines = []
+    for line in research_notes.splitlines():
+        sources = [evidence[i]["source"] for i in cited_ids(line) if i in evidence]
+        if line.startswith("###") or any(source_matches(c, s) for c in cited_sources for s in sources):
+            lines.append(line)
+    return "\n".join(lines)
+
+def parse_verdict(critique):
+    """
+    "approve" or "revise" from the Verifier's reply, tolerating markdown
+    emphasis around the leading keyword.
+    """
+    first_word = critique.strip().lstrip("*_`\"' ").upper()
+    return "approve" if first_word.startswith("APPROVE") else "revise"
@@ -0,0 +1,80 @@
+import hashlib
+import re
+
+# Citation tags as written by the Researcher: [E3] or [E3, E7]
+_CITATION_RE = re.compile(r"\[(E\d+(?:\s*,\s*E\d+)*)\]")
+
+def chunk_key(doc):
+    """
+    Identity of a retrieved chunk: its vector-store ID, or a content hash for
+    documents that don't carry one.
+    """
+    if getattr(doc, "id", None):
+        return doc.id
+    digest = hashlib.sha256()
+    digest.update(str(doc.metadata.get("source", "")).encode("utf-8"))
+    digest.update(f"\0{doc.metadata.get('page', '')}\0".encode("utf-8"))
+    digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+def add_documents(evidence, docs):
+    """
+    Registers retrieved chunks in the evidence store and returns their
+    evidence IDs, aligned with `docs`.
+
+    `evidence` maps "E<n>" to {"chunk_id", "source", "page", "text"} and is
+    updated in place. A chunk already in the store keeps its ID, so the same
+    chunk retrieved by several plan steps is stored (and cited) once.
+    """
+    by_chunk = {entry["chunk_id"]: evidence_id for evidence_id, entry in evidence.items()}
+    ids = []
+    for doc in docs:
+        key = chunk_key(doc)
+        if key not in by_chunk:
+            evidence_id = f"E{len(evidence) + 1}"
+            evidence[evidence_id] = {
+                "chunk_id": key,
+                "source": doc.metadata.get("source", "Unknown"),
+                "page": doc.metadata.get("page", "Unknown"),
+                "text": doc.page_content,
+            }
+            by_chunk[key] = evidence_id
+        ids.append(by_chunk[key])
+    return ids
+
+def format_evidence(evidence, ids):
+    """
+    Renders evidence for the Researcher: ID, source and page, then the text.
+    """
+    blocks = []
+    for evidence_id in dict.fromkeys(ids):
+        entry = evidence[evidence_id]
+        content = entry["text"].replace("\n", " ")
+        blocks.append(
+            f"--- EVIDENCE [{evidence_id}] ---\n"
+            f"SOURCE: {entry['source']}, PAGE: {entry['page']}\n"
+            f"CONTENT: {content}\n"
+        )
+    return "\n".join(blocks)
+
+def cited_ids(text):
+    """
+    Evidence IDs cited in `text`, in order of first citation.
+    """
+    found = []
+    for group in _CITATION_RE.findall(text):
+        found.extend(part.strip() for part in group.split(","))
+    return list(dict.fromkeys(found))
+
+def format_evidence_index(evidence, ids=None):
+    """
+    One line per evidence ID with its source and page, no chunk text. This is
+    what the Writer and Verifier see, so citations resolve without repeating
+    the retrieved documents in every prompt.
+    """
+    ids = evidence.keys() if ids is None else ids
+    return "\n".join(
+        f"[{evidence_id}] {evidence[evidence_id]['source']}, Page {evidence[evidence_id]['page']}"
+        for evidence_id in ids
+        if evidence_id in evidence
+    )
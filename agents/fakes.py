@@ -0,0 +1,171 @@
+"""
+Deterministic stand-in for the Gemini chat model.
+
+Answers each agent's prompt with a well-formed reply built from the prompt
+itself (evidence IDs, sources, section names), with simulated latency, so
+the whole graph can run offline. Used by the benchmarks in bench/.
+"""
+import json
+import re
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from retrieval.fakes import LatencyModel
+
+_EVIDENCE_RE = re.compile(r"--- EVIDENCE \[(E\d+)\] ---")
+_INDEX_RE = re.compile(r"^\[(E\d+)\] (.+), Page (.+)$", re.MULTILINE)
+_GOAL_RE = re.compile(r"USER GOAL: (.*)")
+_MARKER_RE = re.compile(r"=== SECTION: (\w+) ===")
+_SOURCE_RE = re.compile(r"^- (.+)$", re.MULTILINE)
+
+# Fake reply is cut into this many streamed chunks
+STREAM_CHUNKS = 20
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for benchmarks.
+
+    Each call sleeps one `latency` sample (time to first token) plus
+    `per_output_token` seconds per generated token. The first
+    `flawed_drafts` drafts written for a task contain an uncited statistic,
+    which the citation check flags and the fake Verifier rejects, so
+    revision loops can be exercised deterministically.
+    """
+
+    model: str = "fake-chat"
+    temperature: float = 0.0
+    latency: Any = None
+    per_output_token: float = 0.0
+    flawed_drafts: int = 0
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _drafts: dict = PrivateAttr(default_factory=dict)
+    _stats: dict = PrivateAttr(default_factory=lambda: {"calls": 0, "simulated_seconds": 0.0})
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    @property
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _next_draft_is_flawed(self, prompt):
+        match = _GOAL_RE.search(prompt)
+        task = match.group(1) if match else ""
+        with self._lock:
+            written = self._drafts.get(task, 0)
+            self._drafts[task] = written + 1
+        return written < self.flawed_drafts
+
+    def _citations(self, prompt):
+        found = _INDEX_RE.findall(prompt)
+        return [f"(Source: {source}, Page {page})" for _, source, page in found] or [""]
+
+    def _sections(self, prompt, names, flawed):
+        citations = self._citations(prompt)
+        cite = lambda i: citations[i % len(citations)]
+        content = {
+            "title": "# Supply Chain Resilience Briefing",
+            "summary": (
+                f"Supply chain leaders are prioritising resilience and visibility {cite(0)}. "
+                f"Digital tooling adoption is accelerating across tiers {cite(1)}. "
+                + ("Logistics costs rose 37% year over year. " if flawed else "")
+                + "\n\n---"
+            ),
+            "email": (
+                "Subject: Supply chain resilience findings\n\n"
+                f"Hi team,\n\nThe reports point to resilience as the top priority {cite(0)}.\n\nBest regards"
+            ),
+            "actions": (
+                "| Action Item | Owner | Due Date | Confidence Score % |\n"
+                "|---|---|---|---|\n"
+                "| Map tier-2 suppliers | Procurement | Q3 | 85% |\n"
+                "| Pilot control tower | Operations | Q4 | 70% |"
+            ),
+            "sources": "\n".join(f"- {c.strip('()').replace('Source: ', '')}" for c in dict.fromkeys(citations) if c),
+        }
+        return "\n".join(f"=== SECTION: {name} ===\n{content[name]}" for name in names if name in content)
+
+    def respond(self, prompt):
+        """
+        The fake's reply for `prompt`, chosen by which agent prompt it is.
+        """
+        if "Security Guard" in prompt:
+            user_input = prompt.split("USER INPUT:", 1)[-1].split("RULES:", 1)[0]
+            return "UNSAFE" if "ignore previous instructions" in user_input.lower() else "SAFE"
+        if "Strategy Planner" in prompt:
+            task = prompt.split("USER REQUEST:", 1)[-1].split("AVAILABLE DOCUMENTS:", 1)[0].strip()
+            available = prompt.split("AVAILABLE DOCUMENTS:", 1)[-1].split("REQUIREMENTS:", 1)[0]
+            # The first step targets the reports the task names
+            named = [
+                name for name in _SOURCE_RE.findall(available)
+                if name.lower().removesuffix(".pdf") in task.lower()
+            ]
+            steps = [
+                {"query": f"{task} key statistics", "sources": named},
+                {"query": f"{task} main risks", "sources": []},
+                {"query": f"{task} recommended actions", "sources": []},
+            ]
+            return json.dumps({"steps": steps})
+        if "Senior Supply Chain Researcher" in prompt:
+            ids = list(dict.fromkeys(_EVIDENCE_RE.findall(prompt)))[:3]
+            if not ids:
+                return "No relevant information found."
+            return "\n".join(f"- Finding {n} on resilience and visibility [{evidence_id}]" for n, evidence_id in enumerate(ids, 1))
+        if "Rewrite ONLY those sections" in prompt:
+            rewrite = prompt.split("SECTIONS TO REWRITE", 1)[-1].split("FEEDBACK TO FIX", 1)[0]
+            names = list(dict.fromkeys(_MARKER_RE.findall(rewrite)))
+            return self._sections(prompt, names, self._next_draft_is_flawed(prompt))
+        if "Write a final deliverable" in prompt:
+            names = ["title", "summary", "email", "actions", "sources"]
+            return self._sections(prompt, names, self._next_draft_is_flawed(prompt))
+        if "Compliance Auditor" in prompt:
+            if "statistic without citation" in prompt:
+                return "REVISE: [summary] The 37% cost figure has no supporting citation."
+            return "APPROVE"
+        return "OK"
+
+    def _reply(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = self.respond(prompt)
+        usage = {
+            "input_tokens": max(1, len(prompt) // 4),
+            "output_tokens": max(1, len(text) // 4),
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return text, usage
+
+    def _simulate(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+        with self._lock:
+            self._stats["simulated_seconds"] += seconds
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+        with self._lock:
+            self._stats["calls"] += 1
+        self._simulate((self.latency or LatencyModel()).sample() + self.per_output_token * usage["output_tokens"])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text, usage_metadata=usage))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, usage = self._reply(messages)
+        with self._lock:
+            self._stats["calls"] += 1
+        self._simulate((self.latency or LatencyModel()).sample())
+        size = max(1, len(text) // STREAM_CHUNKS + 1)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+        for i, piece in enumerate(pieces):
+            self._simulate(self.per_output_token * usage["output_tokens"] / len(pieces))
+            chunk = AIMessageChunk(content=piece, usage_metadata=usage if i == len(pieces) - 1 else None)
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
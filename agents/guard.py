@@ -0,0 +1,284 @@
+"""
+Local tiers of the Defense check.
+
+1. Verdict cache, keyed by the hash of the normalized input.
+2. Pattern rules that reject well-known prompt-injection phrasings.
+3. A small Naive Bayes classifier over word unigrams/bigrams, trained
+   offline on agents/defense_examples.jsonl:
+
+       python agents/guard.py --train
+
+The classifier rejects confidently unsafe inputs, but accepts only inputs
+with no instruction-like wording (INSTRUCTION_CUES): domain words around a
+short injected instruction can outweigh it. Everything else goes on to the
+LLM check.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AGENTS_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLES_PATH = os.path.join(AGENTS_DIR, "defense_examples.jsonl")
+MODEL_PATH = os.path.join(AGENTS_DIR, "defense_model.json")
+
+CACHE_DIR = os.environ.get("CACHE_DIR", "./.cache")
+VERDICT_CACHE_PATH = os.path.join(CACHE_DIR, "defense_verdicts.sqlite")
+VERDICT_CACHE_ENABLED = os.environ.get("DEFENSE_CACHE", "1") == "1"
+VERDICT_CACHE_TTL = float(os.environ.get("DEFENSE_CACHE_TTL", str(30 * 24 * 3600)))
+
+# Classifier probability of "unsafe" below which an input is accepted and
+# above which it is rejected locally; anything in between goes to the LLM.
+# Accepting is the costly mistake, so its threshold is the stricter one.
+DEFENSE_SAFE_BELOW = float(os.environ.get("DEFENSE_SAFE_BELOW", "0.01"))
+DEFENSE_UNSAFE_ABOVE = float(os.environ.get("DEFENSE_UNSAFE_ABOVE", "0.95"))
+
+_ZERO_WIDTH_RE = re.compile(r"[\u200b-\u200f\u2060\ufeff]")
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Wording that addresses the assistant itself, tries to steer it, or asks
+# for output other than supply chain analysis. Not a reason to block (the
+# same words occur in real requests), only to never accept without the LLM.
+INSTRUCTION_CUES = re.compile(
+    r"\b(ignore|disregard|forget|override|bypass|instead|afterwards?|verbatim|word for word|"
+    r"prompts?|instructions?|rules|guidelines|context window|configuration|api keys?|"
+    r"you are|your (context|memory|training|settings|purpose)|who are you|"
+    r"pretend|role ?play|act as|jailbreak|developer mode|"
+    r"malware|virus|ransomware|exploit|hack\w*|phishing|passwords?|credentials?|"
+    r"code|script|python|javascript|sql|shell|print|echo|repeat)\b"
+)
+
+# Phrasings that are never a legitimate supply chain request
+BLOCK_RULES = [
+    ("ignore_instructions", re.compile(
+        r"\b(ignore|disregard|forget|override|bypass)\b.{0,40}\b(instructions?|rules|prompts?|guidelines|above|everything)\b")),
+    ("reveal_prompt", re.compile(
+        r"\b(reveal|print|show|repeat|output|list|leak|tell me)\b.{0,40}\b(system prompt|initial prompt|hidden (rules|instructions)|your (instructions|rules|prompt))\b")),
+    ("persona_override", re.compile(
+        r"\b(you are now|from now on you|pretend (you are|to be)|roleplay as|act as an? (unfiltered|unrestricted|evil))\b")),
+    ("jailbreak", re.compile(r"\b(jailbreak|developer mode|dan mode|do anything now|no restrictions)\b")),
+]
+
+def normalize_input(text):
+    """
+    Canonical form for rules, classifier and cache key: Unicode-normalized
+    (so look-alike characters match), zero-width characters removed,
+    lowercased, whitespace collapsed.
+    """
+    text = unicodedata.normalize("NFKC", str(text))
+    text = _ZERO_WIDTH_RE.sub("", text).lower()
+    return " ".join(text.split())
+
+def input_hash(normalized, version=""):
+    return hashlib.sha256(f"{version}\0{normalized}".encode("utf-8")).hexdigest()
+
+def match_rules(normalized):
+    """
+    Name of the first block rule the input matches, or None.
+    """
+    for name, pattern in BLOCK_RULES:
+        if pattern.search(normalized):
+            return name
+    return None
+
+def instruction_cue(normalized):
+    """
+    First instruction-like phrase in the input, or None.
+    """
+    match = INSTRUCTION_CUES.search(normalized)
+    return match.group(0) if match else None
+
+def cache_version(classifier):
+    """
+    Part of the verdict cache key: changes with the trained model and with
+    the rules, cues and thresholds, so a changed guard never reuses
+    verdicts the old one made.
+    """
+    config = [pattern.pattern for _, pattern in BLOCK_RULES]
+    config += [INSTRUCTION_CUES.pattern, DEFENSE_SAFE_BELOW, DEFENSE_UNSAFE_ABOVE]
+    digest = hashlib.sha256(json.dumps(config).encode("utf-8")).hexdigest()[:12]
+    return f"{classifier.version if classifier else ''}:{digest}"
+
+def features(normalized):
+    tokens = _TOKEN_RE.findall(normalized)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+class LexicalClassifier:
+    """
+    Multinomial Naive Bayes over unigrams and bigrams (add-one smoothing).
+    The trained model is a JSON file of per-feature log-likelihood ratios.
+    """
+
+    def __init__(self, weights=None, prior=0.0, version=""):
+        self.weights = weights or {}
+        self.prior = prior
+        self.version = version
+
+    @classmethod
+    def train(cls, examples, alpha=1.0):
+        counts = {"safe": {}, "unsafe": {}}
+        docs = {"safe": 0, "unsafe": 0}
+        for text, label in examples:
+            docs[label] += 1
+            for feature in features(normalize_input(text)):
+                counts[label][feature] = counts[label].get(feature, 0) + 1
+        vocab = set(counts["safe"]) | set(counts["unsafe"])
+        totals = {label: sum(c.values()) + alpha * (len(vocab) + 1) for label, c in counts.items()}
+        weights = {
+            feature: math.log((counts["unsafe"].get(feature, 0) + alpha) / totals["unsafe"])
+            - math.log((counts["safe"].get(feature, 0) + alpha) / totals["safe"])
+            for feature in vocab
+        }
+        prior = math.log((docs["unsafe"] + 1) / (docs["safe"] + 1))
+        digest = hashlib.sha256(json.dumps([weights, prior], sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        return cls(weights, prior, version=digest)
+
+    def score(self, normalized):
+        """
+        Probability that the input is unsafe. Unseen features are ignored,
+        so inputs with little known vocabulary stay near the prior.
+        """
+        log_odds = self.prior + sum(self.weights.get(feature, 0.0) for feature in features(normalized))
+        log_odds = max(-50.0, min(50.0, log_odds))
+        return 1 / (1 + math.exp(-log_odds))
+
+    def save(self, path=MODEL_PATH):
+        with open(path, "w") as f:
+            json.dump({
+                "version": self.version,
+                "prior": self.prior,
+                "weights": {k: round(v, 4) for k, v in sorted(self.weights.items())},
+            }, f, indent=0)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["weights"], data["prior"], data["version"])
+
+class VerdictCache:
+    """
+    SQLite map from normalized-input hash to verdict
+    ({"is_safe", "method", "score"}), expired after `ttl` seconds.
+    """
+
+    def __init__(self, path=VERDICT_CACHE_PATH, ttl=VERDICT_CACHE_TTL):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT verdict, created FROM verdicts WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key, verdict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created) VALUES (?, ?, ?)",
+                (key, json.dumps(verdict), time.time())
+            )
+            self._conn.commit()
+
+_classifier = None
+_verdict_cache = None
+_init_lock = threading.Lock()
+
+def get_classifier():
+    """
+    The trained classifier, or None if agents/defense_model.json is missing
+    (every input not caught by the rules then goes to the LLM).
+    """
+    global _classifier
+    if _classifier is None:
+        with _init_lock:
+            if _classifier is None and os.path.exists(MODEL_PATH):
+                _classifier = LexicalClassifier.load(MODEL_PATH)
+    return _classifier
+
+def get_verdict_cache():
+    global _verdict_cache
+    if _verdict_cache is None:
+        with _init_lock:
+            if _verdict_cache is None:
+                _verdict_cache = VerdictCache()
+    return _verdict_cache
+
+def local_verdict(normalized):
+    """
+    Rules, then classifier. Returns {"is_safe": bool | None, "method", "score"};
+    is_safe is None when the input needs the LLM: the classifier is unsure,
+    or it scores the input safe but the input contains instruction-like
+    wording.
+    """
+    rule = match_rules(normalized)
+    if rule:
+        return {"is_safe": False, "method": f"rules:{rule}", "score": 1.0}
+    classifier = get_classifier()
+    if classifier is None:
+        return {"is_safe": None, "method": "llm", "score": None}
+    score = classifier.score(normalized)
+    if score < DEFENSE_SAFE_BELOW and instruction_cue(normalized) is None:
+        return {"is_safe": True, "method": "classifier", "score": score}
+    if score > DEFENSE_UNSAFE_ABOVE:
+        return {"is_safe": False, "method": "classifier", "score": score}
+    return {"is_safe": None, "method": "llm", "score": score}
+
+def load_examples(path=EXAMPLES_PATH):
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], row["label"]) for row in rows]
+
+def evaluate(examples):
+    """
+    Leave-one-out evaluation of the local tiers: how many inputs each one
+    decides, and how many of those decisions are wrong.
+    """
+    report = {"decided": 0, "wrong": 0, "ambiguous": 0}
+    for i, (text, label) in enumerate(examples):
+        normalized = normalize_input(text)
+        if match_rules(normalized):
+            decided_safe = False
+        else:
+            score = LexicalClassifier.train(examples[:i] + examples[i + 1:]).score(normalized)
+            decided_safe = score < DEFENSE_SAFE_BELOW and instruction_cue(normalized) is None
+            if not decided_safe and score <= DEFENSE_UNSAFE_ABOVE:
+                report["ambiguous"] += 1
+                continue
+        report["decided"] += 1
+        if decided_safe != (label == "safe"):
+            report["wrong"] += 1
+            print(f"  ! Misclassified ({label}): {text}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the Defense agent's local classifier.")
+    parser.add_argument("--train", action="store_true", help="Train on the examples and write the model.")
+    parser.add_argument("--examples", default=EXAMPLES_PATH)
+    parser.add_argument("--output", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    examples = load_examples(args.examples)
+    print(f"{len(examples)} labeled examples. Leave-one-out check of the local tiers:")
+    print(f"  {evaluate(examples)}")
+    if args.train:
+        model = LexicalClassifier.train(examples)
+        model.save(args.output)
+        print(f"Model {model.version} ({len(model.weights)} features) saved to {args.output}")
@@ -0,0 +1,164 @@
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from agents.llm_cache import cached_invoke
+from retrieval.rate_limit import AdaptiveRateLimiter, is_rate_limit_error
+from langgraph.config import get_config, get_stream_writer
+from tracing import span
+import contextvars
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL_NAME = os.environ.get("MODEL_NAME", "gemini-3-flash-preview")
+
+# Process-wide budget shared by every agent, parallel research step, eval
+# worker and Streamlit session in this process.
+LLM_TOKENS_PER_MINUTE = float(os.environ.get("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "6"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Units are estimated tokens. Starts at the configured budget and only
+# adapts downwards from there if the API answers 429.
+limiter = AdaptiveRateLimiter(
+    rate=LLM_TOKENS_PER_MINUTE / 60,
+    max_rate=LLM_TOKENS_PER_MINUTE / 60,
+    concurrency=LLM_MAX_CONCURRENCY,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    burst_seconds=1.0,
+    quota_window=60.0
+)
+
+def get_llm(temperature=0):
+    """
+    Returns the shared chat client for `temperature`, creating it on first use.
+    One client per (model, temperature) means connections are reused across
+    all agents instead of each module holding its own.
+    """
+    key = (MODEL_NAME, float(temperature))
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = ChatGoogleGenerativeAI(
+                model=MODEL_NAME,
+                temperature=temperature,
+                google_api_key=os.environ["GOOGLE_API_KEY"]
+            )
+        return _clients[key]
+
+def content_text(content):
+    if isinstance(content, list):
+        full_text = []
+        for part in content:
+            if isinstance(part, dict) and "text" in part:
+                full_text.append(part["text"])
+            elif isinstance(part, str):
+                full_text.append(part)
+        return "".join(full_text)
+    return str(content)
+
+def clean_gemini_response(response):
+    return content_text(response.content)
+
+def extract_usage(response):
+    """
+    Robust token usage extraction to handle different response structures.
+    Returns (input_tokens, output_tokens).
+    """
+    usage = response.usage_metadata or response.response_metadata.get("usage_metadata", {}) or {}
+    input_tokens = usage.get("input_tokens", 0) or usage.get("prompt_token_count", 0)
+    output_tokens = usage.get("output_tokens", 0) or usage.get("candidates_token_count", 0)
+    return input_tokens, output_tokens
+
+def estimate_tokens(messages):
+    # ~4 characters per token is close enough for budgeting
+    return max(1, sum(len(str(m.content)) for m in messages) // 4)
+
+def token_stream(agent, **fields):
+    """
+    Returns a callback that forwards LLM tokens to the graph's "custom" stream
+    as {"agent", "token", **fields} events, or None unless the run was started
+    with config={"configurable": {"stream_tokens": True}}.
+    Must be called in the node itself: worker threads don't inherit the run
+    context, so the callback carries its own copy of it. Use one callback per
+    thread.
+    """
+    try:
+        config = get_config()
+    except RuntimeError:
+        return None
+    # Opt-in per run: callers that don't render tokens keep plain invoke()
+    if not config.get("configurable", {}).get("stream_tokens"):
+        return None
+    writer = get_stream_writer()
+    context = contextvars.copy_context()
+    return lambda text: context.run(writer, {"agent": agent, "token": text, **fields})
+
+def _stream(llm, messages, on_token):
+    response = None
+    for chunk in llm.stream(messages):
+        response = chunk if response is None else response + chunk
+        text = content_text(chunk.content)
+        if text:
+            on_token(text)
+    return response if response is not None else AIMessageChunk(content="")
+
+def governed_invoke(llm, messages, on_token=None):
+    """
+    llm.invoke behind the process-wide limiter: waits for budget and a
+    concurrency slot (backpressure), and retries 429s after the limiter
+    has backed off. With `on_token`, the response is streamed and each text
+    chunk is passed to it as it arrives.
+    """
+    units = estimate_tokens(messages)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        limiter.acquire(units)
+        try:
+            response = _stream(llm, messages, on_token) if on_token else llm.invoke(messages)
+        except Exception as e:
+            if is_rate_limit_error(e) and attempt < LLM_MAX_RETRIES:
+                print(f"    ! LLM rate limit hit. Backing off (attempt {attempt + 1}/{LLM_MAX_RETRIES})...")
+                limiter.on_rate_limited()
+                continue
+            limiter.on_error()
+            raise
+        finally:
+            limiter.release()
+        input_tokens, output_tokens = extract_usage(response)
+        limiter.on_success(input_tokens + output_tokens or units)
+        return response
+
+def call_llm(prompt, temperature=0, use_cache=None, on_token=None):
+    """
+    Single entry point for every agent's LLM call.
+
+    Goes through the response cache and the shared rate governor and
+    returns a normalized result:
+        {"text", "input_tokens", "output_tokens", "total_tokens", "cache_hit"}
+    `on_token` (see token_stream) receives the text as it is generated; a
+    cached response is delivered to it in one piece. Each call is traced as
+    an "llm" span with its token counts and cache hit.
+    """
+    llm = get_llm(temperature)
+    messages = [HumanMessage(content=prompt)]
+    with span("llm", kind="llm", model=MODEL_NAME, temperature=temperature,
+              prompt_chars=len(prompt), streamed=on_token is not None) as llm_span:
+        response, cache_hit = cached_invoke(
+            llm, messages, use_cache=use_cache,
+            invoke=lambda msgs: governed_invoke(llm, msgs, on_token=on_token)
+        )
+        text = clean_gemini_response(response)
+        if cache_hit and on_token and text:
+            on_token(text)
+        input_tokens, output_tokens = extract_usage(response)
+        llm_span.set(input_tokens=input_tokens, output_tokens=output_tokens, cache_hit=cache_hit)
+    return {
+        "text": text,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+        "cache_hit": cache_hit,
+    }
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from langchain_core.messages import AIMessage
+
+# On-disk response cache shared by every agent node
+CACHE_DIR = os.environ.get("CACHE_DIR", "./.cache")
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_responses.sqlite")
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") == "1"
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+# Sampling at temperature > 0 is meant to vary, so those calls bypass the
+# cache unless explicitly opted in.
+LLM_CACHE_NONZERO_TEMPERATURE = os.environ.get("LLM_CACHE_NONZERO_TEMPERATURE", "0") == "1"
+
+def prompt_key(model, temperature, messages):
+    """
+    Cache key: model name + temperature + hash of the full prompt.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{model}\0{float(temperature or 0)}\0".encode("utf-8"))
+    for message in messages:
+        digest.update(f"{message.type}\0".encode("utf-8"))
+        digest.update(json.dumps(message.content, sort_keys=True).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class LLMResponseCache:
+    """
+    SQLite-backed cache of LLM responses (text + usage metadata).
+
+    Entries older than `ttl` seconds are treated as misses and purged; once
+    `max_entries` is exceeded the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, content TEXT NOT NULL, usage TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, usage, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return {"content": row[0], "usage": json.loads(row[1])}
+
+    def put(self, key, content, usage):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, usage, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, content, json.dumps(usage), now, now)
+            )
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": entries, "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """
+    Returns the process-wide LLMResponseCache, creating it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache()
+    return _cache
+
+def cache_allowed(temperature):
+    if not LLM_CACHE_ENABLED:
+        return False
+    return not temperature or LLM_CACHE_NONZERO_TEMPERATURE
+
+def cached_invoke(llm, messages, use_cache=None, invoke=None):
+    """
+    Drop-in for llm.invoke(messages) that serves repeated prompts from the
+    response cache. Returns (response, cache_hit).
+
+    A cached response is an AIMessage with the original text and zero token
+    usage, since nothing was spent on it. `use_cache` overrides the default
+    policy (on for temperature 0, off otherwise). `invoke` replaces
+    llm.invoke for misses (e.g. a rate-governed call).
+    """
+    invoke = invoke or llm.invoke
+    temperature = getattr(llm, "temperature", 0)
+    if use_cache is None:
+        use_cache = cache_allowed(temperature)
+    if not use_cache:
+        return invoke(messages), False
+
+    cache = get_llm_cache()
+    key = prompt_key(getattr(llm, "model", ""), temperature, messages)
+    cached = cache.get(key)
+    if cached is not None:
+        response = AIMessage(
+            content=cached["content"],
+            usage_metadata={"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+            response_metadata={"cached_usage": cached["usage"]}
+        )
+        return response, True
+
+    response = invoke(messages)
+    content = response.content
+    if isinstance(content, list):
+        content = "".join(
+            part["text"] if isinstance(part, dict) else str(part)
+            for part in content
+            if isinstance(part, str) or (isinstance(part, dict) and "text" in part)
+        )
+    usage = dict(response.usage_metadata or response.response_metadata.get("usage_metadata", {}) or {})
+    cache.put(key, str(content), usage)
+    return response, False
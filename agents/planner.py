@@ -1,68 +1,90 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 from agents.state import AgentState
+from agents.llm import call_llm, token_stream
 from agents.prompts import PLANNER_PROMPT
+from retrieval.retriever import get_retriever, match_sources
+from tracing import span
 import json
-import os
 import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
-    model=os.environ.get("MODEL_NAME", "gemini-3-flash-preview"),
-    temperature=0,
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+def available_sources():
+    """
+    Source files the Planner may target; empty if the index can't be read.
+    """
+    try:
+        return get_retriever().sources()
+    except Exception as e:
+        print(f"  ! Could not list indexed sources: {e}")
+        return []
 
-def clean_gemini_response(response):
-    content = response.content
-    if isinstance(content, list):
-        full_text = []
-        for part in content:
-            if isinstance(part, dict) and "text" in part:
-                full_text.append(part["text"])
-            elif isinstance(part, str):
-                full_text.append(part)
-        return "".join(full_text)
-    return str(content)
+def parse_steps(steps, available):
+    """
+    Plan steps as (query, sources) pairs. Accepts {"query", "sources"}
+    objects and plain strings; source names are matched against the index.
+    """
+    parsed = []
+    for step in steps:
+        if isinstance(step, dict):
+            query = str(step.get("query") or step.get("step") or "").strip()
+            names = step.get("sources") or []
+        else:
+            query, names = str(step).strip(), []
+        if query:
+            parsed.append((query, match_sources(names if isinstance(names, list) else [names], available)))
+    return parsed
 
-def planner_node(state: AgentState):
+def planner_node(state: AgentState, stream=True):
+    """
+    `stream=False` keeps the plan off the token stream (speculative runs,
+    whose output must not be shown before the Defense verdict).
+    """
     print("--- PLANNER AGENT ---")
     start_time = time.time()
     task = state["task"]
+    available = available_sources()
     
-    formatted_prompt = PLANNER_PROMPT.format(task=task)
-    response = llm.invoke([HumanMessage(content=formatted_prompt)])
+    formatted_prompt = PLANNER_PROMPT.format(
+        task=task,
+        sources="\n".join(f"- {source}" for source in available) or "(not available: leave sources empty)"
+    )
+    result = call_llm(formatted_prompt, temperature=0, on_token=token_stream("Planner") if stream else None)
     
     end_time = time.time()
     latency = end_time - start_time
-    
-    # Robust token usage extraction to handle different response structures
-    usage = response.usage_metadata or response.response_metadata.get("usage_metadata", {})
-    input_tokens = usage.get("input_tokens", 0) or usage.get("prompt_token_count", 0)
-    output_tokens = usage.get("output_tokens", 0) or usage.get("candidates_token_count", 0)
 
-    content = clean_gemini_response(response)
-    content = content.replace("```json", "").replace("```", "").strip()
-    
-    try:
-        plan_data = json.loads(content)
-        steps = plan_data.get("steps", [])
-    except json.JSONDecodeError:
-        steps = [task] 
+    with span("parse_plan", kind="parse") as parse_span:
+        content = result["text"]
+        content = content.replace("```json", "").replace("```", "").strip()
+
+        try:
+            plan_data = json.loads(content)
+            parsed = parse_steps(plan_data.get("steps", []), available)
+        except (json.JSONDecodeError, AttributeError):
+            parsed = []
+        if not parsed:
+            parsed = [(task, [])]
+        steps = [query for query, _ in parsed]
+        plan_sources = [sources for _, sources in parsed]
+        parse_span.set(steps=len(steps), filtered_steps=sum(1 for sources in plan_sources if sources))
 
-    steps_formatted = "\n".join([f"- {step}" for step in steps])
+    steps_formatted = "\n".join([
+        f"- {step}" + (f" _(sources: {', '.join(sources)})_" if sources else "")
+        for step, sources in parsed
+    ])
 
     return {
         "plan": steps,
+        "plan_sources": plan_sources,
         "logs": [{"agent": "Planner", "message": f"**Generated Execution Plan:**\n\n{steps_formatted}"}],
         "metrics": [{
             "agent": "Planner",
             "latency": latency,
-            "input_tokens": input_tokens,
-            "output_tokens": output_tokens,
-            "total_tokens": input_tokens + output_tokens,
+            "input_tokens": result["input_tokens"],
+            "output_tokens": result["output_tokens"],
+            "total_tokens": result["total_tokens"],
+            "cache_hit": result["cache_hit"],
             "status": "Success"
         }]
     }
\ No newline at end of file
@@ -3,17 +3,23 @@ Your goal is to break down a complex user request into a step-by-step research p
 
 USER REQUEST: {task}
 
+AVAILABLE DOCUMENTS:
+{sources}
+
 REQUIREMENTS:
 1. Create a list of 3-5 distinct search queries or research steps.
 2. Focus on finding facts, data, and trends in the provided documents.
 3. Do not answer the question yet, just plan the retrieval.
+4. If a step is about specific reports (e.g. the request names them), list their exact
+   file names from AVAILABLE DOCUMENTS in "sources". Otherwise leave "sources" empty
+   to search all documents.
 
 Output STRICT JSON format:
 {{
     "steps": [
-        "step 1",
-        "step 2",
-        "step 3"
+        {{"query": "step 1", "sources": ["Report Name.pdf"]}},
+        {{"query": "step 2", "sources": []}},
+        {{"query": "step 3", "sources": []}}
     ]
 }}
 """
@@ -23,12 +29,13 @@ You have access to a vector database of 13 industry reports.
 
 Your task:
 1. Analyze the following research plan step: "{step}"
-2. Review the retrieved documents provided below.
+2. Review the retrieved evidence provided below. Each block has an evidence ID such as [E3].
 3. Extract relevant facts, statistics, and quotes.
-4. MUST format every fact with its source: [Fact text] (Source: DocumentName, Page X).
-5. If the retrieved documents do not contain relevant info for this step, write "No relevant information found."
+4. MUST tag every fact with the evidence ID(s) it comes from: - [Fact text] [E3] (or [E3, E7]).
+   Do not repeat document names or page numbers; the ID already identifies them.
+5. If the retrieved evidence does not contain relevant info for this step, write "No relevant information found."
 
-RETRIEVED DOCUMENTS:
+RETRIEVED EVIDENCE:
 {context}
 """
 
@@ -37,9 +44,12 @@ Write a final deliverable based ONLY on the provided research notes.
 
 USER GOAL: {task}
 
-RESEARCH NOTES:
+RESEARCH NOTES (facts tagged with evidence IDs):
 {research_notes}
 
+EVIDENCE INDEX (evidence ID -> document and page):
+{evidence_index}
+
 FORMAT REQUIREMENTS:
 1. Title: Start with a clear, H1 Markdown title (# Title).
 2. Executive Summary: Write a comprehensive summary (approx 200-250 words) outlining key findings. Use a separator (---) after the summary.
@@ -47,8 +57,15 @@ FORMAT REQUIREMENTS:
 4. Action List: Create a table with columns: Action Item, Owner, Due Date, Confidence Score %.
 5. Sources: List citations at the bottom.
 
+Start each of the five parts with its marker line, exactly as written:
+=== SECTION: title ===
+=== SECTION: summary ===
+=== SECTION: email ===
+=== SECTION: actions ===
+=== SECTION: sources ===
+
 CRITICAL RULES:
-- Use the citation format (Source: DocumentName, Page X) inline.
+- Use the citation format (Source: DocumentName, Page X) inline, resolving each evidence ID through the EVIDENCE INDEX.
 - If a specific claim is missing evidence in the notes, write "Not found in sources".
 - Confidence Scores MUST be percentages (e.g., 85%, 100%), NOT fractions (e.g. 8/10).
 - Do not use emojis.
@@ -60,15 +77,63 @@ Review the Draft against the Research Notes.
 DRAFT:
 {draft}
 
-RESEARCH NOTES:
+RESEARCH NOTES (facts tagged with evidence IDs):
 {research_notes}
 
+EVIDENCE INDEX (evidence ID -> document and page):
+{evidence_index}
+
 TASK:
-1. Check if every claim in the draft has a corresponding citation in the notes.
+1. Check if every claim in the draft has a corresponding fact in the notes, and that its (Source: DocumentName, Page X) citation matches the evidence ID of that fact in the EVIDENCE INDEX.
 2. Check for "hallucinations" (claims not supported by notes).
 3. If the draft contains "Not found in sources", that is ACCEPTABLE.
 
 OUTPUT:
 Return ONLY the word "APPROVE" if the draft is good.
-If there are issues, return "REVISE: [Explanation of what to fix]".
-"""
\ No newline at end of file
+If there are issues, return "REVISE: [Explanation of what to fix]", starting each issue with the affected section in brackets (e.g. [summary], [email]).
+"""
+VERIFIER_CLAIMS_PROMPT = """You are a Compliance Auditor.
+An automated citation check flagged the following claims in a draft. Every other claim in the draft passed.
+
+FLAGGED CLAIMS:
+{flagged_claims}
+
+RESEARCH NOTES (facts tagged with evidence IDs):
+{research_notes}
+
+EVIDENCE INDEX (evidence ID -> document and page):
+{evidence_index}
+
+TASK:
+1. For each flagged claim, decide whether the research notes support it and whether its citation points to the right document and page.
+2. Small differences in how a document name is written are ACCEPTABLE.
+
+OUTPUT:
+Return ONLY the word "APPROVE" if every flagged claim is supported.
+Otherwise return "REVISE: [Explanation of what to fix, per claim]", starting each issue with the claim's section in brackets (e.g. [summary]).
+"""
+
+WRITER_SECTIONS_PROMPT = """You are a Professional Consultant.
+A Compliance Auditor rejected some sections of your deliverable. Rewrite ONLY those sections; every other section has been approved and stays as it is.
+
+USER GOAL: {task}
+
+RESEARCH NOTES (facts tagged with evidence IDs):
+{research_notes}
+
+EVIDENCE INDEX (evidence ID -> document and page):
+{evidence_index}
+
+SECTIONS TO REWRITE (current text):
+{sections}
+
+FEEDBACK TO FIX:
+{critique}
+
+RULES:
+- Output ONLY the rewritten sections, each starting with its original marker line (e.g. === SECTION: summary ===).
+- Use the citation format (Source: DocumentName, Page X) inline, resolving each evidence ID through the EVIDENCE INDEX.
+- If a specific claim is missing evidence in the notes, write "Not found in sources".
+- Confidence Scores MUST be percentages (e.g., 85%, 100%), NOT fractions (e.g. 8/10).
+- Do not use emojis.
+"""
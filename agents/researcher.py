@@ -1,77 +1,142 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 from agents.state import AgentState
+from agents.llm import call_llm, token_stream
 from agents.prompts import RESEARCHER_PROMPT
-from retrieval.retriever import retrieve_documents
+from agents.evidence import add_documents, format_evidence
+from agents.budget import adaptive_k, budget_for, estimate_tokens, pack_blocks
+from retrieval.retriever import retrieve_many
+from tracing import span
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import os
 import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
-    model=os.environ.get("MODEL_NAME", "gemini-3-flash-preview"),
-    temperature=0,
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
+# Upper bound on plan steps researched at the same time
+MAX_CONCURRENT_STEPS = int(os.environ.get("RESEARCH_CONCURRENCY", "3"))
 
-def clean_gemini_response(response):
-    content = response.content
-    if isinstance(content, list):
-        full_text = []
-        for part in content:
-            if isinstance(part, dict) and "text" in part:
-                full_text.append(part["text"])
-            elif isinstance(part, str):
-                full_text.append(part)
-        return "".join(full_text)
-    return str(content)
+def research_step(step, context, on_token=None):
+    """
+    Runs the LLM extraction for a single plan step over its retrieved context.
+    Safe to call from worker threads: it only touches local state.
+    `on_token` streams the step's output (see agents.llm.token_stream).
+    """
+    print(f"  > Researching: {step}")
+    step_start = time.time()
+
+    with span("research_step", kind="step", step=step, context_chars=len(context)):
+        formatted_prompt = RESEARCHER_PROMPT.format(step=step, context=context)
+
+        response = call_llm(formatted_prompt, temperature=0, on_token=on_token)
+
+    return {
+        "step": step,
+        "result": response["text"],
+        "context_chars": len(context),
+        "latency": time.time() - step_start,
+        "input_tokens": response["input_tokens"],
+        "output_tokens": response["output_tokens"],
+        "cache_hit": response["cache_hit"],
+    }
 
 def researcher_node(state: AgentState):
     print("--- RESEARCHER AGENT ---")
+    start_time = time.time()
     plan = state["plan"]
     steps_to_execute = plan[:3] 
-    
+    plan_sources = state.get("plan_sources") or []
+    step_sources = [plan_sources[i] if i < len(plan_sources) else [] for i in range(len(steps_to_execute))]
+
+    # Retrieval depth follows the per-step prompt budget
+    budget = budget_for("Researcher")
+    overheads = [estimate_tokens(RESEARCHER_PROMPT.format(step=step, context="")) for step in steps_to_execute]
+    k = adaptive_k(budget, max(overheads, default=0))
+    dropped = {"blocks": 0, "cut": 0, "tokens": 0}
+
+    # One batched retrieval for every step: a single embedding request and
+    # a single vector-store round-trip instead of one of each per step.
+    # Chunks go into the evidence store once, however many steps retrieve them.
+    evidence = dict(state.get("evidence") or {})
+    retrieval_start = time.time()
+    try:
+        retrieved = retrieve_many(steps_to_execute, k=k, sources=step_sources)
+        with span("prompt_build", kind="prompt", steps=len(steps_to_execute), k=k) as prompt_span:
+            step_evidence = []
+            contexts = []
+            for ids, overhead in zip((add_documents(evidence, docs) for docs in retrieved["results"]), overheads):
+                # Best-ranked evidence first; whatever overflows the budget is cut or dropped
+                ids = list(dict.fromkeys(ids))
+                blocks, step_dropped = pack_blocks(
+                    [format_evidence(evidence, [evidence_id]) for evidence_id in ids],
+                    budget - overhead if budget is not None else None
+                )
+                step_evidence.append(ids[:len(blocks)])
+                contexts.append("\n".join(blocks))
+                for key in dropped:
+                    dropped[key] += step_dropped[key]
+            prompt_span.set(context_chars=sum(len(context) for context in contexts),
+                            dropped_chunks=dropped["blocks"], dropped_tokens=dropped["tokens"])
+    except Exception as e:
+        step_evidence = [[] for _ in steps_to_execute]
+        contexts = [f"Error retrieving documents: {e}"] * len(steps_to_execute)
+    retrieval_latency = time.time() - retrieval_start
+    retrieved_chunks = sum(len(ids) for ids in step_evidence)
+
+    # Fan out: each step runs in its own worker, bounded by MAX_CONCURRENT_STEPS.
+    # executor.map yields in submission order, so notes stay in plan order.
+    workers = max(1, min(MAX_CONCURRENT_STEPS, len(steps_to_execute)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Stream callbacks and trace contexts are created here: worker threads
+        # lack the run context, and the step spans belong under this node's span
+        streams = [token_stream("Researcher", step=step) for step in steps_to_execute]
+        run_contexts = [contextvars.copy_context() for _ in steps_to_execute]
+        step_results = list(executor.map(
+            lambda run_context, *args: run_context.run(research_step, *args),
+            run_contexts, steps_to_execute, contexts, streams
+        ))
+
+    wall_clock_latency = time.time() - start_time
+
     findings = []
     logs = []
-    
-    total_latency = 0
     total_input = 0
     total_output = 0
 
-    for step in steps_to_execute:
-        print(f"  > Researching: {step}")
-        step_start = time.time()
-        
-        context = retrieve_documents(step, k=5)
-        formatted_prompt = RESEARCHER_PROMPT.format(step=step, context=context)
-        
-        response = llm.invoke([HumanMessage(content=formatted_prompt)])
-        result = clean_gemini_response(response)
-        
-        step_latency = time.time() - step_start
-        total_latency += step_latency
-        
-        # Robust token usage extraction to handle different response structures
-        usage = response.usage_metadata or response.response_metadata.get("usage_metadata", {})
-        total_input += usage.get("input_tokens", 0) or usage.get("prompt_token_count", 0)
-        total_output += usage.get("output_tokens", 0) or usage.get("candidates_token_count", 0)
-        
-        findings.append(f"### Research for: {step}\n{result}\n")
+    for res, ids, sources in zip(step_results, step_evidence, step_sources):
+        total_input += res["input_tokens"]
+        total_output += res["output_tokens"]
+        findings.append(f"### Research for: {res['step']}\n{res['result']}\n")
+        scope = f" in {', '.join(sources)}" if sources else ""
         logs.append({
             "agent": "Researcher", 
-            "message": f"Researched '{step}' - Retrieved {len(context)} chars of context."
+            "message": f"Researched '{res['step']}'{scope} - Retrieved {res['context_chars']} chars of context "
+                       f"from evidence {', '.join(ids) or 'none'} ({res['latency']:.2f}s)."
         })
 
     return {
         "research_notes": findings,
+        "evidence": evidence,
         "logs": logs,
         "metrics": [{
             "agent": "Researcher",
-            "latency": total_latency,
+            "latency": wall_clock_latency,
+            "retrieval_latency": retrieval_latency,
+            "step_latencies": [round(res["latency"], 3) for res in step_results],
+            "sum_step_latency": sum(res["latency"] for res in step_results),
             "input_tokens": total_input,
             "output_tokens": total_output,
             "total_tokens": total_input + total_output,
+            "cache_hits": sum(1 for res in step_results if res["cache_hit"]),
+            "retrieved_chunks": retrieved_chunks,
+            "retrieval_k": k,
+            "token_budget": budget,
+            "prompt_tokens_est": sum(overhead + estimate_tokens(context) for overhead, context in zip(overheads, contexts)),
+            "dropped_chunks": dropped["blocks"],
+            "cut_chunks": dropped["cut"],
+            "dropped_tokens": dropped["tokens"],
+            "filtered_steps": sum(1 for sources in step_sources if sources),
+            "unique_evidence": len(set(evidence_id for ids in step_evidence for evidence_id in ids)),
             "status": "Success"
         }]
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,131 @@
+"""
+Task-level result reuse: an approved deliverable is stored under the task
+and the retrieval index version, and the same task submitted again
+against an unchanged index is answered from the store without running any
+agent. Re-ingesting documents changes the index version, so stale answers
+are never served.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from agents.guard import normalize_input
+from agents.state import AgentState
+from agents.llm import MODEL_NAME
+from retrieval.retriever import index_version
+
+CACHE_DIR = os.environ.get("CACHE_DIR", "./.cache")
+RESULT_CACHE_PATH = os.path.join(CACHE_DIR, "results.sqlite")
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE", "1") == "1"
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+
+# State fields that make up a finished run
+RESULT_FIELDS = [
+    "plan", "plan_sources", "research_notes", "evidence", "draft", "draft_sections", "critique",
+    "verification", "section_approvals", "revision_number", "logs",
+]
+
+def result_key(task, version):
+    """
+    Normalized task text + index version + model: a different model or
+    corpus may well produce a different deliverable.
+    """
+    return hashlib.sha256(f"{MODEL_NAME}\0{version}\0{normalize_input(task)}".encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    SQLite store of finished runs ({field: value} for RESULT_FIELDS),
+    expired after `ttl` seconds.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, ttl=RESULT_CACHE_TTL):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, task TEXT NOT NULL, index_version TEXT NOT NULL,"
+            " result TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT result, created FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or time.time() - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, task, version, result):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, task, index_version, result, created) VALUES (?, ?, ?, ?, ?)",
+                (key, task, version, json.dumps(result, default=str), now)
+            )
+            # Answers computed against an older index can never be hit again
+            self._conn.execute("DELETE FROM results WHERE index_version != ? OR created < ?", (version, now - self.ttl))
+            self._conn.commit()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_result_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
+
+def result_cache_node(state: AgentState):
+    """
+    Graph entry: replays a stored deliverable for this task, if any.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return {"result_key": ""}
+    start_time = time.time()
+    key = result_key(state["task"], index_version())
+    stored = get_result_cache().get(key)
+    if stored is None:
+        return {"result_key": key}
+    print("--- RESULT CACHE HIT ---")
+    # Replays the stored trace logs; metrics start fresh, nothing was spent
+    return {
+        **{field: stored[field] for field in RESULT_FIELDS if field in stored},
+        "result_key": key,
+        "is_safe": True,
+        "logs": stored.get("logs", []) + [
+            {"agent": "Cache", "message": "Served the stored deliverable for this task (index unchanged)."}
+        ],
+        "metrics": [{
+            "agent": "Cache",
+            "latency": time.time() - start_time,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "total_tokens": 0,
+            "cache_hit": True,
+            "status": "Success"
+        }]
+    }
+
+def store_result_node(state: AgentState):
+    """
+    Graph exit: stores approved deliverables for reuse.
+    """
+    verdict = (state.get("verification") or {}).get("verdict")
+    if RESULT_CACHE_ENABLED and state.get("result_key") and verdict == "approve":
+        get_result_cache().put(
+            state["result_key"], state["task"], index_version(),
+            {field: state.get(field) for field in RESULT_FIELDS}
+        )
+    return {}
@@ -0,0 +1,55 @@
+import hashlib
+import re
+
+# The deliverable's parts, in document order. The Writer opens each one
+# with a marker line so sections can be rewritten and re-verified on their own.
+SECTION_NAMES = ["title", "summary", "email", "actions", "sources"]
+
+_MARKER_RE = re.compile(r"^\s*=+\s*SECTION:\s*([A-Za-z_]+)\s*=+\s*$", re.MULTILINE)
+
+def section_marker(name):
+    return f"=== SECTION: {name} ==="
+
+def parse_sections(text):
+    """
+    Splits Writer output on its section markers. Returns {name: content} in
+    output order; text without any marker comes back as a single "body"
+    section, so an off-format draft still round-trips.
+    """
+    matches = list(_MARKER_RE.finditer(text))
+    if not matches:
+        return {"body": text.strip()}
+    sections = {}
+    preamble = text[:matches[0].start()].strip()
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections[match.group(1).lower()] = text[match.end():end].strip()
+    if preamble:
+        sections[next(iter(sections))] = preamble + "\n\n" + sections[next(iter(sections))]
+    return sections
+
+def assemble(sections):
+    """
+    Renders sections as the final Markdown deliverable (markers removed),
+    known sections in document order first.
+    """
+    ordered = [name for name in SECTION_NAMES if name in sections]
+    ordered += [name for name in sections if name not in SECTION_NAMES]
+    return "\n\n".join(sections[name] for name in ordered if sections[name])
+
+def render_with_markers(sections, names=None):
+    names = list(sections) if names is None else names
+    return "\n\n".join(f"{section_marker(name)}\n{sections[name]}" for name in names if name in sections)
+
+def section_hash(content):
+    return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+def sections_named_in(critique, available):
+    """
+    Sections a critique tags the way the Verifier prompts ask ("[summary]
+    ..."). Untagged mentions are ignored: free text such as "the summary's
+    subject" must not pull in other sections. Returns names from
+    `available`, in document order.
+    """
+    tagged = {name for name in re.findall(r"\[([a-z_]+)\]", critique.lower()) if name in available}
+    return [name for name in available if name in tagged]
@@ -0,0 +1,79 @@
+"""
+Speculative planning: the Planner runs in parallel with the Defense check
+instead of after it (graph.py, SPECULATIVE_PLANNING=1).
+
+The speculative Planner writes only to `speculative_plan`, never to the
+plan, logs or metrics, and does not stream tokens. The safety gate, which
+joins both branches, promotes its output once Defense has passed the input
+and drops it otherwise, so nothing from a blocked request reaches the
+output. Each gate decision is recorded as a "Speculation" metric and a
+"speculation" span (outcome, wasted tokens and seconds), which the eval
+runner and the Prometheus endpoint turn into a wasted-work rate.
+"""
+from agents.state import AgentState
+from agents.planner import planner_node
+from agents.guard import local_verdict, normalize_input
+from retrieval.retriever import get_retriever
+from tracing import event, span
+import time
+
+def speculative_planner_node(state: AgentState):
+    print("--- PLANNER AGENT (speculative) ---")
+    start_time = time.time()
+    # Inputs the local Defense tiers already reject are not worth planning
+    verdict = local_verdict(normalize_input(state["task"]))
+    if verdict["is_safe"] is False:
+        return {"speculative_plan": {"skipped": True}}
+
+    update = planner_node(state, stream=False)
+    try:
+        # Warm the query-embedding cache for the Researcher's first retrieval
+        with span("prefetch_embeddings", kind="embedding", queries=len(update["plan"])):
+            get_retriever().embed_queries(update["plan"])
+    except Exception as e:
+        print(f"  ! Speculative prefetch failed: {e}")
+    return {"speculative_plan": {**update, "latency": time.time() - start_time}}
+
+def safety_gate_node(state: AgentState):
+    """
+    Join point of Defense and the speculative Planner.
+    """
+    speculative = state.get("speculative_plan") or {}
+    spent = speculative.get("metrics", [])
+    wasted_tokens = sum(m.get("total_tokens", 0) for m in spent)
+
+    if not state.get("is_safe"):
+        outcome = "skipped" if speculative.get("skipped") else "discarded"
+        update = {"speculative_plan": {}}
+        wasted_latency = speculative.get("latency", 0.0)
+    elif speculative.get("skipped") or "plan" not in speculative:
+        # Local tiers rejected the input but the verdict cache passed it:
+        # plan now, non-speculatively
+        outcome = "fallback"
+        update = {**planner_node(state), "speculative_plan": {}}
+        wasted_tokens, wasted_latency = 0, 0.0
+    else:
+        outcome = "used"
+        update = {
+            "plan": speculative["plan"],
+            "plan_sources": speculative.get("plan_sources", []),
+            "logs": speculative["logs"],
+            "metrics": list(spent),
+            "speculative_plan": {},
+        }
+        wasted_tokens, wasted_latency = 0, 0.0
+
+    event("speculation", kind="speculation", outcome=outcome,
+          wasted_tokens=wasted_tokens, wasted_seconds=round(wasted_latency, 3))
+    update["metrics"] = update.get("metrics", []) + [{
+        "agent": "Speculation",
+        "latency": 0.0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "total_tokens": 0,
+        "speculative_outcome": outcome,
+        "wasted_tokens": wasted_tokens,
+        "wasted_latency": wasted_latency,
+        "status": "Discarded" if outcome == "discarded" else "Success"
+    }]
+    return update
@@ -8,22 +8,41 @@ class AgentState(TypedDict):
     Attributes:
         task (str): The initial user request.
         plan (List[str]): The research plan steps generated by the Planner.
+        plan_sources (List[List[str]]): Source files each plan step is restricted to, aligned with plan
+            (empty list: search all documents).
+        speculative_plan (dict): Planner output produced in parallel with Defense (SPECULATIVE_PLANNING),
+            held back until the safety gate promotes or discards it. Format: the Planner's update plus "latency".
         research_notes (List[str]): Accumulated findings. Uses operator.add to append, not overwrite.
+        evidence (Dict[str, dict]): Deduplicated retrieved chunks keyed by evidence ID ("E1", ...).
+            Format: {"chunk_id": str, "source": str, "page": Any, "text": str}
         draft (str): The generated email/report.
+        draft_sections (Dict[str, str]): The draft split into addressable sections (title, summary, email, actions, sources).
         critique (str): Feedback from the Verifier.
+        verification (dict): Machine-readable Verifier verdict used for routing.
+            Format: {"verdict": "approve" | "revise", "method": str, "claims": int, "citations": int,
+                     "sections_checked": list, "revise_sections": list, "flagged": list}
+        section_approvals (Dict[str, str]): Content hash of each section the Verifier approved, carried across loops.
         revision_number (int): Tracks loops to prevent infinite refinement.
         max_revisions (int): Hard limit on loops (default 2).
         logs (List[dict]): Traceability for the UI. Format: {"agent": str, "message": str}
         metrics (List[dict]): Store observability data. Format: {"metric": str, "value": Any}
         is_safe (bool): Flag for security status.
+        result_key (str): Result-cache key of this task at the current index version ("" when the cache is off).
     """
     task: str
     plan: List[str]
+    plan_sources: List[List[str]]
+    speculative_plan: Dict[str, Any]
     research_notes: Annotated[List[str], operator.add]
+    evidence: Dict[str, Dict[str, Any]]
     draft: str
+    draft_sections: Dict[str, str]
     critique: str
+    verification: Dict[str, Any]
+    section_approvals: Dict[str, str]
     revision_number: int
     max_revisions: int
     logs: Annotated[List[Dict[str, Any]], operator.add]
     metrics: Annotated[List[Dict[str, Any]], operator.add]
     is_safe: bool
+    result_key: str
@@ -1,73 +1,103 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
 from agents.state import AgentState
-from agents.prompts import WRITER_PROMPT
-import os
+from agents.llm import call_llm, token_stream
+from agents.budget import budget_for, cap_text, estimate_tokens, fit_notes
+from agents.sections import assemble, parse_sections, render_with_markers
+from agents.prompts import WRITER_PROMPT, WRITER_SECTIONS_PROMPT
+from tracing import span
 import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
-    model=os.environ.get("MODEL_NAME", "gemini-3-flash-preview"),
-    temperature=0.2, 
-    google_api_key=os.environ["GOOGLE_API_KEY"]
-)
-
-def clean_gemini_response(response):
-    content = response.content
-    if isinstance(content, list):
-        full_text = []
-        for part in content:
-            if isinstance(part, dict) and "text" in part:
-                full_text.append(part["text"])
-            elif isinstance(part, str):
-                full_text.append(part)
-        return "".join(full_text)
-    return str(content)
-
 def writer_node(state: AgentState):
     print("--- WRITER AGENT ---")
     start_time = time.time()
     task = state["task"]
-    research_notes = "\n\n".join(state["research_notes"])
+    evidence = state.get("evidence") or {}
     
-    critique = state.get("critique")
+    # Only the latest critique is carried into the prompt, capped
+    critique = cap_text(state.get("critique"))
+    verification = state.get("verification") or {}
+    sections = dict(state.get("draft_sections") or {})
+    revise = [name for name in verification.get("revise_sections", []) if name in sections]
+    current_rev = state.get("revision_number", 0)
+    on_token = token_stream("Writer", revision=current_rev + 1)
+    incremental = verification.get("verdict") == "revise" and bool(revise)
+
     feedback_instruction = ""
-    
-    if critique and "REVISE" in critique:
-        print(f"  ! Incorporating feedback: {critique}")
+    if critique and verification.get("verdict") == "revise" and not incremental:
         feedback_instruction = f"\n\nIMPORTANT: The previous draft was rejected. \nFEEDBACK TO FIX: {critique}\nPlease fix these specific issues in the new draft."
-    
-    formatted_prompt = WRITER_PROMPT.format(
-        task=task,
-        research_notes=research_notes
-    ) + feedback_instruction
-    
-    response = llm.invoke([HumanMessage(content=formatted_prompt)])
-    draft = clean_gemini_response(response)
+
+    def render(research_notes, evidence_index):
+        if incremental:
+            return WRITER_SECTIONS_PROMPT.format(
+                task=task,
+                research_notes=research_notes,
+                evidence_index=evidence_index,
+                sections=render_with_markers(sections, revise),
+                critique=critique
+            )
+        return WRITER_PROMPT.format(
+            task=task,
+            research_notes=research_notes,
+            evidence_index=evidence_index
+        ) + feedback_instruction
+
+    # Notes are fitted into what the budget leaves after the fixed prompt
+    # parts; the evidence index (ID -> source/page lines) covers what they cite
+    budget = budget_for("Writer")
+    with span("prompt_build", kind="prompt") as prompt_span:
+        formatted_prompt, dropped = fit_notes(render, state["research_notes"], evidence, budget)
+        prompt_span.set(prompt_tokens_est=estimate_tokens(formatted_prompt), dropped_tokens=dropped["tokens"])
+
+    if incremental:
+        # Incremental revision: only the rejected sections are regenerated,
+        # approved ones are kept verbatim.
+        print(f"  ! Revising sections {', '.join(revise)}: {critique}")
+        result = call_llm(formatted_prompt, temperature=0.2, on_token=on_token)
+        with span("parse_sections", kind="parse"):
+            rewritten = parse_sections(result["text"])
+            if "body" in rewritten and len(revise) == 1:
+                # Unmarked reply for a single section: it is that section
+                rewritten = {revise[0]: rewritten["body"]}
+            changed = [name for name in revise if name in rewritten]
+            sections.update({name: rewritten[name] for name in changed})
+    else:
+        if feedback_instruction:
+            print(f"  ! Incorporating feedback: {critique}")
+        result = call_llm(formatted_prompt, temperature=0.2, on_token=on_token)
+        with span("parse_sections", kind="parse"):
+            sections = parse_sections(result["text"])
+        changed = list(sections)
+
+    draft = assemble(sections)
     
     end_time = time.time()
     latency = end_time - start_time
     
-    # Token usage extraction with fallback for different response structures
-    usage = response.usage_metadata or response.response_metadata.get("usage_metadata", {})
-    input_tokens = usage.get("input_tokens", 0) or usage.get("prompt_token_count", 0)
-    output_tokens = usage.get("output_tokens", 0) or usage.get("candidates_token_count", 0)
-    
-    current_rev = state.get("revision_number", 0)
     preview = draft[:300].replace("\n", " ") + "..."
 
     return {
         "draft": draft,
+        "draft_sections": sections,
         "revision_number": current_rev + 1,
-        "logs": [{"agent": "Writer", "message": f"**Draft Generated (Revision {current_rev + 1}):**\n\n_Preview: {preview}_"}],
+        "logs": [{
+            "agent": "Writer",
+            "message": f"**Draft Generated (Revision {current_rev + 1}, sections written: {', '.join(changed) or 'none'}):**\n\n_Preview: {preview}_"
+        }],
         "metrics": [{
             "agent": "Writer",
             "latency": latency,
-            "input_tokens": input_tokens,
-            "output_tokens": output_tokens,
-            "total_tokens": input_tokens + output_tokens,
+            "input_tokens": result["input_tokens"],
+            "output_tokens": result["output_tokens"],
+            "total_tokens": result["total_tokens"],
+            "cache_hit": result["cache_hit"],
+            "sections_written": len(changed),
+            "token_budget": budget,
+            "prompt_tokens_est": estimate_tokens(formatted_prompt),
+            "dropped_note_lines": dropped["lines"],
+            "dropped_notes": dropped["notes"],
+            "dropped_tokens": dropped["tokens"],
             "status": "Success"
         }]
-    }
\ No newline at end of file
+    }
@@ -2,15 +2,22 @@ import streamlit as st
 import pandas as pd
 import os
 import sys
+import time
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from graph import app_graph
+from graph import SPECULATIVE_PLANNING, app_graph, finish_run, prune_checkpoints, run_config, start_or_resume
+from agents.sections import assemble, parse_sections
+from tracing import METRICS_PORT, node_summary, span, span_tree, start_metrics_server, trace_spans
 
 st.set_page_config(page_title="Supply Chain Copilot", page_icon="box", layout="wide")
 
+# Prometheus text endpoint (METRICS_PORT); a no-op on reruns
+start_metrics_server(METRICS_PORT)
+
 st.title("Enterprise Supply Chain Copilot")
 st.markdown("### Multi-Agent System powered by Gemini 3 Flash & LangGraph")
 
@@ -25,95 +32,241 @@ with st.sidebar:
 
 user_task = st.text_area("Enter your request:", height=100)
 
-if st.button("🚀 Run Copilot", type="primary"):
-    if not user_task:
+AGENT_ICONS = {"Cache": "♻️", "Defense": "🛡️", "Planner": "🧠", "Researcher": "🔍", "Writer": "✍️", "Verifier": "⚖️"}
+# Nodes that run ahead of the Defense verdict; shown only once the safety
+# gate has promoted their work, never for a blocked request
+SPECULATIVE_NODES = {"planner"} if SPECULATIVE_PLANNING else set()
+
+METRIC_COLS = [
+    "agent", "status", "latency", "llm_latency", "retrieval_latency", "embedding_latency", "llm_calls",
+    "total_tokens", "input_tokens", "output_tokens", "dropped_tokens", "cache_hit", "cache_hits"
+]
+
+def metrics_frame(metrics):
+    df = pd.DataFrame(metrics)
+    for col in df.columns:
+        if col.endswith("latency"):
+            df[col] = df[col].apply(lambda x: f"{x:.2f}s" if pd.notna(x) else "")
+    return df[[c for c in METRIC_COLS if c in df.columns]]
+
+def spans_frame(spans):
+    rows = [{
+        "span": "  " * s["depth"] + s["name"],
+        "kind": s["kind"],
+        "duration": f"{s['duration']:.3f}s",
+        "status": s["status"],
+        "attributes": ", ".join(f"{k}={v}" for k, v in s["attributes"].items() if k != "step"),
+    } for s in span_tree(spans)]
+    return pd.DataFrame(rows)
+
+def live_draft(text):
+    # Hide the Writer's section markers while it is still typing
+    return assemble(parse_sections(text))
+
+run_clicked = st.button("🚀 Run Copilot", type="primary")
+# A run that failed part-way (timeout, 429) keeps its checkpoints and can
+# continue from the last completed node instead of starting over
+failed_thread = st.session_state.get("failed_thread")
+resume_clicked = bool(failed_thread) and app_graph.checkpointer is not None and st.button(
+    "↩️ Resume last run", help="Continue the failed run from its last completed step."
+)
+
+if run_clicked or resume_clicked:
+    if run_clicked and not user_task:
         st.warning("Please enter a task.")
     else:
-        with st.spinner("Agents are working..."):
-            try:
-                initial_state = {
-                    "task": user_task,
-                    "plan": [],
-                    "research_notes": [],
-                    "draft": "",
-                    "critique": "",
-                    "revision_number": 0,
-                    "max_revisions": 2,
-                    "logs": [],
-                    "metrics": [],
-                    "is_safe": True
-                }
-                
-                result = app_graph.invoke(initial_state)
-                
-                # Check Security
-                if not result.get("is_safe", True):
-                    st.error("SECURITY ALERT: The request was blocked by the Prompt Injection Defense system.")
-                    with st.expander("🛡️ Defense Logic"):
-                        if "logs" in result:
-                            for log in result["logs"]:
-                                st.write(log['message'])
-                    if "metrics" in result:
-                        st.caption("Defense Metrics:")
-                        st.dataframe(pd.DataFrame(result["metrics"]))
+        try:
+            initial_state = {
+                "task": user_task,
+                "plan": [],
+                "research_notes": [],
+                "evidence": {},
+                "draft": "",
+                "draft_sections": {},
+                "critique": "",
+                "section_approvals": {},
+                "revision_number": 0,
+                "max_revisions": 2,
+                "logs": [],
+                "metrics": [],
+                "is_safe": True
+            }
 
-                else:
-                    # 1. Trace Logs
-                    st.subheader("🕵️ Agent Trace Logs")
+            thread_id = failed_thread if resume_clicked else uuid.uuid4().hex
+            if run_clicked and app_graph.checkpointer is not None:
+                # Threads of older failed runs beyond the most recent ones
+                prune_checkpoints(app_graph.checkpointer)
+            config = run_config(thread_id, stream_tokens=True)
+            graph_input = start_or_resume(app_graph, config, initial_state, resume=resume_clicked)
+            st.session_state["failed_thread"] = thread_id
+
+            # Live view: filled in node by node (graph updates) and token by
+            # token (LLM output forwarded on the graph's custom stream).
+            run_start = time.time()
+            first_output = None
+            status = st.status("Agents are working...", expanded=True)
+            first_output_caption = st.empty()
+            live_col, metrics_col = st.columns([3, 2])
+            with live_col:
+                plan_box = st.empty()
+                research_area = st.container()
+                writer_header = st.empty()
+                writer_box = st.empty()
+                verifier_box = st.empty()
+            with metrics_col:
+                st.subheader("📊 Live Metrics")
+                metrics_box = st.empty()
+
+            result = dict(initial_state)
+            step_boxes = {}
+            step_text = {}
+            writer_text = ""
+            writer_revision = None
+            verifier_text = ""
+            held_back = []
+
+            # The whole run is one trace; the final metrics tables are built from its spans
+            with span("graph_run", kind="run") as run_span:
+                for mode, chunk in app_graph.stream(
+                    graph_input,
+                    config=config,
+                    stream_mode=["updates", "custom"]
+                ):
+                    if first_output is None:
+                        first_output = time.time() - run_start
+                        first_output_caption.caption(f"First output after {first_output:.2f}s")
+
+                    if mode == "custom":
+                        agent = chunk.get("agent")
+                        token = chunk.get("token", "")
+                        if agent == "Planner":
+                            plan_box.code(token, language="json")
+                        elif agent == "Researcher":
+                            step = chunk.get("step", "")
+                            if step not in step_boxes:
+                                with research_area:
+                                    step_boxes[step] = st.expander(f"🔍 {step}", expanded=True).empty()
+                                step_text[step] = ""
+                            step_text[step] += token
+                            step_boxes[step].markdown(step_text[step])
+                        elif agent == "Writer":
+                            if chunk.get("revision") != writer_revision:
+                                writer_revision = chunk.get("revision")
+                                writer_text = ""
+                                writer_header.subheader(f"✍️ Draft (revision {writer_revision})")
+                            writer_text += token
+                            writer_box.markdown(live_draft(writer_text))
+                        elif agent == "Verifier":
+                            verifier_text += token
+                            verifier_box.info(f"⚖️ {verifier_text}")
+                        continue
+
+                    for node_name, update in chunk.items():
+                        if node_name in SPECULATIVE_NODES:
+                            held_back.append(node_name)
+                            continue
+                        if node_name == "safety_gate":
+                            for held in held_back:
+                                if result.get("is_safe"):
+                                    status.write(f"{AGENT_ICONS.get(held.capitalize(), '🤖')} {held.capitalize()} finished")
+                                else:
+                                    status.write(f"🗑️ {held.capitalize()} (speculative) discarded")
+                            held_back = []
+                        if not update:
+                            continue
+                        status.write(f"{AGENT_ICONS.get(node_name.capitalize(), '🤖')} {node_name.capitalize()} finished")
+                        for key, value in update.items():
+                            if key in ("logs", "metrics", "research_notes"):
+                                result[key] = result.get(key, []) + value
+                            else:
+                                result[key] = value
+                        if "plan" in update:
+                            plan_sources = update.get("plan_sources") or []
+                            plan_box.markdown("**Plan:**\n\n" + "\n".join(
+                                f"- {step}" + (f" _({', '.join(plan_sources[i])})_" if i < len(plan_sources) and plan_sources[i] else "")
+                                for i, step in enumerate(update["plan"])
+                            ))
+                        if "draft" in update:
+                            writer_box.markdown(update["draft"])
+                        if "critique" in update:
+                            verifier_text = ""
+                        if update.get("metrics"):
+                            metrics_box.dataframe(metrics_frame(result["metrics"]), width="stretch")
+
+            status.update(label=f"Done in {time.time() - run_start:.1f}s", state="complete", expanded=False)
+            st.session_state.pop("failed_thread", None)
+            if app_graph.checkpointer is not None:
+                # Complete final state, including nodes finished before a resume
+                result = dict(app_graph.get_state(config).values)
+            finish_run(app_graph, config)
+            spans = trace_spans(run_span.trace_id)
+            node_rows = node_summary(spans)
+
+            # Check Security
+            if not result.get("is_safe", True):
+                st.error("SECURITY ALERT: The request was blocked by the Prompt Injection Defense system.")
+                with st.expander("🛡️ Defense Logic"):
                     if "logs" in result:
                         for log in result["logs"]:
-                            agent_name = log['agent']
-                            msg = str(log['message'])
-                            icon = "🤖"
-                            if "Defense" in agent_name: icon = "🛡️"
-                            elif "Planner" in agent_name: icon = "🧠"
-                            elif "Researcher" in agent_name: icon = "🔍"
-                            elif "Writer" in agent_name: icon = "✍️"
-                            elif "Verifier" in agent_name: icon = "⚖️"
-                            
-                            with st.expander(f"{icon} {agent_name}"):
-                                st.markdown(msg)
-
-                                    
-                    # 2. Final Output
-                    st.subheader("Final Deliverable")
-                    draft = result.get("draft", "No draft generated.")
-                    if not isinstance(draft, str):
-                        draft = str(draft)
-                    st.markdown(draft)
-                    
-                    # 3. Verification
-                    st.markdown("---")
-                    critique = result.get('critique', 'Unknown')
-                    if not isinstance(critique, str):
-                        critique = str(critique)
-                    
-                    if "APPROVE" in critique:
-                        st.success(f"Verification Status: {critique}")
-                    else:
-                        st.warning(f"Verification Status: {critique}")
-                        
-                    # 4. Observability Table
-                    st.markdown("---")
-                    st.subheader("📊 Observability Metrics")
+                            st.write(log['message'])
+                # Speculative work thrown away by the safety gate is not part of the check
+                defense_rows = [row for row in node_rows if row["agent"].lower() not in SPECULATIVE_NODES]
+                discarded = [row for row in node_rows if row["agent"].lower() in SPECULATIVE_NODES]
+                if defense_rows:
+                    st.caption("Defense Metrics:")
+                    st.dataframe(metrics_frame(defense_rows))
+                if discarded:
+                    st.caption(
+                        f"Discarded speculative planning: {sum(row['total_tokens'] for row in discarded)} tokens, "
+                        f"{sum(row['latency'] for row in discarded):.2f}s."
+                    )
+
+            else:
+                # 1. Trace Logs
+                st.subheader("🕵️ Agent Trace Logs")
+                if "logs" in result:
+                    for log in result["logs"]:
+                        agent_name = log['agent']
+                        msg = str(log['message'])
+                        icon = AGENT_ICONS.get(agent_name, "🤖")
+
+                        with st.expander(f"{icon} {agent_name}"):
+                            st.markdown(msg)
+
+                # 2. Final Output
+                st.subheader("Final Deliverable")
+                draft = result.get("draft", "No draft generated.")
+                if not isinstance(draft, str):
+                    draft = str(draft)
+                st.markdown(draft)
+                
+                # 3. Verification
+                st.markdown("---")
+                critique = result.get('critique', 'Unknown')
+                if not isinstance(critique, str):
+                    critique = str(critique)
+                
+                verification = result.get("verification") or {}
+                if verification.get("verdict") == "approve":
+                    st.success(f"Verification Status: {critique}")
+                else:
+                    st.warning(f"Verification Status: {critique}")
                     
-                    if "metrics" in result and result["metrics"]:
-                        df = pd.DataFrame(result["metrics"])
-                        
-                        if "latency" in df.columns:
-                            df["latency"] = df["latency"].apply(lambda x: f"{x:.2f}s")
-                        
-                        cols = ["agent", "status", "latency", "total_tokens", "input_tokens", "output_tokens"]
-                        existing_cols = [c for c in cols if c in df.columns]
-                        df = df[existing_cols]
-                        
-                        st.dataframe(df, width="stretch")
-                        
-                        if "input_tokens" in df.columns and "output_tokens" in df.columns:
-                            total_input = df["input_tokens"].sum()
-                            total_output = df["output_tokens"].sum()
-                            est_cost = ((total_input / 1_000_000) * 0.50) + ((total_output / 1_000_000) * 3.00)
-                            st.caption(f"Total Session Cost (Est): ${est_cost:.5f} | Total Tokens: {total_input + total_output}")
-
-            except Exception as e:
-                st.error(f"An error occurred: {e}")
\ No newline at end of file
+                # 4. Observability Table
+                st.markdown("---")
+                st.subheader("📊 Observability Metrics")
+                
+                if node_rows:
+                    df = pd.DataFrame(node_rows)
+                    st.dataframe(metrics_frame(node_rows), width="stretch")
+                    with st.expander("⏱️ Span Timeline"):
+                        st.dataframe(spans_frame(spans), width="stretch", hide_index=True)
+
+                    total_input = df["input_tokens"].sum()
+                    total_output = df["output_tokens"].sum()
+                    est_cost = ((total_input / 1_000_000) * 0.50) + ((total_output / 1_000_000) * 3.00)
+                    st.caption(f"Total Session Cost (Est): ${est_cost:.5f} | Total Tokens: {total_input + total_output} | "
+                               f"First output: {first_output or 0:.2f}s | Trace: {run_span.trace_id}")
+
+        except Exception as e:
+            st.error(f"An error occurred: {e}")
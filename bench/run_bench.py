@@ -0,0 +1,463 @@
+"""
+Offline benchmark suite.
+
+Runs the copilot's own code paths (graph orchestration, retrieval, prompt
+building, PDF parsing/chunking, revision loops) against deterministic fakes
+for Gemini chat and embeddings with configurable latency distributions, and
+writes the measurements to JSON for comparison between commits:
+
+    python bench/run_bench.py --quick
+    python bench/run_bench.py --scenarios retrieval --sizes 1000,10000
+    python bench/run_bench.py --compare bench/results/<older>.json
+
+Everything runs in a scratch directory; ./chroma_db, ./data and the shared
+caches are never touched.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+RESULTS_DIR = os.path.join(ROOT_DIR, "bench", "results")
+SCENARIOS = ["e2e", "retrieval", "ingest", "revisions"]
+
+# Isolate every on-disk cache before any project module reads its config
+WORK_DIR = tempfile.mkdtemp(prefix="copilot-bench-")
+os.environ["CACHE_DIR"] = os.path.join(WORK_DIR, "cache")
+os.environ["LLM_CACHE"] = "0"
+os.environ["RESULT_CACHE"] = "0"
+os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+
+from langchain_core.documents import Document
+
+import agents.llm as llm_module
+import retrieval.retriever as retriever_module
+from agents.fakes import FakeChatModel
+from retrieval.embedding_cache import EmbeddingCache
+from retrieval.fakes import FakeEmbeddings, LatencyModel, fake_vector
+from retrieval.lexical_index import LexicalIndex
+from retrieval.vector_index import QUANTIZATIONS, NumpyVectorIndex, build_from_chroma, recall_report
+from retrieval.rate_limit import AdaptiveRateLimiter
+
+VOCABULARY = (
+    "supply chain resilience logistics freight port congestion inventory supplier tier visibility "
+    "digital twin control tower procurement nearshoring tariff risk demand forecasting warehouse "
+    "automation sustainability emissions scope carbon workforce talent cost inflation shipping "
+    "container lead time disruption geopolitical semiconductor capacity planning analytics "
+    "artificial intelligence collaboration network diversification agility transparency"
+).split()
+REPORTS = [
+    "ASCM Top 10 Supply Chain Trends 2025", "WEF Resilience Pulse Check 2025", "DHL Logistics Trend Radar",
+    "KPMG The Future of Supply Chain", "BSR Future of Supply Chains 2025", "Accenture 360 Value Report 2025",
+]
+
+def summarize(values):
+    """
+    Distribution summary (seconds unless noted) for a list of samples.
+    """
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {
+        "n": len(values),
+        "mean": round(statistics.fmean(values), 6),
+        "std": round(statistics.pstdev(values), 6),
+        "min": round(ordered[0], 6),
+        "p50": round(pick(0.5), 6),
+        "p95": round(pick(0.95), 6),
+        "max": round(ordered[-1], 6),
+    }
+
+def synthetic_text(rng, words=250):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+def synthetic_chunks(count, seed=0):
+    """
+    `count` chunk Documents spread over the REPORTS, with stable IDs.
+    """
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        source = f"{REPORTS[i % len(REPORTS)]}.pdf"
+        text = f"{REPORTS[i % len(REPORTS)]}. " + synthetic_text(rng)
+        docs.append(Document(id=f"bench-{i:07d}", page_content=text, metadata={"source": source, "page": i // len(REPORTS)}))
+    return docs
+
+def build_corpus(db_dir, count, dim):
+    """
+    Writes `count` synthetic chunks straight into a Chroma store plus the
+    BM25 index at `db_dir` (no embedding calls). Returns build seconds.
+    """
+    from langchain_chroma import Chroma
+
+    start = time.perf_counter()
+    docs = synthetic_chunks(count)
+    store = Chroma(persist_directory=db_dir)
+    for i in range(0, len(docs), 2000):
+        batch = docs[i:i + 2000]
+        store._collection.upsert(
+            ids=[doc.id for doc in batch],
+            embeddings=[fake_vector(doc.page_content, dim) for doc in batch],
+            documents=[doc.page_content for doc in batch],
+            metadatas=[doc.metadata for doc in batch]
+        )
+    lexical = LexicalIndex(os.path.join(db_dir, "lexical_index.sqlite"))
+    by_source = {}
+    for doc in docs:
+        by_source.setdefault(doc.metadata["source"], []).append(doc)
+    for source, source_docs in by_source.items():
+        lexical.replace_source(source, source_docs, [doc.id for doc in source_docs])
+    return time.perf_counter() - start
+
+def install_retriever(db_dir, embeddings, mode="hybrid", backend="chroma"):
+    """
+    Points retrieve_documents/retrieve_many at `db_dir`, embedding queries
+    with the fake. Each install gets an empty persistent embedding cache, so
+    earlier runs never hide the simulated embedding latency.
+    """
+    retriever = retriever_module.Retriever("offline-benchmark", db_dir=db_dir, mode=mode, backend=backend)
+    retriever.embeddings.embeddings = embeddings
+    retriever.embeddings.cache = EmbeddingCache(path=os.path.join(WORK_DIR, f"embeddings-{time.monotonic_ns()}.sqlite"))
+    retriever_module._retriever = retriever
+    return retriever
+
+def install_llm(model):
+    llm_module.get_llm = lambda temperature=0: model
+
+def initial_state(task, max_revisions=2):
+    return {
+        "task": task,
+        "plan": [],
+        "research_notes": [],
+        "evidence": {},
+        "draft": "",
+        "draft_sections": {},
+        "critique": "",
+        "section_approvals": {},
+        "revision_number": 0,
+        "max_revisions": max_revisions,
+        "logs": [],
+        "metrics": [],
+        "is_safe": True
+    }
+
+TASKS = [
+    "Summarize the top supply chain resilience priorities for 2025",
+    "What do the WEF Resilience Pulse Check 2025 and ASCM reports say about visibility",
+    "Draft a plan to reduce logistics cost inflation and port congestion risk",
+    "How are companies using artificial intelligence in demand forecasting",
+]
+
+def run_graph(tasks, runs, model, embeddings, max_revisions=2):
+    """
+    Invokes app_graph for each task `runs` times and collects wall-clock
+    latency, per-agent latency, tokens and revision counts.
+    """
+    import uuid
+    from graph import app_graph, run_config
+
+    wall, simulated, tokens, revisions = [], [], [], []
+    per_agent = {}
+    methods = {}
+    for _ in range(runs):
+        for task in tasks:
+            llm_before = model.stats["simulated_seconds"]
+            embed_before = embeddings.simulated_seconds
+            start = time.perf_counter()
+            result = app_graph.invoke(initial_state(task, max_revisions), config=run_config(uuid.uuid4().hex))
+            wall.append(time.perf_counter() - start)
+            simulated.append(model.stats["simulated_seconds"] - llm_before + embeddings.simulated_seconds - embed_before)
+            tokens.append(sum(m.get("total_tokens", 0) for m in result["metrics"]))
+            revisions.append(result.get("revision_number", 0))
+            method = (result.get("verification") or {}).get("method", "n/a")
+            methods[method] = methods.get(method, 0) + 1
+            for m in result["metrics"]:
+                per_agent.setdefault(m["agent"], []).append(m["latency"])
+    return {
+        "runs": len(wall),
+        "wall_seconds": summarize(wall),
+        # Fake sleeping summed across calls; parallel research steps overlap,
+        # so this can exceed wall-clock time
+        "simulated_service_seconds": summarize(simulated),
+        "agent_latency_seconds": {agent: summarize(values) for agent, values in per_agent.items()},
+        "total_tokens": summarize(tokens),
+        "revision_number": summarize(revisions),
+        "verification_methods": methods,
+    }
+
+def scenario_e2e(args):
+    """
+    End-to-end graph runs: once with zero-latency fakes (pure overhead of
+    our own code) and once with the configured latency distributions.
+    """
+    db_dir = os.path.join(WORK_DIR, "e2e_db")
+    build_seconds = build_corpus(db_dir, args.e2e_corpus, args.dim)
+    results = {"corpus_chunks": args.e2e_corpus, "corpus_build_seconds": round(build_seconds, 3)}
+    for label, llm_latency, embed_latency, per_token in [
+        ("zero_latency", LatencyModel(), LatencyModel(), 0.0),
+        ("simulated", LatencyModel.parse(args.llm_latency, seed=1), LatencyModel.parse(args.embed_latency, seed=2), args.per_token),
+    ]:
+        model = FakeChatModel(latency=llm_latency, per_output_token=per_token)
+        embeddings = FakeEmbeddings(dim=args.dim, latency=embed_latency)
+        install_llm(model)
+        install_retriever(db_dir, embeddings)
+        results[label] = run_graph(TASKS, args.runs, model, embeddings)
+    return results
+
+def scenario_retrieval(args):
+    """
+    retrieve_documents latency at several corpus sizes, hybrid vs vector,
+    with zero-latency query embeddings so only our side is measured.
+    """
+    results = {}
+    rng = random.Random(7)
+    for size in args.sizes:
+        db_dir = os.path.join(WORK_DIR, f"retrieval_{size}")
+        build_seconds = build_corpus(db_dir, size, args.dim)
+        entry = {"corpus_build_seconds": round(build_seconds, 3)}
+        for mode in ("hybrid", "vector"):
+            retriever = install_retriever(db_dir, FakeEmbeddings(dim=args.dim), mode=mode)
+            # Unique queries so the query LRU never short-circuits the search
+            natural = [f"{synthetic_text(rng, 8)} {n}" for n in range(args.queries)]
+            exact = [f"{REPORTS[n % len(REPORTS)]} {rng.choice(VOCABULARY)}" for n in range(args.queries)]
+            for kind, queries in (("natural", natural), ("exact_term", exact)):
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    retriever_module.retrieve_documents(query, k=5)
+                    latencies.append(time.perf_counter() - start)
+                entry[f"{mode}_{kind}_seconds"] = summarize(latencies)
+            entry[f"{mode}_lexical_only_queries"] = retriever.cache_stats()["lexical_only"]
+        entry["vector_backends"] = compare_vector_backends(db_dir, args, rng)
+        results[str(size)] = entry
+    return results
+
+def compare_vector_backends(db_dir, args, rng, batch=8):
+    """
+    Chroma vs the numpy index on the same store: export and load time, pure
+    search latency (query embeddings precomputed) for single queries and
+    batches of `batch`. The numpy scan is exact, so it also gives the
+    recall@5 of Chroma's approximate (HNSW) search.
+    """
+    start = time.perf_counter()
+    build_from_chroma(db_dir)
+    entry = {"numpy_export_seconds": round(time.perf_counter() - start, 3)}
+    start = time.perf_counter()
+    numpy_index = NumpyVectorIndex(os.path.join(db_dir, "vector_index"))
+    len(numpy_index)
+    entry["numpy_load_seconds"] = round(time.perf_counter() - start, 4)
+
+    queries = [f"{synthetic_text(rng, 8)} {n}" for n in range(args.queries)]
+    top = {}
+    for backend in ("chroma", "numpy"):
+        retriever = install_retriever(db_dir, FakeEmbeddings(dim=args.dim), mode="vector", backend=backend)
+        retriever.embed_queries(queries)
+        single, batched = [], []
+        results = []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(retriever.vector_search_many([query], k=5)[0])
+            single.append(time.perf_counter() - start)
+        for i in range(0, len(queries), batch):
+            start = time.perf_counter()
+            retriever.vector_search_many(queries[i:i + batch], k=5)
+            batched.append(time.perf_counter() - start)
+        entry[f"{backend}_query_seconds"] = summarize(single)
+        entry[f"{backend}_batch{batch}_seconds"] = summarize(batched)
+        top[backend] = [[doc.id for doc in docs] for docs in results]
+    recall = [len(set(approx) & set(exact)) / len(exact) for approx, exact in zip(top["chroma"], top["numpy"]) if exact]
+    entry["chroma_recall_at_5"] = round(statistics.mean(recall), 3) if recall else None
+
+    # Quantized variants of the scanned matrix (scan + full-precision re-rank)
+    query_vectors = FakeEmbeddings(dim=args.dim).embed_documents(queries)
+    for quantization in QUANTIZATIONS[1:]:
+        index_dir = os.path.join(db_dir, f"vector_index_{quantization}")
+        build_from_chroma(db_dir, index_dir, quantization=quantization)
+        quantized_index = NumpyVectorIndex(index_dir)
+        latencies = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            quantized_index.top_k([vector], k=5)
+            latencies.append(time.perf_counter() - start)
+        entry[f"numpy_{quantization}_query_seconds"] = summarize(latencies)
+    entry["quantization_recall"] = recall_report(numpy_index._load()[1], k=5, sample=args.queries)
+    return entry
+
+def write_pdfs(data_dir, files, pages, seed=0):
+    import fitz
+
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    for n in range(files):
+        pdf = fitz.open()
+        for _ in range(pages):
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, 576, 806), synthetic_text(rng, 400), fontsize=8)
+        pdf.save(os.path.join(data_dir, f"{REPORTS[n % len(REPORTS)]} part {n}.pdf"))
+        pdf.close()
+
+def scenario_ingest(args):
+    """
+    ingest_documents throughput on synthetic PDFs with fake embeddings.
+    """
+    import retrieval.ingest as ingest
+
+    ingest_dir = os.path.join(WORK_DIR, "ingest")
+    write_pdfs(os.path.join(ingest_dir, "data"), args.ingest_files, args.ingest_pages)
+    embeddings = FakeEmbeddings(dim=args.dim, latency=LatencyModel.parse(args.embed_latency, seed=3))
+    cwd = os.getcwd()
+    os.chdir(ingest_dir)
+    try:
+        start = time.perf_counter()
+        ingest.ingest_documents(rebuild=True, embeddings=embeddings, limiter=AdaptiveRateLimiter(rate=1000, max_rate=100000))
+        elapsed = time.perf_counter() - start
+        manifest = ingest.load_manifest()
+    finally:
+        os.chdir(cwd)
+    chunks = sum(entry["chunks"] for entry in manifest["files"].values())
+    pages = args.ingest_files * args.ingest_pages
+    return {
+        "files": args.ingest_files,
+        "pages_written": pages,
+        "chunks": chunks,
+        "elapsed_seconds": round(elapsed, 3),
+        "files_per_second": round(args.ingest_files / elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 2),
+        "chunks_per_second": round(chunks / elapsed, 2),
+        "embedding_calls": embeddings.calls,
+        "simulated_embedding_seconds": round(embeddings.simulated_seconds, 3),
+    }
+
+def scenario_revisions(args):
+    """
+    Cost of Writer/Verifier loops: the fake's first N drafts per task carry
+    an unsupported statistic, forcing N revisions (up to max_revisions).
+    """
+    db_dir = os.path.join(WORK_DIR, "e2e_db")
+    if not os.path.exists(db_dir):
+        build_corpus(db_dir, args.e2e_corpus, args.dim)
+    results = {}
+    for flawed in (0, 1, 2):
+        model = FakeChatModel(
+            latency=LatencyModel.parse(args.llm_latency, seed=4),
+            per_output_token=args.per_token,
+            flawed_drafts=flawed
+        )
+        embeddings = FakeEmbeddings(dim=args.dim, latency=LatencyModel.parse(args.embed_latency, seed=5))
+        install_llm(model)
+        install_retriever(db_dir, embeddings)
+        results[f"flawed_drafts_{flawed}"] = run_graph(TASKS[:2], args.runs, model, embeddings)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(baseline_path, results):
+    """
+    Prints p50/mean/throughput metrics that moved by more than 5% against
+    a previous results file.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = flatten(baseline["scenarios"])
+    new = flatten(results["scenarios"])
+    print(f"\nComparison against {baseline['meta']['commit']} ({baseline_path}):")
+    for name in sorted(set(old) & set(new)):
+        if not name.endswith((".p50", ".mean", "_per_second", "elapsed_seconds")) or not old[name]:
+            continue
+        change = (new[name] - old[name]) / old[name] * 100
+        if abs(change) >= 5:
+            print(f"  {name}: {old[name]:.4g} -> {new[name]:.4g} ({change:+.1f}%)")
+
+SCENARIO_FUNCTIONS = {
+    "e2e": scenario_e2e,
+    "retrieval": scenario_retrieval,
+    "ingest": scenario_ingest,
+    "revisions": scenario_revisions,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks with fake Gemini services.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of {SCENARIOS}.")
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions of each graph task.")
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Corpus sizes (chunks) for the retrieval scenario.")
+    parser.add_argument("--queries", type=int, default=50, help="Queries per kind and mode in the retrieval scenario.")
+    parser.add_argument("--e2e-corpus", type=int, default=2000, help="Corpus size (chunks) for graph scenarios.")
+    parser.add_argument("--ingest-files", type=int, default=6)
+    parser.add_argument("--ingest-pages", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimension.")
+    parser.add_argument("--llm-latency", default="lognormal:0.8:0.4", help="Fake LLM time to first token, dist:mean:spread.")
+    parser.add_argument("--per-token", type=float, default=0.002, help="Fake LLM seconds per output token.")
+    parser.add_argument("--embed-latency", default="lognormal:0.15:0.3", help="Fake embedding call latency.")
+    parser.add_argument("--quick", action="store_true", help="Small sizes for a fast smoke run.")
+    parser.add_argument("--output", help="Results file (default: bench/results/bench-<commit>-<time>.json).")
+    parser.add_argument("--compare", help="Previous results file to diff against.")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.runs, args.sizes, args.queries = 1, "500,2000", 20
+        args.e2e_corpus, args.ingest_files, args.ingest_pages = 500, 3, 5
+    args.sizes = [int(size) for size in args.sizes.split(",")]
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in SCENARIO_FUNCTIONS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {unknown}")
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "scenarios": {},
+    }
+    try:
+        for name in selected:
+            print(f"=== Scenario: {name} ===")
+            start = time.perf_counter()
+            results["scenarios"][name] = SCENARIO_FUNCTIONS[name](args)
+            print(f"=== {name} finished in {time.perf_counter() - start:.1f}s ===")
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"bench-{results['meta']['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nResults saved to {output}")
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 import sys
 import os
+import json
+import hashlib
+import argparse
+import asyncio
 import pandas as pd
 import time
 from dotenv import load_dotenv
@@ -7,111 +11,324 @@ from dotenv import load_dotenv
 # Add parent directory to path so we can import 'graph'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from graph import app_graph
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from graph import CACHE_DIR, GRAPH_CHECKPOINTS, afinish_run, astart_or_resume, compile_graph, run_config
+from agents import guard, llm_cache, result_cache
+import retrieval.retriever as retriever_module
+from tracing import span, start_metrics_server, trace_spans, trace_summary, METRICS_PORT
 
 # Load environment variables
 load_dotenv()
 
-def run_evaluation():
+EVAL_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_FILE = os.path.join(EVAL_DIR, "test_questions.txt")
+OUTPUT_FILE = os.path.join(EVAL_DIR, "eval_results.csv")
+CHECKPOINT_FILE = os.path.join(EVAL_DIR, "eval_checkpoint.jsonl")
+# Graph checkpoints of eval questions, kept apart from the app's database
+# (which the app prunes), so unfinished questions can always be resumed
+GRAPH_CHECKPOINT_PATH = os.path.join(CACHE_DIR, "eval_graph_checkpoints.sqlite")
+
+# Questions in flight at once. All of them share the process-wide LLM
+# rate governor, so raising this never exceeds LLM_TOKENS_PER_MINUTE.
+EVAL_CONCURRENCY = int(os.environ.get("EVAL_CONCURRENCY", "4"))
+
+def load_questions(path=QUESTIONS_FILE):
+    with open(path, "r") as f:
+        questions = [line.strip() for line in f.readlines() if line.strip()]
+    cleaned = []
+    for question in questions:
+        if question[0].isdigit() and ". " in question:
+            question = question.split(". ", 1)[1]
+        cleaned.append(question)
+    return cleaned
+
+def parse_subset(spec, count):
+    """
+    1-based question numbers from a spec like "1-3,7". None selects all.
+    """
+    if not spec:
+        return list(range(1, count + 1))
+    selected = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            start, end = part.split("-", 1)
+            selected.extend(range(int(start), int(end) + 1))
+        elif part:
+            selected.append(int(part))
+    invalid = [n for n in selected if not 1 <= n <= count]
+    if invalid:
+        raise ValueError(f"Question numbers out of range 1-{count}: {invalid}")
+    return list(dict.fromkeys(selected))
+
+def job_key(question, repeat):
+    """
+    Checkpoint key: the question text (not its line number, so editing the
+    questions file never resumes the wrong question) plus the repeat index.
+    """
+    return f"{hashlib.sha256(question.encode('utf-8')).hexdigest()[:16]}:{repeat}"
+
+def load_checkpoint(path):
+    """
+    Returns {key: row} for every completed question in the checkpoint file.
+    A truncated last line (crash mid-write) is ignored.
+    """
+    rows = {}
+    if not os.path.exists(path):
+        return rows
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            rows[row["key"]] = row
+    return rows
+
+def append_checkpoint(path, row):
+    with open(path, "a") as f:
+        f.write(json.dumps(row) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def initial_state(question):
+    return {
+        "task": question,
+        "plan": [],
+        "research_notes": [],
+        "evidence": {},
+        "draft": "",
+        "draft_sections": {},
+        "critique": "",
+        "section_approvals": {},
+        "revision_number": 0,
+        "max_revisions": 2,
+        "logs": [],
+        "metrics": [],
+        "is_safe": True
+    }
+
+async def run_question(graph, number, question, repeat, resume=True):
+    """
+    Streams one graph run and returns its result row. Latency, token and
+    time-breakdown columns come from the run's trace spans.
+
+    The graph checkpoint thread is named after the question and repeat, so
+    a run that failed last time resumes from its last completed node
+    (reported in the "Resumed" column). A completed run deletes its thread.
+    """
+    label = f"[Q{number}#{repeat}]"
+    config = run_config(f"eval:{job_key(question, repeat)}")
+    graph_input = await astart_or_resume(graph, config, initial_state(question), resume=resume)
+    if graph_input is None:
+        print(f"  {label} Resuming from checkpoint")
+
+    # State tracking variables
+    captured_draft = ""
+    captured_critique = "N/A"
+    captured_verification = {}
+    speculation = "N/A"
+    is_safe = True
+    revisions = 0
+
+    # Stream execution, traced as one "run" span per graph run
+    with span("graph_run", kind="run", question=number, repeat=repeat) as run_span:
+        async for output in graph.astream(graph_input, config=config):
+            for node_name, state_update in output.items():
+                print(f"  {label} -> Finished: {node_name}")
+                if not state_update:
+                    continue
+
+                # Capture Safety
+                if "is_safe" in state_update:
+                    is_safe = state_update["is_safe"]
+
+                # Capture Draft (Persist it even if next node doesn't have it)
+                if "draft" in state_update and state_update["draft"]:
+                    captured_draft = state_update["draft"]
+                if "revision_number" in state_update:
+                    revisions = state_update["revision_number"]
+
+                # Capture Critique
+                if "critique" in state_update:
+                    captured_critique = state_update["critique"]
+                if "verification" in state_update:
+                    captured_verification = state_update["verification"]
+                for m in state_update.get("metrics", []):
+                    if m.get("agent") == "Speculation":
+                        speculation = m["speculative_outcome"]
+
+    if graph_input is None:
+        # Nodes finished before the resume were not streamed this time
+        values = (await graph.aget_state(config)).values
+        is_safe = values.get("is_safe", is_safe)
+        captured_draft = values.get("draft") or captured_draft
+        captured_critique = values.get("critique") or captured_critique
+        captured_verification = values.get("verification") or captured_verification
+        revisions = values.get("revision_number", revisions)
+    await afinish_run(graph, config)
+
+    summary = trace_summary(trace_spans(run_span.trace_id))
+
+    return {
+        "Question #": number,
+        "Repeat": repeat,
+        "Question": question,
+        "Status": "Success" if is_safe else "Blocked",
+        "Verifier Output": captured_critique,
+        "Verification Method": captured_verification.get("method", "N/A"),
+        "Flagged Claims": len(captured_verification.get("flagged", [])),
+        "Revisions": revisions,
+        "Speculative Plan": speculation,
+        "Resumed": graph_input is None,
+        "Latency (s)": round(summary["latency"], 2),
+        "Total Tokens": summary["total_tokens"],
+        "Input Tokens": summary["input_tokens"],
+        "Output Tokens": summary["output_tokens"],
+        "LLM Calls": summary["llm_calls"],
+        "LLM Cache Hits": summary["llm_cache_hits"],
+        "LLM Time (s)": round(summary["llm_latency"], 2),
+        "Retrieval Time (s)": round(summary["retrieval_latency"], 2),
+        "Embedding Time (s)": round(summary["embedding_latency"], 2),
+        "Trace ID": run_span.trace_id,
+        "Draft Length": len(captured_draft),
+        "Draft Preview": captured_draft[:100].replace("\n", " ") + "..." if captured_draft else "N/A"
+    }
+
+async def run_jobs(jobs, concurrency, checkpoint_file, resume=True):
+    """
+    Runs (number, question, repeat) jobs with at most `concurrency` graph
+    runs in flight. Each finished question is appended to the checkpoint
+    immediately; failures are returned but not checkpointed, so a resumed
+    run retries them (from their last completed graph node).
+    """
+    if not GRAPH_CHECKPOINTS:
+        return await run_graph_jobs(compile_graph(), jobs, concurrency, checkpoint_file, resume)
+    # The async saver is bound to this event loop, so it is opened here
+    os.makedirs(os.path.dirname(os.path.abspath(GRAPH_CHECKPOINT_PATH)), exist_ok=True)
+    async with AsyncSqliteSaver.from_conn_string(GRAPH_CHECKPOINT_PATH) as saver:
+        return await run_graph_jobs(compile_graph(saver), jobs, concurrency, checkpoint_file, resume)
+
+async def run_graph_jobs(graph, jobs, concurrency, checkpoint_file, resume):
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = []
+    done = 0
+
+    async def run_one(number, question, repeat):
+        nonlocal done
+        async with semaphore:
+            print(f"\n[Q{number}#{repeat}] Processing: {question[:50]}...")
+            try:
+                row = await run_question(graph, number, question, repeat, resume)
+            except Exception as e:
+                print(f"  ! [Q{number}#{repeat}] Critical Error: {e}")
+                errors.append({
+                    "Question #": number,
+                    "Repeat": repeat,
+                    "Question": question,
+                    "Status": "Error",
+                    "Verifier Output": str(e),
+                    "Latency (s)": 0,
+                    "Total Tokens": 0,
+                    "Draft Length": 0,
+                    "Draft Preview": "Error"
+                })
+                return
+            row["key"] = job_key(question, repeat)
+            append_checkpoint(checkpoint_file, row)
+            done += 1
+            print(f"  [Q{number}#{repeat}] Done in {row['Latency (s)']}s ({done}/{len(jobs)} this run)")
+
+    await asyncio.gather(*(run_one(*job) for job in jobs))
+    return errors
+
+def latency_summary(df):
+    """
+    Per-question latency distribution across repeats.
+    """
+    ok = df[df["Status"] != "Error"]
+    summary = ok.groupby("Question #")["Latency (s)"].agg(
+        runs="count", mean="mean", std="std", p50="median",
+        p95=lambda s: s.quantile(0.95), min="min", max="max"
+    )
+    return summary.round(2)
+
+def run_evaluation(concurrency=EVAL_CONCURRENCY, subset=None, repeat=1, fresh=False, use_cache=True,
+                   questions_file=QUESTIONS_FILE, output_file=OUTPUT_FILE, checkpoint_file=CHECKPOINT_FILE):
     print("--- Starting Batch Evaluation ---")
-    
-    questions_file = os.path.join(os.path.dirname(__file__), "test_questions.txt")
-    output_file = os.path.join(os.path.dirname(__file__), "eval_results.csv")
-    
+
     if not os.path.exists(questions_file):
         print(f"Error: {questions_file} not found.")
         return
 
-    with open(questions_file, "r") as f:
-        questions = [line.strip() for line in f.readlines() if line.strip()]
+    if not use_cache:
+        # Repeats would otherwise be served from warm caches: LLM responses,
+        # stored results, Defense verdicts and query embeddings (LRU and disk)
+        llm_cache.LLM_CACHE_ENABLED = False
+        result_cache.RESULT_CACHE_ENABLED = False
+        guard.VERDICT_CACHE_ENABLED = False
+        retriever_module.QUERY_CACHE_ENABLED = False
 
-    results = []
+    questions = load_questions(questions_file)
+    numbers = parse_subset(subset, len(questions))
 
-    for i, question in enumerate(questions):
-        clean_q = question
-        if question[0].isdigit() and ". " in question:
-            clean_q = question.split(". ", 1)[1]
-            
-        print(f"\n[{i+1}/{len(questions)}] Processing: {clean_q[:50]}...")
-        
-        start_time = time.time()
-        
-        # State tracking variables
-        captured_draft = ""
-        captured_critique = "N/A"
-        is_safe = True
-        total_tokens = 0
-        
-        try:
-            initial_state = {
-                "task": clean_q,
-                "plan": [],
-                "research_notes": [],
-                "draft": "",
-                "critique": "",
-                "revision_number": 0,
-                "max_revisions": 2,
-                "logs": [],
-                "metrics": [],
-                "is_safe": True
-            }
-            
-            # Stream execution
-            for output in app_graph.stream(initial_state):
-                for node_name, state_update in output.items():
-                    print(f"  -> Finished: {node_name}")
-                    
-                    # Capture Safety
-                    if "is_safe" in state_update:
-                        is_safe = state_update["is_safe"]
-                        
-                    # Capture Draft (Persist it even if next node doesn't have it)
-                    if "draft" in state_update and state_update["draft"]:
-                        captured_draft = state_update["draft"]
-                        
-                    # Capture Critique
-                    if "critique" in state_update:
-                        captured_critique = state_update["critique"]
-                        
-                    # Aggregate Tokens
-                    if "metrics" in state_update:
-                        for m in state_update["metrics"]:
-                            total_tokens += m.get("total_tokens", 0)
-            
-            end_time = time.time()
-            
-            results.append({
-                "Question": clean_q,
-                "Status": "Success" if is_safe else "Blocked",
-                "Verifier Output": captured_critique,
-                "Latency (s)": round(end_time - start_time, 2),
-                "Total Tokens": total_tokens,
-                "Draft Length": len(captured_draft),
-                "Draft Preview": captured_draft[:100].replace("\n", " ") + "..." if captured_draft else "N/A"
-            })
-
-        except Exception as e:
-            print(f"  ! Critical Error: {e}")
-            results.append({
-                "Question": clean_q,
-                "Status": "Error",
-                "Verifier Output": str(e),
-                "Latency (s)": 0,
-                "Total Tokens": 0,
-                "Draft Length": 0,
-                "Draft Preview": "Error"
-            })
+    if fresh and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    completed = load_checkpoint(checkpoint_file)
+
+    wanted = [(n, questions[n - 1], r) for n in numbers for r in range(1, repeat + 1)]
+    jobs = [job for job in wanted if job_key(job[1], job[2]) not in completed]
+    print(f"{len(wanted)} runs selected: {len(wanted) - len(jobs)} already in checkpoint, "
+          f"{len(jobs)} to run with concurrency {concurrency}.")
+
+    start_time = time.time()
+    errors = asyncio.run(run_jobs(jobs, concurrency, checkpoint_file, resume=not fresh)) if jobs else []
+    if jobs:
+        print(f"\nRan {len(jobs)} question(s) in {time.time() - start_time:.1f}s wall-clock.")
+
+    # Results are rebuilt from the checkpoint, so resumed runs include
+    # everything finished before the interruption.
+    completed = load_checkpoint(checkpoint_file)
+    results = [completed[job_key(q, r)] for n, q, r in wanted if job_key(q, r) in completed] + errors
+    for row in results:
+        row.pop("key", None)
 
     # Save to CSV
     if results:
-        df = pd.DataFrame(results)
+        df = pd.DataFrame(results).sort_values(["Question #", "Repeat"])
         df.to_csv(output_file, index=False)
         print(f"\nEvaluation complete. Results saved to {output_file}")
         print("-" * 30)
         # Display key columns
-        print(df[["Question", "Status", "Draft Length", "Latency (s)"]].to_string())
+        print(df[["Question #", "Repeat", "Status", "Draft Length", "Latency (s)"]].to_string(index=False))
+        if repeat > 1:
+            print("\nLatency across repeats (s):")
+            print(latency_summary(df).to_string())
+        if "Speculative Plan" in df.columns:
+            # Plans produced ahead of the Defense verdict, and how many were thrown away
+            speculated = df[df["Speculative Plan"].isin(["used", "discarded"])]
+            if len(speculated):
+                wasted = (speculated["Speculative Plan"] == "discarded").sum()
+                print(f"\nSpeculative planning: {wasted}/{len(speculated)} plans discarded "
+                      f"(wasted-work rate {wasted / len(speculated):.0%}).")
     else:
         print("No results generated.")
 
 if __name__ == "__main__":
-    run_evaluation()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the copilot over eval/test_questions.txt.")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY, help="Questions in flight at once.")
+    parser.add_argument("--subset", help='Question numbers to run, e.g. "1-3,7" (default: all).')
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per question, for latency variance.")
+    parser.add_argument("--fresh", action="store_true", help="Discard the checkpoint and start over.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM response, result, Defense verdict and query embedding caches.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="Serve Prometheus metrics on this port while running (0: off).")
+    args = parser.parse_args()
+    start_metrics_server(args.metrics_port)
+    run_evaluation(
+        concurrency=args.concurrency, subset=args.subset, repeat=args.repeat, fresh=args.fresh,
+        use_cache=not args.no_cache, output_file=args.output, checkpoint_file=args.checkpoint
+    )
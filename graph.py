@@ -1,27 +1,43 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from langgraph.graph import StateGraph, END
+import os
+import sqlite3
+from langgraph.graph import StateGraph, START, END
+from langgraph.checkpoint.sqlite import SqliteSaver
 from agents.state import AgentState
 from agents.planner import planner_node
 from agents.researcher import researcher_node
 from agents.writer import writer_node
 from agents.verifier import verifier_node
 from agents.defense import defense_node 
+from agents.speculation import safety_gate_node, speculative_planner_node
+from agents.result_cache import result_cache_node, store_result_node
+from tracing import traced_node
+
+# Start planning in parallel with the Defense check; the plan is only used
+# once Defense passes the input (see agents/speculation.py)
+SPECULATIVE_PLANNING = os.environ.get("SPECULATIVE_PLANNING", "0") == "1"
+
+# Durable per-node checkpoints, so a failed run resumes from the last
+# completed node (see start_or_resume). GRAPH_CHECKPOINTS=0 disables them.
+CACHE_DIR = os.environ.get("CACHE_DIR", "./.cache")
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "graph_checkpoints.sqlite")
+GRAPH_CHECKPOINTS = os.environ.get("GRAPH_CHECKPOINTS", "1") == "1"
+# A finished run deletes its thread (finish_run). Of the threads left by
+# failed app runs, the app keeps only the most recent ones (prune_checkpoints)
+CHECKPOINT_MAX_THREADS = int(os.environ.get("CHECKPOINT_MAX_THREADS", "20"))
 
 # 1. Initialize Graph
 workflow = StateGraph(AgentState)
 
-# 2. Add Nodes
-workflow.add_node("defense", defense_node) 
-workflow.add_node("planner", planner_node)
-workflow.add_node("researcher", researcher_node)
-workflow.add_node("writer", writer_node)
-workflow.add_node("verifier", verifier_node)
-
-# 3. Define Edges
-# Start with Defense
-workflow.set_entry_point("defense")
+# 2. Add Nodes (each execution is timed as a "node" span, see tracing.py)
+workflow.add_node("result_cache", traced_node("result_cache", result_cache_node))
+workflow.add_node("store_result", traced_node("store_result", store_result_node))
+workflow.add_node("defense", traced_node("defense", defense_node)) 
+workflow.add_node("researcher", traced_node("researcher", researcher_node))
+workflow.add_node("writer", traced_node("writer", writer_node))
+workflow.add_node("verifier", traced_node("verifier", verifier_node))
 
 # Conditional Edge for Defense
 def check_safety(state: AgentState):
@@ -29,27 +45,65 @@ def check_safety(state: AgentState):
         return "planner"
     return "end"
 
-workflow.add_conditional_edges(
-    "defense",
-    check_safety,
-    {
-        "planner": "planner",
-        "end": END
-    }
-)
+# 3. Define Edges
+# A stored deliverable for the same task and index ends the run right away
+def check_result_cache(state: AgentState):
+    if (state.get("verification") or {}).get("verdict") == "approve":
+        return "end"
+    return "run"
+
+workflow.add_edge(START, "result_cache")
+
+if SPECULATIVE_PLANNING:
+    # Defense and Planner start together and join at the safety gate
+    workflow.add_node("planner", traced_node("planner", speculative_planner_node))
+    workflow.add_node("safety_gate", traced_node("safety_gate", safety_gate_node))
+    workflow.add_conditional_edges(
+        "result_cache",
+        lambda state: ["defense", "planner"] if check_result_cache(state) == "run" else END,
+        ["defense", "planner", END]
+    )
+    workflow.add_edge(["defense", "planner"], "safety_gate")
+    workflow.add_conditional_edges(
+        "safety_gate",
+        check_safety,
+        {
+            "planner": "researcher",
+            "end": END
+        }
+    )
+else:
+    workflow.add_node("planner", traced_node("planner", planner_node))
+    # Start with Defense
+    workflow.add_conditional_edges(
+        "result_cache",
+        check_result_cache,
+        {
+            "run": "defense",
+            "end": END
+        }
+    )
+    workflow.add_conditional_edges(
+        "defense",
+        check_safety,
+        {
+            "planner": "planner",
+            "end": END
+        }
+    )
+    workflow.add_edge("planner", "researcher")
 
 # Standard Flow
-workflow.add_edge("planner", "researcher")
 workflow.add_edge("researcher", "writer")
 workflow.add_edge("writer", "verifier")
 
 # Verifier Loop
 def check_verification(state: AgentState):
-    critique = state.get("critique", "").upper()
+    verdict = (state.get("verification") or {}).get("verdict")
     revision_count = state.get("revision_number", 0)
     max_revs = state.get("max_revisions", 1)
 
-    if "APPROVE" in critique:
+    if verdict == "approve":
         return "end"
     
     if revision_count >= max_revs:
@@ -62,8 +116,80 @@ workflow.add_conditional_edges(
     check_verification,
     {
         "writer": "writer",
-        "end": END
+        "end": "store_result"
     }
 )
+workflow.add_edge("store_result", END)
+
+def compile_graph(checkpointer=None):
+    return workflow.compile(checkpointer=checkpointer)
+
+def prune_checkpoints(saver, keep=CHECKPOINT_MAX_THREADS):
+    """
+    Deletes every thread but the `keep` most recently written ones.
+    Returns the number of threads deleted. Only for databases whose
+    unfinished threads may be given up (the app's); eval keeps its own.
+    """
+    saver.setup()
+    with saver.cursor() as cur:
+        cur.execute("SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(rowid) DESC")
+        stale = [row[0] for row in cur.fetchall()[keep:]]
+    for thread_id in stale:
+        saver.delete_thread(thread_id)
+    return len(stale)
+
+def sqlite_checkpointer(path=CHECKPOINT_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
+def run_config(thread_id, **configurable):
+    """
+    Graph config for one run; `thread_id` names its checkpoint history.
+    """
+    return {"configurable": {"thread_id": thread_id, **configurable}}
+
+def start_or_resume(graph, config, initial_state, resume=True):
+    """
+    Returns the input for graph.invoke/stream on this thread: None to resume
+    a run that stopped before finishing (its last completed node is kept),
+    otherwise `initial_state` on a cleared thread, since list fields would
+    append to a finished run's values. resume=False always starts over.
+    """
+    if graph.checkpointer is None:
+        return initial_state
+    snapshot = graph.get_state(config)
+    if snapshot.next and resume:
+        return None
+    if snapshot.values:
+        graph.checkpointer.delete_thread(config["configurable"]["thread_id"])
+    return initial_state
+
+def finish_run(graph, config):
+    """
+    Deletes the checkpoints of a completed run. They hold the full state,
+    evidence texts included, and are only needed to resume a failed run.
+    """
+    if graph.checkpointer is not None:
+        graph.checkpointer.delete_thread(config["configurable"]["thread_id"])
+
+async def afinish_run(graph, config):
+    """
+    finish_run for async checkpointers (AsyncSqliteSaver).
+    """
+    if graph.checkpointer is not None:
+        await graph.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+
+async def astart_or_resume(graph, config, initial_state, resume=True):
+    """
+    start_or_resume for async checkpointers (AsyncSqliteSaver).
+    """
+    if graph.checkpointer is None:
+        return initial_state
+    snapshot = await graph.aget_state(config)
+    if snapshot.next and resume:
+        return None
+    if snapshot.values:
+        await graph.checkpointer.adelete_thread(config["configurable"]["thread_id"])
+    return initial_state
 
-app_graph = workflow.compile()
\ No newline at end of file
+app_graph = compile_graph(sqlite_checkpointer() if GRAPH_CHECKPOINTS else None)
\ No newline at end of file
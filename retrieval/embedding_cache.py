@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+# Shared on-disk cache location. Lives outside ./chroma_db so a --rebuild
+# of the vector store can reuse every embedding it already paid for.
+CACHE_DIR = os.environ.get("CACHE_DIR", "./.cache")
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+def embedding_key(text, model, task_type):
+    """
+    Cache key: the same text embedded by a different model or for a
+    different task type (document vs query) is a different vector.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{model}\0{(task_type or '').lower()}\0".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+class EmbeddingCache:
+    """
+    Disk-backed, size-bounded embedding store (SQLite, float32 blobs).
+
+    Entries are evicted least-recently-used once `max_entries` is exceeded.
+    One connection is shared behind a lock, so the cache is safe to use from
+    the embedding pipeline's worker threads.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys):
+        """
+        Returns {key: vector} for the keys present in the cache.
+        """
+        found = {}
+        if not keys:
+            return found
+        unique = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now] + chunk
+                    )
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, items):
+        """
+        Stores (key, vector) pairs, then evicts down to `max_entries`.
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        size_bytes = sum(
+            os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p)
+        )
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "size_mb": round(size_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings client so every text is looked up in `cache` first
+    and only misses are sent to the API, in one call. With lookup=False it
+    only writes through (for callers that already resolved hits themselves).
+    `api_calls` and `api_texts` count what actually went over the network.
+    """
+
+    def __init__(self, embeddings, cache, model, task_type, lookup=True):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        self.task_type = task_type
+        self.lookup = lookup
+        self.api_calls = 0
+        self.api_texts = 0
+
+    def keys_for(self, texts, task_type=None):
+        return [embedding_key(text, self.model, task_type or self.task_type) for text in texts]
+
+    def embed_documents(self, texts, lookup=None, **kwargs):
+        """
+        `lookup` overrides self.lookup for this call.
+        """
+        task_type = kwargs.get("task_type") or self.task_type
+        keys = self.keys_for(texts, task_type)
+        cached = self.cache.get_many(keys) if (self.lookup if lookup is None else lookup) else {}
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            fresh = self.embeddings.embed_documents(list(missing.values()), **kwargs)
+            self.api_calls += 1
+            self.api_texts += len(missing)
+            new_items = list(zip(missing.keys(), fresh))
+            self.cache.put_many(new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text], **kwargs)[0]
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_embedding_cache():
+    """
+    Returns the process-wide EmbeddingCache, creating it on first use.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = EmbeddingCache()
+    return _shared_cache
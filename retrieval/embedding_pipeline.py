@@ -0,0 +1,177 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from retrieval.rate_limit import AdaptiveRateLimiter, is_rate_limit_error
+
+_DONE = object()
+
+class EmbeddingPipeline:
+    """
+    Producer/consumer pipeline that embeds chunks with several batches in flight.
+
+    A producer thread drains `files` (an iterable of (key, docs, ids) tuples,
+    e.g. fed straight from the parsing pool) into a pending queue. The
+    dispatcher cuts batches of `limiter.batch_size` chunks, waits on the
+    limiter for quota and a concurrency slot, and hands each batch to a worker
+    thread that calls `embeddings.embed_documents` and then `write_batch`.
+
+    Rate-limited batches go back to the front of the queue and the limiter
+    backs off; any other error fails the file that owns the chunks.
+    `on_file_done(key)` is called from the dispatcher thread once every chunk
+    of a file has been written.
+    """
+
+    def __init__(self, embeddings, write_batch, limiter=None, on_file_done=None, max_retries=20):
+        self.embeddings = embeddings
+        self.write_batch = write_batch
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.on_file_done = on_file_done
+        self.max_retries = max_retries
+        self.failed = {}
+
+    def _embed_batch(self, batch):
+        try:
+            texts = [doc.page_content for _, doc, _ in batch]
+            vectors = self.embeddings.embed_documents(texts)
+            self.write_batch([doc for _, doc, _ in batch], [chunk_id for _, _, chunk_id in batch], vectors)
+            return batch, None
+        except Exception as e:
+            return batch, e
+        finally:
+            self.limiter.release()
+
+    def run(self, files):
+        """
+        Consumes `files` and returns once every chunk is written or failed.
+        Returns a stats dict (chunks, batches, elapsed, limiter snapshot).
+        """
+        start_time = time.time()
+        incoming = queue.Queue(maxsize=4)
+        completed = queue.Queue()
+
+        producer_error = []
+
+        def produce():
+            try:
+                for item in files:
+                    incoming.put(item)
+            except Exception as e:
+                producer_error.append(e)
+            finally:
+                incoming.put(_DONE)
+
+        threading.Thread(target=produce, daemon=True).start()
+
+        pending = deque()
+        remaining = {}
+        attempts = {}
+        producer_done = False
+        in_flight = 0
+        written = 0
+        batches = 0
+
+        executor = ThreadPoolExecutor(max_workers=self.limiter.max_concurrency)
+        try:
+            while not (producer_done and not pending and in_flight == 0):
+                # 1. Pull newly parsed files without blocking the dispatcher
+                idle = not pending and in_flight == 0
+                while not producer_done:
+                    try:
+                        item = incoming.get(timeout=0.05) if idle else incoming.get_nowait()
+                    except queue.Empty:
+                        break
+                    idle = False
+                    if item is _DONE:
+                        producer_done = True
+                        break
+                    key, docs, ids = item
+                    remaining[key] = len(docs)
+                    if not docs:
+                        self._finish(key)
+                        continue
+                    pending.extend((key, doc, chunk_id) for doc, chunk_id in zip(docs, ids))
+
+                # 2. Dispatch as many batches as quota and concurrency allow
+                while pending and in_flight < self.limiter.concurrency:
+                    batch = [pending.popleft() for _ in range(min(self.limiter.batch_size, len(pending)))]
+                    batch = [entry for entry in batch if entry[0] not in self.failed]
+                    if not batch:
+                        continue
+                    self.limiter.acquire(len(batch))
+                    executor.submit(self._embed_batch, batch).add_done_callback(
+                        lambda future: completed.put(future.result())
+                    )
+                    in_flight += 1
+
+                # 3. Handle finished batches
+                try:
+                    batch, error = completed.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                in_flight -= 1
+                while True:
+                    self._handle_result(batch, error, pending, remaining, attempts)
+                    if error is None:
+                        written += len(batch)
+                        batches += 1
+                    try:
+                        batch, error = completed.get_nowait()
+                    except queue.Empty:
+                        break
+                    in_flight -= 1
+        finally:
+            executor.shutdown(wait=True)
+
+        # Whatever was already queued got written; surface the producer's failure
+        if producer_error:
+            raise producer_error[0]
+
+        elapsed = time.time() - start_time
+        return {
+            "chunks": written,
+            "batches": batches,
+            "elapsed": elapsed,
+            "chunks_per_second": written / elapsed if elapsed else 0.0,
+            "failed_files": dict(self.failed),
+            "limiter": self.limiter.snapshot(),
+        }
+
+    def _handle_result(self, batch, error, pending, remaining, attempts):
+        if error is None:
+            self.limiter.on_success(len(batch))
+            for key, _, _ in batch:
+                if key in self.failed:
+                    continue
+                remaining[key] -= 1
+                if remaining[key] == 0:
+                    self._finish(key)
+            return
+
+        if is_rate_limit_error(error):
+            self.limiter.on_rate_limited()
+            retry = []
+            for entry in batch:
+                chunk_id = entry[2]
+                attempts[chunk_id] = attempts.get(chunk_id, 0) + 1
+                if attempts[chunk_id] > self.max_retries:
+                    self._fail(entry[0], "rate limit retries exhausted")
+                elif entry[0] not in self.failed:
+                    retry.append(entry)
+            pending.extendleft(reversed(retry))
+            return
+
+        self.limiter.on_error()
+        for key, _, _ in batch:
+            self._fail(key, str(error))
+
+    def _fail(self, key, reason):
+        if key not in self.failed:
+            print(f"    ! Embedding failed for {key}: {reason}")
+            self.failed[key] = reason
+
+    def _finish(self, key):
+        if self.on_file_done and key not in self.failed:
+            self.on_file_done(key)
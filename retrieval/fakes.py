@@ -0,0 +1,167 @@
+"""
+Local stand-ins for the Gemini embedding service.
+
+Used to exercise the ingestion pipeline and rate limiter, and by the
+offline benchmarks (bench/run_bench.py), without spending quota. Run this
+module directly for a quick throughput check:
+
+    python retrieval/fakes.py --quota 60 --chunks 600
+"""
+import argparse
+import hashlib
+import math
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+
+def fake_vector(text, dim):
+    """
+    Deterministic unit vector derived from the text hash.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vector = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+class LatencyModel:
+    """
+    Seeded latency distribution for fake services.
+
+    `dist` is "fixed", "uniform" (mean +/- spread), "normal" (sd = spread,
+    clipped at 0) or "lognormal" (median = mean, sigma = spread). Specs
+    parse from strings such as "lognormal:0.8:0.4" or "fixed:0".
+    """
+
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, dist="fixed", mean=0.0, spread=0.0, seed=0):
+        if dist not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {dist!r}; expected one of {self.DISTRIBUTIONS}")
+        self.dist = dist
+        self.mean = mean
+        self.spread = spread
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec, seed=0):
+        parts = spec.split(":")
+        dist = parts[0]
+        mean = float(parts[1]) if len(parts) > 1 else 0.0
+        spread = float(parts[2]) if len(parts) > 2 else 0.0
+        return cls(dist, mean, spread, seed=seed)
+
+    def sample(self):
+        if self.mean <= 0 and self.dist != "uniform":
+            return 0.0
+        with self._lock:
+            if self.dist == "fixed":
+                value = self.mean
+            elif self.dist == "uniform":
+                value = self._rng.uniform(self.mean - self.spread, self.mean + self.spread)
+            elif self.dist == "normal":
+                value = self._rng.gauss(self.mean, self.spread)
+            else:
+                value = self.mean * math.exp(self._rng.gauss(0, self.spread))
+        return max(0.0, value)
+
+    def __repr__(self):
+        return f"{self.dist}:{self.mean}:{self.spread}"
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings with simulated latency: each call sleeps one
+    sample of `latency` plus `per_text` seconds per text. `simulated_seconds`
+    adds up the sleeping, so callers can separate it from their own overhead.
+    """
+
+    def __init__(self, dim=768, latency=None, per_text=0.0):
+        self.dim = dim
+        self.latency = latency or LatencyModel()
+        self.per_text = per_text
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.texts = 0
+        self.simulated_seconds = 0.0
+
+    def embed_documents(self, texts, **kwargs):
+        delay = self.latency.sample() + self.per_text * len(texts)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.calls += 1
+            self.texts += len(texts)
+            self.simulated_seconds += delay
+        return [fake_vector(text, self.dim) for text in texts]
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text])[0]
+
+class RateLimitedFakeEmbeddings(Embeddings):
+    """
+    Fake embedding service that enforces a per-window quota like the real API.
+
+    Allows `quota` texts per second, averaged over a sliding `window` of
+    seconds (the real API counts per minute). A call that would exceed it is
+    rejected with a 429 RESOURCE_EXHAUSTED error and consumes nothing.
+    Accepted calls sleep `latency` seconds.
+    """
+
+    def __init__(self, quota=60, window=5.0, dim=768, latency=0.05):
+        self.quota = quota
+        self.window = window
+        self.dim = dim
+        self.latency = latency
+        self._accepted = deque()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rejected = 0
+
+    def _admit(self, units):
+        with self._lock:
+            now = time.monotonic()
+            while self._accepted and now - self._accepted[0] >= self.window:
+                self._accepted.popleft()
+            self.calls += 1
+            if len(self._accepted) + units > self.quota * self.window:
+                self.rejected += 1
+                raise Exception("429 RESOURCE_EXHAUSTED: fake quota exceeded")
+            self._accepted.extend([now] * units)
+
+    def embed_documents(self, texts, **kwargs):
+        self._admit(len(texts))
+        time.sleep(self.latency)
+        return [fake_vector(text, self.dim) for text in texts]
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text])[0]
+
+if __name__ == "__main__":
+    from langchain_core.documents import Document
+    from retrieval.embedding_pipeline import EmbeddingPipeline
+    from retrieval.rate_limit import AdaptiveRateLimiter
+
+    parser = argparse.ArgumentParser(description="Run the embedding pipeline against a rate-limited fake.")
+    parser.add_argument("--quota", type=int, default=60, help="Texts accepted per second by the fake.")
+    parser.add_argument("--chunks", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    fake = RateLimitedFakeEmbeddings(quota=args.quota, latency=args.latency, dim=8)
+    docs = [Document(page_content=f"chunk {i}") for i in range(args.chunks)]
+    files = [(f"file-{n}", docs[n::10], [f"{n}-{i}" for i in range(len(docs[n::10]))]) for n in range(10)]
+
+    pipeline = EmbeddingPipeline(fake, lambda docs, ids, vectors: None, AdaptiveRateLimiter(quota_window=fake.window))
+    stats = pipeline.run(files)
+    print(f"Embedded {stats['chunks']} chunks in {stats['elapsed']:.1f}s "
+          f"({stats['chunks_per_second']:.1f}/s vs quota {args.quota}/s); "
+          f"{fake.rejected}/{fake.calls} calls rejected")
+    print(f"Limiter settled at: {stats['limiter']}")
@@ -1,8 +1,14 @@
 import os
+import sys
+import json
 import shutil
+import hashlib
+import argparse
 import time
-import random
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 import logging
+import threading
 from dotenv import load_dotenv
 from langchain_community.document_loaders import PyMuPDFLoader, PyPDFLoader
 from langchain_community.docstore.document import Document
@@ -11,12 +17,23 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval.embedding_pipeline import EmbeddingPipeline
+from retrieval.rate_limit import AdaptiveRateLimiter
+from retrieval.embedding_cache import CachedEmbeddings, get_embedding_cache
+from retrieval.lexical_index import LexicalIndex
+from retrieval.vector_index import QUANTIZATIONS, VECTOR_QUANTIZATION, build_from_chroma, current_dir
+
 # Load environment variables
 load_dotenv()
 
 # Configuration
 DATA_DIR = "./data"
 DB_DIR = "./chroma_db"
+MANIFEST_PATH = os.path.join(DB_DIR, "ingest_manifest.json")
+LEXICAL_INDEX_PATH = os.path.join(DB_DIR, "lexical_index.sqlite")
+VECTOR_INDEX_DIR = os.path.join(DB_DIR, "vector_index")
 
 # Chunking for Gemini 3 Flash
 CHUNK_SIZE = 2000  
@@ -25,38 +42,59 @@ CHUNK_OVERLAP = 200
 # Embedding model
 EMBEDDING_MODEL = "gemini-embedding-001"
 
-def load_pdf_triple_fallback(file_path):
+# Parsing pool: worker processes and per-file wall-clock limit (seconds)
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+PARSE_TIMEOUT = float(os.environ.get("PARSE_TIMEOUT", "300"))
+
+# Embedding pipeline: starting rate (chunks/s) and max batches in flight.
+# The limiter adapts both to the 429s it actually sees.
+EMBED_RATE = float(os.environ.get("EMBED_RATE", "10"))
+EMBED_MAX_CONCURRENCY = int(os.environ.get("EMBED_MAX_CONCURRENCY", "8"))
+
+def load_pdf_triple_fallback(file_path, timings=None):
     """
     Attempts to load a PDF using 3 different libraries.
     1. PyMuPDF (Fastest, best metadata)
     2. PyPDF (Standard fallback)
     3. PDFPlumber (Slowest, but handles corrupt/weird PDFs best)
+
+    If a `timings` dict is passed, the seconds spent in each attempted
+    strategy are recorded in it (keyed by strategy name).
     """
     filename = os.path.basename(file_path)
+    if timings is None:
+        timings = {}
     
     # --- STRATEGY 1: PyMuPDF ---
+    started = time.time()
     try:
         loader = PyMuPDFLoader(file_path)
         docs = loader.load()
         if docs and any(d.page_content.strip() for d in docs):
+            timings["pymupdf"] = time.time() - started
             return docs
     except Exception:
         pass # Silently fail to next strategy
+    timings["pymupdf"] = time.time() - started
 
     print(f"  > PyMuPDF failed/empty for {filename}. Trying Strategy 2 (PyPDF)...")
 
     # --- STRATEGY 2: PyPDF ---
+    started = time.time()
     try:
         loader = PyPDFLoader(file_path)
         docs = loader.load()
         if docs and any(d.page_content.strip() for d in docs):
+            timings["pypdf"] = time.time() - started
             return docs
     except Exception:
         pass
+    timings["pypdf"] = time.time() - started
 
     print(f"  > PyPDF failed for {filename}. Trying Strategy 3 (PDFPlumber)...")
 
     # --- STRATEGY 3: PDFPlumber (Last Resort)---
+    started = time.time()
     try:
         docs = []
         with pdfplumber.open(file_path) as pdf:
@@ -69,35 +107,259 @@ def load_pdf_triple_fallback(file_path):
                         metadata={"source": filename, "page": i + 1}
                     ))
         if docs:
+            timings["pdfplumber"] = time.time() - started
             return docs
     except Exception as e:
         print(f"  ! PDFPlumber failed for {filename}: {e}")
+    timings["pdfplumber"] = time.time() - started
 
     # If we get here, the file is likely an image scan or completely corrupt
     return None
 
-def add_documents_with_backoff(vector_store, batch, retries=5):
+def file_sha256(file_path):
     """
-    Adds documents to Chroma with exponential backoff for 429 errors.
+    Content hash used to detect new or changed PDFs between ingest runs.
     """
-    for attempt in range(retries):
-        try:
-            vector_store.add_documents(documents=batch)
-            return True
-        except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                wait_time = (2 ** attempt) + random.uniform(0, 1)
-                print(f"    ! Rate limit hit. Retrying in {wait_time:.1f}s...")
-                time.sleep(wait_time)
-            else:
-                print(f"    ! Error adding batch: {e}")
-                raise e
-    return False
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def ingest_params():
+    """
+    Everything besides file content that changes what ends up in the store.
+    If any of these differ from the manifest, every file is re-processed.
+    """
+    return {
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": EMBEDDING_MODEL,
+        # Chunk IDs were derived from content alone before; re-writing every
+        # file once repairs stores where duplicate files shared IDs
+        "chunk_ids": "source+content",
+    }
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {"params": None, "files": {}}
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        print("  ! Manifest unreadable. Treating every file as new.")
+        return {"params": None, "files": {}}
+
+def save_manifest(manifest):
+    # Write-then-rename so an interrupted run never leaves a truncated manifest
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def load_and_split(file_path, timings=None):
+    """
+    Parses one PDF and splits it into chunks with clean source/page metadata.
+    Returns an empty list if nothing could be extracted.
+    """
+    filename = os.path.basename(file_path)
+    docs = load_pdf_triple_fallback(file_path, timings)
+    
+    if not docs:
+        print(f"  ! FAILED {filename}: All extraction methods failed. Skipping.")
+        return []
+
+    # Clean Metadata
+    for doc in docs:
+        doc.metadata["source"] = filename
+        # Ensure page exists and is integer
+        if "page" in doc.metadata:
+            try:
+                doc.metadata["page"] = int(doc.metadata["page"])
+                if doc.metadata["page"] == 0: doc.metadata["page"] = 1
+            except:
+                doc.metadata["page"] = 1
+        else:
+            doc.metadata["page"] = 1
+
+    # Split Text
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, 
+        chunk_overlap=CHUNK_OVERLAP
+    )
+    return text_splitter.split_documents(docs)
+
+def parse_file(file_path):
+    """
+    Process-pool worker: parse + split one PDF and report how long it took.
+    Must stay a module-level function so it can be pickled.
+    """
+    started = time.time()
+    timings = {}
+    splits = load_and_split(file_path, timings)
+    return {
+        "filename": os.path.basename(file_path),
+        "splits": splits,
+        "pages": len({d.metadata.get("page") for d in splits}),
+        "timings": timings,
+        "elapsed": time.time() - started,
+        "error": None,
+    }
+
+def _terminate_pool(executor):
+    # ProcessPoolExecutor has no per-task cancel once a task is running, so a
+    # hung parse can only be stopped by killing the workers themselves.
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def parse_files(file_paths, workers=INGEST_WORKERS, timeout=PARSE_TIMEOUT):
+    """
+    Parses PDFs in a process pool and yields each result as soon as its file
+    finishes, so embedding can start before the slowest PDF is done.
+
+    At most `workers` files are in flight, which means a file starts running
+    when it is submitted and its timeout is measured from that moment. A file
+    that exceeds `timeout` is reported with an error; the pool is restarted
+    and the other in-flight files are resubmitted.
+    """
+    queue = list(file_paths)
+    workers = max(1, min(workers, len(queue) or 1))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    in_flight = {}
+
+    try:
+        while queue or in_flight:
+            while queue and len(in_flight) < workers:
+                path = queue.pop(0)
+                in_flight[executor.submit(parse_file, path)] = (path, time.time())
+
+            now = time.time()
+            next_deadline = min(started + timeout for _, started in in_flight.values())
+            done, _ = wait(in_flight, timeout=max(0, next_deadline - now), return_when=FIRST_COMPLETED)
+
+            broken = []
+            for future in done:
+                path, started = in_flight.pop(future)
+                try:
+                    yield future.result()
+                except BrokenProcessPool:
+                    broken.append(path)
+                except Exception as e:
+                    yield {"filename": os.path.basename(path), "splits": [], "pages": 0,
+                           "timings": {}, "elapsed": time.time() - started, "error": str(e)}
+
+            now = time.time()
+            expired = [f for f, (_, started) in in_flight.items() if now - started >= timeout]
+            if not expired and not broken:
+                continue
+
+            for future in expired:
+                path, started = in_flight.pop(future)
+                yield {"filename": os.path.basename(path), "splits": [], "pages": 0,
+                       "timings": {}, "elapsed": now - started,
+                       "error": f"Timed out after {timeout:g}s"}
+
+            # Restart the pool and requeue whatever was still running on it
+            _terminate_pool(executor)
+            queue = broken + [path for path, _ in in_flight.values()] + queue
+            in_flight = {}
+            executor = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def chunk_ids_for(filename, file_hash, splits):
+    """
+    Deterministic chunk IDs derived from the file name and content hash, so
+    re-ingesting the same file always produces the same IDs, and two files
+    with identical content never share (and overwrite) each other's chunks.
+    """
+    file_key = hashlib.sha256(f"{filename}\0{file_hash}".encode("utf-8")).hexdigest()[:16]
+    return [f"{file_key}-{i:05d}" for i in range(len(splits))]
+
+def make_store_writer(vector_store):
+    """
+    Returns a write_batch(docs, ids, vectors) callback for the embedding
+    pipeline, plus the lock that serializes all store writes (SQLite).
+    Vectors are computed by the pipeline, so Chroma is given them directly.
+    """
+    lock = threading.Lock()
+
+    def write_batch(docs, ids, vectors):
+        with lock:
+            vector_store._collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                documents=[doc.page_content for doc in docs],
+                metadatas=[doc.metadata for doc in docs]
+            )
+
+    return write_batch, lock
+
+def backfill_lexical_index(lexical_index, db_dir=DB_DIR):
+    """
+    Builds the BM25 index from chunks already in Chroma (stores ingested
+    before the lexical index existed). Needs no parsing or embedding.
+    """
+    print("Building lexical index from the existing vector store...")
+    vector_store = Chroma(persist_directory=db_dir)
+    stored = vector_store._collection.get(include=["documents", "metadatas"])
+    by_source = {}
+    for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+        metadata = metadata or {}
+        docs, ids = by_source.setdefault(metadata.get("source", "Unknown"), ([], []))
+        docs.append(Document(page_content=text, metadata=metadata))
+        ids.append(chunk_id)
+    for source, (docs, ids) in by_source.items():
+        lexical_index.replace_source(source, docs, ids)
+    print(f"  - Indexed {len(stored['ids'])} chunks from {len(by_source)} files")
+
+def vector_index_quantization(index_dir=VECTOR_INDEX_DIR):
+    """
+    Quantization of the exported vector index, or None if there is none.
+    """
+    try:
+        with open(os.path.join(current_dir(index_dir), "index.json")) as f:
+            return json.load(f).get("quantization", "none")
+    except (OSError, ValueError):
+        return None
+
+def export_vector_index(db_dir=DB_DIR, quantization=VECTOR_QUANTIZATION):
+    """
+    Rewrites the in-process vector index (VECTOR_BACKEND=numpy) from the
+    chunks now in Chroma, storing the scanned matrix as `quantization`.
+    """
+    started = time.time()
+    count = build_from_chroma(db_dir, os.path.join(db_dir, "vector_index"), quantization=quantization)
+    print(f"  - Vector index: {count} chunks ({quantization}) written in {time.time() - started:.2f}s")
+
+def ingest_documents(rebuild=False, workers=INGEST_WORKERS, timeout=PARSE_TIMEOUT,
+                     embeddings=None, limiter=None, embedding_cache=None, quantization=VECTOR_QUANTIZATION):
+    """
+    Incrementally syncs ./chroma_db with the PDFs in ./data.
 
-def ingest_documents():
+    A manifest of per-file content hashes (plus chunking/embedding params)
+    lives next to the store. Only new or changed files are parsed, split and
+    embedded; chunks of changed or removed files are deleted. Pass
+    rebuild=True to wipe the store and start over.
+
+    Parsing and splitting run in a pool of `workers` processes with a
+    per-file `timeout` (seconds). Embedding runs through an adaptive,
+    rate-limited pipeline; `embeddings` and `limiter` can be injected (e.g.
+    retrieval.fakes.RateLimitedFakeEmbeddings) to exercise it offline.
+
+    A BM25 index of the same chunks (lexical_index.sqlite) is kept in sync
+    next to the store for hybrid retrieval, and the memory-mapped vector
+    index (vector_index/) is re-exported from the store at the end, with
+    its scanned matrix stored as `quantization` (none/float16/int8).
+
+    Chunk embeddings are looked up in the persistent embedding cache first,
+    so re-embedding unchanged text (rebuilds, chunking changes that leave
+    chunks intact) costs no API calls. Injected embeddings only use a cache
+    that is passed in explicitly, so fake vectors never pollute the shared one.
+    """
     api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    if not api_key and embeddings is None:
         raise ValueError("GOOGLE_API_KEY not found in .env file.")
 
     if not os.path.exists(DATA_DIR):
@@ -105,22 +367,30 @@ def ingest_documents():
         print(f"Created {DATA_DIR}. Please put your PDF files here.")
         return
 
-    print(f"Initializing Embedding Model ({EMBEDDING_MODEL})...")
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model=EMBEDDING_MODEL,
-        google_api_key=api_key,
-        task_type="retrieval_document"
-    )
-
-    all_splits = []
-    pdf_files = [f for f in os.listdir(DATA_DIR) if f.lower().endswith('.pdf')]
+    pdf_files = sorted(f for f in os.listdir(DATA_DIR) if f.lower().endswith('.pdf'))
 
     if not pdf_files:
         print("No PDF files found in /data.")
         return
 
-    print(f"Processing {len(pdf_files)} documents...")
+    if rebuild and os.path.exists(DB_DIR):
+        try:
+            shutil.rmtree(DB_DIR)
+        except PermissionError:
+            print("Error: Could not delete old DB. Close open apps and retry.")
+            return
 
+    os.makedirs(DB_DIR, exist_ok=True)
+    manifest = load_manifest()
+    params = ingest_params()
+    if manifest.get("params") != params:
+        if manifest.get("files"):
+            print("Chunking/embedding parameters changed. Re-processing all files.")
+        manifest = {"params": params, "files": {}, "stale": sorted(manifest.get("files", {}))}
+    
+    # Diff ./data against the manifest
+    current = {}
+    to_process = []
     for filename in pdf_files:
         file_path = os.path.join(DATA_DIR, filename)
         
@@ -129,74 +399,149 @@ def ingest_documents():
             print(f"  ! SKIPPING {filename}: File size is 0 bytes.")
             continue
 
-        docs = load_pdf_triple_fallback(file_path)
-        
-        if not docs:
-            print(f"  ! FAILED {filename}: All extraction methods failed. Skipping.")
+        file_hash = file_sha256(file_path)
+        current[filename] = file_hash
+        entry = manifest["files"].get(filename)
+        if entry and entry.get("sha256") == file_hash:
             continue
+        to_process.append(filename)
 
-        # Clean Metadata
-        for doc in docs:
-            doc.metadata["source"] = filename
-            # Ensure page exists and is integer
-            if "page" in doc.metadata:
-                try:
-                    doc.metadata["page"] = int(doc.metadata["page"])
-                    if doc.metadata["page"] == 0: doc.metadata["page"] = 1
-                except:
-                    doc.metadata["page"] = 1
-            else:
-                doc.metadata["page"] = 1
+    removed = sorted(
+        (set(manifest["files"]) | set(manifest.get("stale", []))) - set(current)
+    )
 
-        # Split Text
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE, 
-            chunk_overlap=CHUNK_OVERLAP
-        )
-        splits = text_splitter.split_documents(docs)
-        
-        if splits:
-            all_splits.extend(splits)
-            print(f"  - Loaded {filename}: {len(splits)} chunks")
-        else:
-            print(f"  - Loaded {filename}: 0 chunks (Empty text layer?)")
+    print(f"Found {len(pdf_files)} documents: {len(to_process)} new/changed, "
+          f"{len(removed)} removed, {len(current) - len(to_process)} unchanged.")
 
-    if not all_splits:
-        print("No valid chunks created. Exiting.")
+    lexical_index = LexicalIndex(LEXICAL_INDEX_PATH)
+    if not to_process and not removed:
+        if set(manifest["files"]) - lexical_index.sources():
+            backfill_lexical_index(lexical_index, DB_DIR)
+        if manifest["files"] and vector_index_quantization() != quantization:
+            export_vector_index(DB_DIR, quantization)
+        print("Vector store is up to date.")
         return
 
-    # Create/Reset Vector Store
-    if os.path.exists(DB_DIR):
-        try:
-            shutil.rmtree(DB_DIR)
-        except PermissionError:
-            print("Error: Could not delete old DB. Close open apps and retry.")
-            return
-        
-    print(f"Creating vector store with {len(all_splits)} chunks...")
-    
+    if embeddings is None:
+        print(f"Initializing Embedding Model ({EMBEDDING_MODEL})...")
+        embeddings = GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=api_key,
+            task_type="retrieval_document"
+        )
+        if embedding_cache is None:
+            embedding_cache = get_embedding_cache()
+    cached_embeddings = None
+    if embedding_cache is not None:
+        # Hits are resolved per file below; the pipeline only writes misses through
+        cached_embeddings = CachedEmbeddings(
+            embeddings, embedding_cache, EMBEDDING_MODEL, "retrieval_document", lookup=False
+        )
     vector_store = Chroma(
         embedding_function=embeddings,
         persist_directory=DB_DIR
     )
+
+    # Drop chunks of files that no longer exist
+    for filename in removed:
+        vector_store.delete(where={"source": filename})
+        lexical_index.remove_source(filename)
+        manifest["files"].pop(filename, None)
+        print(f"  - Removed {filename}")
+    manifest.pop("stale", None)
+    save_manifest(manifest)
+
+    # Parsing runs in worker processes and feeds the embedding pipeline as
+    # each file finishes; several embedding batches are in flight at once.
+    write_batch, store_lock = make_store_writer(vector_store)
+    paths = [os.path.join(DATA_DIR, filename) for filename in to_process]
+    parse_stats = {"pages": 0}
+    cache_stats = {"reused": 0}
+    chunk_counts = {}
+    if paths:
+        print(f"Parsing {len(paths)} files with {min(workers, len(paths))} workers...")
+
+    def parsed_files():
+        for parsed in parse_files(paths, workers=workers, timeout=timeout):
+            filename = parsed["filename"]
+            splits = parsed["splits"]
+            strategy_times = ", ".join(f"{name} {secs:.2f}s" for name, secs in parsed["timings"].items())
+
+            if parsed["error"]:
+                print(f"  ! FAILED {filename}: {parsed['error']}. Skipping.")
+                continue
+            
+            parse_stats["pages"] += parsed["pages"]
+            chunk_counts[filename] = len(splits)
+            if splits:
+                print(f"  - Loaded {filename}: {len(splits)} chunks, {parsed['pages']} pages "
+                      f"in {parsed['elapsed']:.2f}s [{strategy_times}]")
+            else:
+                print(f"  - Loaded {filename}: 0 chunks (Empty text layer?) [{strategy_times}]")
+
+            # Replace whatever the store held for this file (old version or a
+            # partially written previous attempt) with the new chunks.
+            with store_lock:
+                vector_store.delete(where={"source": filename})
+            ids = chunk_ids_for(filename, current[filename], splits)
+            # The BM25 side needs no embeddings, so it is updated right away
+            lexical_index.replace_source(filename, splits, ids)
+
+            # Chunks whose text was embedded before are written straight from
+            # the cache; only the rest go through the rate-limited pipeline.
+            if cached_embeddings is not None and splits:
+                keys = cached_embeddings.keys_for([doc.page_content for doc in splits])
+                hits = embedding_cache.get_many(keys)
+                if hits:
+                    write_batch(
+                        [doc for doc, key in zip(splits, keys) if key in hits],
+                        [chunk_id for chunk_id, key in zip(ids, keys) if key in hits],
+                        [hits[key] for key in keys if key in hits]
+                    )
+                    cache_stats["reused"] += len([key for key in keys if key in hits])
+                    misses = [(doc, chunk_id) for doc, chunk_id, key in zip(splits, ids, keys) if key not in hits]
+                    splits = [doc for doc, _ in misses]
+                    ids = [chunk_id for _, chunk_id in misses]
+            yield filename, splits, ids
+
+    def on_file_done(filename):
+        manifest["files"][filename] = {"sha256": current[filename], "chunks": chunk_counts.get(filename, 0)}
+        save_manifest(manifest)
+        print(f"  - Embedded {filename}")
+
+    for filename in to_process:
+        manifest["files"].pop(filename, None)
+    save_manifest(manifest)
+
+    pipeline = EmbeddingPipeline(
+        cached_embeddings or embeddings,
+        write_batch,
+        limiter or AdaptiveRateLimiter(rate=EMBED_RATE, max_concurrency=EMBED_MAX_CONCURRENCY),
+        on_file_done=on_file_done
+    )
+    stats = pipeline.run(parsed_files())
+
+    elapsed = stats["elapsed"]
+    if paths and elapsed > 0:
+        print(f"Throughput: {len(paths) / elapsed:.2f} files/s, {parse_stats['pages'] / elapsed:.1f} pages/s, "
+              f"{stats['chunks'] / elapsed:.1f} chunks/s embedded ({elapsed:.1f}s total)")
+        print(f"Embedding limiter: {stats['limiter']}")
+    if embedding_cache is not None:
+        print(f"Embedding cache: reused {cache_stats['reused']} chunks, "
+              f"embedded {cached_embeddings.api_texts} in {cached_embeddings.api_calls} API calls. "
+              f"Cache: {embedding_cache.stats()}")
+    if stats["failed_files"]:
+        print(f"{len(stats['failed_files'])} file(s) failed to embed. Re-run to retry them.")
+    export_vector_index(DB_DIR, quantization)
     
-    # BATCH PROCESSING
-    batch_size = 25
-    total_batches = (len(all_splits) // batch_size) + 1
-    
-    print(f"Starting ingestion in {total_batches} batches...")
-    
-    for i in range(0, len(all_splits), batch_size):
-        batch = all_splits[i:i+batch_size]
-        try:
-            add_documents_with_backoff(vector_store, batch)
-            print(f"  - Processed batch {i//batch_size + 1}/{total_batches}")
-            time.sleep(1.5) 
-        except Exception as e:
-            print(f"Critical error on batch {i}: {e}")
-            break
-    
-    print("Ingestion Complete! Vector store saved to ./chroma_db")
+    print(f"Ingestion Complete! Vector store saved to {DB_DIR}")
 
 if __name__ == "__main__":
-    ingest_documents()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sync ./chroma_db with the PDFs in ./data.")
+    parser.add_argument("--rebuild", action="store_true", help="Wipe the vector store and re-ingest everything.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Parsing processes.")
+    parser.add_argument("--timeout", type=float, default=PARSE_TIMEOUT, help="Per-file parse timeout in seconds.")
+    parser.add_argument("--quantize", choices=QUANTIZATIONS, default=VECTOR_QUANTIZATION,
+                        help="Storage of the vector index's scanned matrix (see retrieval/vector_index.py --recall).")
+    args = parser.parse_args()
+    ingest_documents(rebuild=args.rebuild, workers=args.workers, timeout=args.timeout, quantization=args.quantize)
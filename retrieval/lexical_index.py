@@ -0,0 +1,179 @@
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+
+# Lives inside the vector store directory so --rebuild wipes both together
+DB_DIR = "./chroma_db"
+LEXICAL_INDEX_PATH = os.path.join(DB_DIR, "lexical_index.sqlite")
+
+# Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[&'][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or "
+    "that the their this to was were what which with".split()
+)
+
+def tokenize(text):
+    """
+    Lowercased word/number tokens with common English stopwords removed.
+    Acronyms and years ("DHL", "2025") survive as-is, which is what makes
+    exact report names match.
+    """
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25:
+    """
+    Immutable in-memory BM25 over a snapshot of the indexed chunks.
+    Scoring only touches the posting lists of the query terms.
+    """
+
+    def __init__(self, ids, documents, term_freqs, k1=BM25_K1, b=BM25_B):
+        self.ids = ids
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.sources = [doc.metadata.get("source") for doc in documents]
+        self.lengths = [sum(tf.values()) for tf in term_freqs]
+        self.avgdl = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.postings = {}
+        for idx, tf in enumerate(term_freqs):
+            for term, count in tf.items():
+                self.postings.setdefault(term, []).append((idx, count))
+        n = len(ids)
+        self.idf = {
+            term: math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, terms, k, sources=None):
+        """
+        Returns up to k (index, score, matched_terms) tuples, best first.
+        With `sources`, only chunks of those source files are scored.
+        """
+        scores = {}
+        matched = {}
+        allowed = set(sources) if sources else None
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self.idf[term]
+            for idx, tf in posting:
+                if allowed is not None and self.sources[idx] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[idx] / self.avgdl)
+                scores[idx] = scores.get(idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                matched[idx] = matched.get(idx, 0) + 1
+        top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(idx, score, matched[idx]) for idx, score in top]
+
+class LexicalIndex:
+    """
+    Persistent BM25 index over the ingested chunks (SQLite, one row per chunk).
+
+    Ingest replaces a file's chunks with replace_source() as each file is
+    parsed and drops removed files with remove_source(). Readers call
+    search_many(); the in-memory BM25 snapshot is rebuilt only when the
+    on-disk version changes, so queries never leave the process.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY, source TEXT NOT NULL, text TEXT NOT NULL,"
+            " metadata TEXT NOT NULL, terms TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks(source)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        self._conn.commit()
+        self._bm25 = None
+        self._loaded_version = None
+
+    def _bump_version(self):
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def version(self):
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def replace_source(self, source, docs, ids):
+        """
+        Atomically swaps every chunk of `source` for `docs` (with chunk `ids`).
+        """
+        rows = [
+            (chunk_id, source, doc.page_content, json.dumps(doc.metadata), json.dumps(Counter(tokenize(doc.page_content))))
+            for doc, chunk_id in zip(docs, ids)
+        ]
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, source, text, metadata, terms) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._bump_version()
+            self._conn.commit()
+
+    def remove_source(self, source):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._bump_version()
+            self._conn.commit()
+
+    def sources(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT source FROM chunks")}
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def snapshot(self):
+        """
+        Returns the current BM25, reloading it if ingest changed the index.
+        """
+        version = self.version()
+        with self._lock:
+            if self._bm25 is None or version != self._loaded_version:
+                rows = self._conn.execute("SELECT id, text, metadata, terms FROM chunks ORDER BY id").fetchall()
+                self._bm25 = BM25(
+                    [row[0] for row in rows],
+                    [Document(id=row[0], page_content=row[1], metadata=json.loads(row[2])) for row in rows],
+                    [json.loads(row[3]) for row in rows]
+                )
+                self._loaded_version = version
+            return self._bm25
+
+    def search_many(self, queries, k=5, sources=None):
+        """
+        BM25 search for each query, optionally restricted to a list of
+        source files per query (`sources`, aligned with `queries`; empty
+        means all). Returns, aligned with `queries`, lists of
+        (Document, score, matched_terms, query_terms) tuples.
+        """
+        bm25 = self.snapshot()
+        sources = sources or [None] * len(queries)
+        results = []
+        for query, query_sources in zip(queries, sources):
+            terms = list(dict.fromkeys(tokenize(query)))
+            hits = bm25.search(terms, k, query_sources) if len(bm25) else []
+            results.append([(bm25.documents[idx], score, matched, len(terms)) for idx, score, matched in hits])
+        return results
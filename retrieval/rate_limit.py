@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+from collections import deque
+
+def is_rate_limit_error(error) -> bool:
+    """
+    True for quota rejections from the Gemini API (HTTP 429 / RESOURCE_EXHAUSTED).
+    """
+    error_msg = str(error)
+    return "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket + concurrency limit that tunes itself from 429 responses.
+
+    The bucket refills at `rate` units per second (a unit is whatever the
+    caller acquires: requests, texts, tokens). Callers also hold one of
+    `concurrency` slots while a request is in flight.
+
+    Until the first rejection the rate ramps up quickly (slow start). When a
+    429 arrives, the units accepted during the last `quota_window` seconds
+    (the API's accounting window) are the best estimate of the real quota,
+    so the rate is reset just below that ceiling, concurrency and batch size
+    shrink, and the bucket is drained into a pause that grows with
+    consecutive rejections. Successes then probe slowly upwards.
+    The limiter therefore settles at the quota instead of a fixed,
+    conservative pace.
+    """
+
+    def __init__(self, rate=10.0, min_rate=0.5, max_rate=1000.0,
+                 concurrency=2, max_concurrency=8,
+                 batch_size=25, min_batch_size=5, max_batch_size=100,
+                 burst_seconds=0.25, quota_window=60.0, cut_interval=1.0):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.concurrency = int(concurrency)
+        self.max_concurrency = int(max_concurrency)
+        self.batch_size = int(batch_size)
+        self.min_batch_size = int(min_batch_size)
+        self.max_batch_size = int(max_batch_size)
+        self.burst_seconds = burst_seconds
+        self.quota_window = quota_window
+        self.cut_interval = cut_interval
+
+        self._tokens = self.rate * burst_seconds
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._ceiling = None
+        self._last_cut = float("-inf")
+        self._consecutive_cuts = 0
+        self._accepted = deque()
+        self._accepted_units = 0
+        self._successes_since_change = 0
+        self._cond = threading.Condition()
+
+        self.stats = {"requests": 0, "units": 0, "rate_limited": 0, "errors": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        capacity = max(1.0, self.rate * self.burst_seconds)
+        self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self, units=1):
+        """
+        Blocks until a concurrency slot and `units` tokens are available.
+        Requests larger than the bucket are let through once it is full.
+        """
+        with self._cond:
+            while True:
+                self._refill()
+                capacity = max(1.0, self.rate * self.burst_seconds)
+                needed = min(units, capacity)
+                if self._in_flight < self.concurrency and self._tokens >= needed:
+                    self._tokens -= units
+                    self._in_flight += 1
+                    self.stats["requests"] += 1
+                    self.stats["units"] += units
+                    return
+                if self._in_flight >= self.concurrency:
+                    self._cond.wait()
+                else:
+                    self._cond.wait(timeout=(needed - self._tokens) / self.rate)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _trim_accepted(self, now):
+        while self._accepted and now - self._accepted[0][0] >= self.quota_window:
+            self._accepted_units -= self._accepted.popleft()[1]
+
+    def on_success(self, units=1):
+        with self._cond:
+            now = time.monotonic()
+            self._accepted.append((now, units))
+            self._accepted_units += units
+            self._trim_accepted(now)
+
+            self._successes_since_change += 1
+            self._consecutive_cuts = 0
+            if self._ceiling is None:
+                # Slow start: no quota signal yet, ramp up quickly
+                self.rate = min(self.max_rate, self.rate * 1.5)
+            else:
+                # Probe past the estimate slowly, once per round of
+                # `concurrency` batches, in case the quota was raised
+                self.rate = min(self.max_rate, self.rate * 1.02 ** (1.0 / max(1, self.concurrency)))
+            # Concurrency and batch size grow more cautiously than rate
+            if self._successes_since_change >= self.concurrency:
+                self._successes_since_change = 0
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                self.batch_size = min(self.max_batch_size, self.batch_size + 5)
+            # A single batch never exceeds ~1s of quota, or it might never be admitted
+            self.batch_size = max(self.min_batch_size, min(self.batch_size, int(self.rate)))
+            self._cond.notify_all()
+
+    def on_rate_limited(self):
+        with self._cond:
+            self.stats["rate_limited"] += 1
+            now = time.monotonic()
+            # Batches already in flight when the quota ran out fail together;
+            # count them, but only react once per `cut_interval`.
+            if now - self._last_cut < self.cut_interval:
+                return
+            self._last_cut = now
+            self._successes_since_change = 0
+            self._trim_accepted(now)
+
+            # A cut right after a pause sees a half-empty window, so never let
+            # one observation drag the estimate down by more than 10%
+            observed = self._accepted_units / self.quota_window
+            floor = self._ceiling * 0.9 if self._ceiling else self.rate * 0.5
+            self._ceiling = max(observed, floor)
+            self.rate = max(self.min_rate, min(self.rate, self._ceiling * 0.95))
+            self.concurrency = max(1, self.concurrency // 2)
+            self.batch_size = max(self.min_batch_size, min(int(self.batch_size * 0.75), int(self.rate)))
+            # Drain the bucket into debt: callers pause for a while that grows
+            # with consecutive rejections (reset by any success), with jitter
+            # so they don't all retry in lockstep.
+            self._consecutive_cuts += 1
+            pause = min(self.cut_interval * 2 ** (self._consecutive_cuts - 1), self.quota_window / 4)
+            self._tokens = -random.uniform(0.5, 1.0) * pause * self.rate
+            self._last_refill = now
+
+    def on_error(self):
+        with self._cond:
+            self.stats["errors"] += 1
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "rate": round(self.rate, 2),
+                "concurrency": self.concurrency,
+                "batch_size": self.batch_size,
+                "estimated_quota": round(self._ceiling, 2) if self._ceiling else None,
+                "in_flight": self._in_flight,
+                **self.stats,
+            }
@@ -1,6 +1,16 @@
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_core.documents import Document
+from collections import OrderedDict
+from retrieval.embedding_cache import CachedEmbeddings, get_embedding_cache
+from retrieval.lexical_index import LexicalIndex
+from retrieval.vector_index import NumpyVectorIndex
+from tracing import span
+import hashlib
 import os
+import re
+import threading
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,44 +19,550 @@ load_dotenv()
 EMBEDDING_MODEL = "gemini-embedding-001"
 DB_DIR = "./chroma_db"
 
-def retrieve_documents(query: str, k: int = 5) -> str:
+# Max number of query embeddings kept in memory per process
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "512"))
+# QUERY_CACHE=0 embeds every query through the API: no LRU or persistent
+# cache hits (results are still written to the persistent cache)
+QUERY_CACHE_ENABLED = os.environ.get("QUERY_CACHE", "1") == "1"
+
+# "hybrid" fuses BM25 and vector rankings; "vector" is similarity search only
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")
+# Vector search backend: "chroma", or "numpy" for the in-process index that
+# ingest writes to chroma_db/vector_index (falls back to Chroma if missing)
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+# Candidates taken from each ranking before fusion, and the RRF damping constant
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "20"))
+RRF_K = 60
+# Queries this short whose top BM25 hits contain every term are answered
+# lexically, without an embedding round-trip
+LEXICAL_ONLY_MAX_TERMS = int(os.environ.get("LEXICAL_ONLY_MAX_TERMS", "6"))
+# Re-ranking of each query's candidates: "mmr" (maximal marginal relevance
+# on the stored embeddings) or "none" (plain top k)
+RETRIEVAL_RERANK = os.environ.get("RETRIEVAL_RERANK", "mmr")
+# Candidates MMR chooses from per query, and its relevance/diversity
+# trade-off (1.0: relevance only)
+MMR_CANDIDATES = int(os.environ.get("MMR_CANDIDATES", "20"))
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", "0.5"))
+# Merge selected chunks that were consecutive splits of the same page
+MERGE_ADJACENT_CHUNKS = os.environ.get("MERGE_ADJACENT_CHUNKS", "0") == "1"
+# Overlap searched for between consecutive splits (ingest's CHUNK_OVERLAP is
+# 200); shorter matches are treated as coincidence
+MERGE_MAX_OVERLAP = 500
+MERGE_MIN_OVERLAP = 20
+
+def normalize_query(query: str) -> str:
     """
-    Retrieves documents from ChromaDB.
+    Cache key for a query: case- and whitespace-insensitive.
     """
-    try:
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
-            return "Error: GOOGLE_API_KEY not found."
-
-        # Initialize Embeddings
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model=EMBEDDING_MODEL,
-            google_api_key=api_key,
-            task_type="retrieval_query"
+    return " ".join(query.lower().split())
+
+def is_quoted(query: str) -> bool:
+    return bool(re.fullmatch(r'\s*"[^"]+"\s*', query))
+
+def source_key(name: str) -> str:
+    """
+    Comparable form of a report name: lowercase words, no ".pdf".
+    """
+    name = re.sub(r"\.pdf$", "", str(name).strip(), flags=re.IGNORECASE)
+    return " ".join(re.findall(r"[a-z0-9]+", name.lower()))
+
+def match_sources(names, available):
+    """
+    Maps report names (e.g. from the Planner) to `source` values in the
+    index: an exact name match, else every source whose name contains the
+    given one ("WEF" -> both WEF reports). Unknown names are dropped.
+    """
+    by_key = {source_key(source): source for source in available}
+    matched = []
+    for name in names or []:
+        key = source_key(name)
+        if not key:
+            continue
+        if key in by_key:
+            candidates = [by_key[key]]
+        else:
+            candidates = [source for source_name, source in by_key.items() if key in source_name]
+        matched.extend(source for source in candidates if source not in matched)
+    return matched
+
+def reciprocal_rank_fusion(rankings, k: int, rrf_k: int = RRF_K):
+    """
+    Fuses several ranked Document lists: score(d) = sum over rankings of
+    1 / (rrf_k + rank). Only ranks matter, so BM25 and cosine scores never
+    have to be put on the same scale. Returns the top k Documents.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(doc.id, doc)
+    ordered = sorted(scores, key=lambda chunk_id: scores[chunk_id], reverse=True)
+    return [docs[chunk_id] for chunk_id in ordered[:k]]
+
+def max_marginal_relevance(vectors, k: int, lambda_mult: float = MMR_LAMBDA):
+    """
+    Picks k of the ranked candidates whose stored embeddings are `vectors`
+    (best first; None where unknown). Each pick maximizes
+    lambda * relevance - (1 - lambda) * max cosine similarity to the picks
+    so far, so near-duplicates of a picked chunk (e.g. its overlapping
+    neighbour) lose out to other evidence. Relevance comes from the rank
+    (1.0 for the first candidate, falling linearly): candidates may come
+    from fused BM25/vector rankings whose scores share no scale. A
+    candidate without an embedding is never penalized. Returns candidate
+    positions in pick order.
+    """
+    count = len(vectors)
+    known = [i for i, vector in enumerate(vectors) if vector is not None]
+    if count <= k or not known:
+        return list(range(min(k, count)))
+    matrix = np.zeros((count, len(vectors[known[0]])), dtype=np.float32)
+    matrix[known] = np.asarray([vectors[i] for i in known], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1.0)
+    similarity = matrix @ matrix.T
+
+    relevance = 1.0 - np.arange(count) / count
+    redundancy = np.zeros(count, dtype=np.float32)
+    available = np.ones(count, dtype=bool)
+    picks = []
+    while len(picks) < k:
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picks.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picks
+
+def chunk_position(chunk_id):
+    """
+    (file key, split number) of an ingested chunk ID ("<file key>-00042"),
+    or None for IDs of another form.
+    """
+    prefix, _, number = str(chunk_id or "").rpartition("-")
+    return (prefix, int(number)) if prefix and number.isdigit() else None
+
+def join_overlapping(first: str, second: str) -> str:
+    """
+    Concatenates two consecutive splits, dropping the text the second
+    repeats from the end of the first.
+    """
+    for size in range(min(len(first), len(second), MERGE_MAX_OVERLAP), MERGE_MIN_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+def merge_adjacent(docs):
+    """
+    Merges chunks that were consecutive splits of the same (source, page)
+    into one Document without the overlap they share. The merged Document
+    takes the place of its best-ranked part; its ID joins the parts' IDs
+    ("a+b"). Other chunks pass through unchanged, in order.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        position = chunk_position(doc.id)
+        if position is None:
+            groups[(rank,)] = [(0, rank, doc)]
+        else:
+            key = (doc.metadata.get("source"), doc.metadata.get("page"), position[0])
+            groups.setdefault(key, []).append((position[1], rank, doc))
+
+    runs = []
+    for parts in groups.values():
+        parts.sort(key=lambda part: part[0])
+        run = [parts[0]]
+        for part in parts[1:]:
+            if part[0] == run[-1][0] + 1:
+                run.append(part)
+            else:
+                runs.append(run)
+                run = [part]
+        runs.append(run)
+
+    merged = []
+    for run in sorted(runs, key=lambda run: min(rank for _, rank, _ in run)):
+        if len(run) == 1:
+            merged.append(run[0][2])
+            continue
+        text = run[0][2].page_content
+        for _, _, doc in run[1:]:
+            text = join_overlapping(text, doc.page_content)
+        merged.append(Document(
+            id="+".join(doc.id for _, _, doc in run),
+            page_content=text,
+            metadata=dict(run[0][2].metadata)
+        ))
+    return merged
+
+class Retriever:
+    """
+    Long-lived handle on the persisted Chroma store and BM25 index.
+
+    Holds one embeddings client and one open vector store for the lifetime of
+    the process, and keeps an LRU of query embeddings so repeated plan steps
+    skip the embedding round-trip. In hybrid mode the vector ranking is fused
+    with a local BM25 ranking. With the "numpy" backend, similarity search
+    runs in-process on the memory-mapped vector index instead of Chroma.
+    Each query can be restricted to a list of source files (metadata
+    `where` filter in Chroma, source partitions in the numpy index and
+    BM25); a filtered query that finds nothing is retried unfiltered.
+    With rerank="mmr" each query over-fetches candidates and keeps a
+    diverse k of them (max_marginal_relevance), and `merge_adjacent` joins
+    neighbouring chunks of the same page. Safe to share across threads.
+    """
+
+    def __init__(self, api_key: str, db_dir: str = DB_DIR, cache_size: int = QUERY_CACHE_SIZE,
+                 mode: str = RETRIEVAL_MODE, backend: str = VECTOR_BACKEND,
+                 rerank: str = RETRIEVAL_RERANK, merge_adjacent: bool = MERGE_ADJACENT_CHUNKS):
+        # Queries not in the in-memory LRU fall back to the persistent
+        # embedding cache before going to the API
+        self.embeddings = CachedEmbeddings(
+            GoogleGenerativeAIEmbeddings(
+                model=EMBEDDING_MODEL,
+                google_api_key=api_key,
+                task_type="retrieval_query"
+            ),
+            get_embedding_cache(),
+            EMBEDDING_MODEL,
+            "retrieval_query"
         )
-        
-        # Connect to DB
-        vector_store = Chroma(
-            embedding_function=embeddings,
-            persist_directory=DB_DIR
+        self.vector_store = Chroma(
+            embedding_function=self.embeddings,
+            persist_directory=db_dir
+        )
+        self.lexical = LexicalIndex(os.path.join(db_dir, "lexical_index.sqlite"))
+        self.vector_index = NumpyVectorIndex(os.path.join(db_dir, "vector_index")) if backend == "numpy" else None
+        self.mode = mode
+        self.rerank = rerank
+        self.merge_adjacent = merge_adjacent
+        self.lexical_only = 0
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_queries(self, queries):
+        """
+        Embeds a list of queries, serving what it can from the LRU and sending
+        all misses to the API in a single batched call.
+        """
+        keys = [normalize_query(q) for q in queries]
+        vectors = {}
+        missing = {}
+        use_cache = QUERY_CACHE_ENABLED
+        with self._lock:
+            for key, query in zip(keys, queries):
+                if key in vectors or key in missing:
+                    continue
+                if use_cache and key in self._cache:
+                    self._cache.move_to_end(key)
+                    vectors[key] = self._cache[key]
+                    self.hits += 1
+                else:
+                    missing[key] = query
+                    self.misses += 1
+
+        # Embed outside the lock so concurrent misses don't serialize on the API
+        if missing:
+            api_texts = self.embeddings.api_texts
+            with span("embedding", kind="embedding", texts=len(missing), lru_hits=len(vectors)) as embed_span:
+                fresh = self.embeddings.embed_documents(
+                    list(missing.values()),
+                    lookup=use_cache,
+                    task_type="retrieval_query"
+                )
+                # Texts not sent to the API were served by the persistent cache
+                embed_span.set(api_texts=self.embeddings.api_texts - api_texts)
+            with self._lock:
+                for key, vector in zip(missing.keys(), fresh):
+                    vectors[key] = vector
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, query: str):
+        return self.embed_queries([query])[0]
+
+    def sources(self):
+        """
+        Source files in the index, sorted.
+        """
+        return sorted(self.lexical.sources())
+
+    def vector_search_many(self, queries, k: int = 5, sources=None):
+        """
+        Runs one similarity search per query in a single Chroma round-trip
+        (or one batched matrix product on the numpy index) per distinct
+        source filter. `sources` is aligned with `queries`; an empty list
+        searches every source. Returns a list of Document lists, aligned
+        with `queries`.
+        """
+        if not queries:
+            return []
+        vectors = self.embed_queries(queries)
+        groups = {}
+        for i, query_sources in enumerate(sources or [[]] * len(queries)):
+            groups.setdefault(tuple(sorted(query_sources or [])), []).append(i)
+
+        per_query = [None] * len(queries)
+        use_numpy = self.vector_index is not None and self.vector_index.exists()
+        for group_sources, positions in groups.items():
+            group_vectors = [vectors[i] for i in positions]
+            with span("vector_search", kind="search", queries=len(positions), k=k,
+                      backend="numpy" if use_numpy else "chroma", sources=len(group_sources)):
+                if use_numpy:
+                    results = self.vector_index.search_many(group_vectors, k=k, sources=list(group_sources))
+                else:
+                    results = self._chroma_query(group_vectors, k, list(group_sources))
+            for i, docs in zip(positions, results):
+                per_query[i] = docs
+        return per_query
+
+    def stored_vectors(self, ids):
+        """
+        Stored embeddings of the given chunk IDs as {id: vector} (unknown IDs
+        left out): from the numpy index when it is in use, else from Chroma.
+        """
+        ids = [chunk_id for chunk_id in dict.fromkeys(ids) if chunk_id]
+        if not ids:
+            return {}
+        if self.vector_index is not None and self.vector_index.exists():
+            return self.vector_index.vectors_for(ids)
+        stored = self.vector_store._collection.get(ids=ids, include=["embeddings"])
+        return dict(zip(stored["ids"], stored["embeddings"]))
+
+    def rerank_many(self, per_query, k: int):
+        """
+        Cuts each query's ranked candidates to k: a maximal-marginal-relevance
+        selection when rerank is "mmr", else the top k. Then merges adjacent
+        chunks if enabled.
+        """
+        with span("rerank", kind="search", queries=len(per_query), k=k, method=self.rerank) as rerank_span:
+            top = [docs[:k] for docs in per_query]
+            if self.rerank == "mmr" and any(len(docs) > k for docs in per_query):
+                vectors = self.stored_vectors(doc.id for docs in per_query for doc in docs)
+                selected = []
+                for docs in per_query:
+                    picks = max_marginal_relevance([vectors.get(doc.id) for doc in docs], k)
+                    selected.append([docs[i] for i in picks])
+            else:
+                selected = top
+            # Top-k chunks MMR swapped for more diverse candidates
+            replaced = sum(len({doc.id for doc in a} - {doc.id for doc in b}) for a, b in zip(top, selected))
+            chunks = sum(len(docs) for docs in selected)
+            if self.merge_adjacent:
+                selected = [merge_adjacent(docs) for docs in selected]
+            rerank_span.set(
+                replaced=replaced,
+                merged=chunks - sum(len(docs) for docs in selected),
+                top_k_chars=sum(len(doc.page_content) for docs in top for doc in docs),
+                chars=sum(len(doc.page_content) for docs in selected for doc in docs)
+            )
+        return selected
+
+    def _chroma_query(self, vectors, k, sources):
+        where = None
+        if len(sources) == 1:
+            where = {"source": sources[0]}
+        elif sources:
+            where = {"source": {"$in": sources}}
+        results = self.vector_store._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas"]
         )
+        return [
+            [
+                Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+    def _is_exact_term(self, query, hits, k):
+        """
+        A short query whose top-k BM25 hits all contain every query term
+        (e.g. a report name) gains nothing from the embedding; quoted
+        queries are always answered lexically.
+        """
+        if is_quoted(query):
+            return bool(hits)
+        if len(hits) < k:
+            return False
+        terms = hits[0][3]
+        return 0 < terms <= LEXICAL_ONLY_MAX_TERMS and all(matched == terms for _, _, matched, _ in hits[:k])
+
+    def search_many(self, queries, k: int = 5, sources=None):
+        """
+        Retrieves k chunks per query. In hybrid mode the BM25 and vector
+        rankings are fused with reciprocal rank fusion; exact-term queries
+        skip the embedding and vector search entirely. Falls back to vector
+        search when the lexical index is empty (store ingested before it
+        existed). `sources`, aligned with `queries`, restricts each query to
+        those source files (empty: all). The candidates are then cut to k
+        by rerank_many. Returns a list of Document lists, aligned with
+        `queries`.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        sources = [list(query_sources or []) for query_sources in sources] if sources else [[] for _ in queries]
+        candidates = max(k, MMR_CANDIDATES) if self.rerank == "mmr" else k
+        per_query = self._search_many(queries, k, sources, candidates)
+
+        # A filter that matched nothing (e.g. a mistyped report) is dropped
+        unmatched = [i for i, docs in enumerate(per_query) if sources[i] and not docs]
+        if unmatched:
+            retried = self._search_many([queries[i] for i in unmatched], k, [[] for _ in unmatched], candidates)
+            for i, docs in zip(unmatched, retried):
+                per_query[i] = docs
+        return self.rerank_many(per_query, k)
+
+    def _search_many(self, queries, k, sources, candidates):
+        """
+        Up to `candidates` ranked Documents per query; whether a query is
+        answered lexically is still judged on its top k.
+        """
+        if self.mode != "hybrid" or not len(self.lexical.snapshot()):
+            return self.vector_search_many(queries, k=candidates, sources=sources)
+
+        fetch_k = max(candidates, HYBRID_CANDIDATES)
+        with span("lexical_search", kind="search", queries=len(queries), k=fetch_k) as lexical_span:
+            lexical = self.lexical.search_many(queries, k=fetch_k, sources=sources)
+            per_query = [None] * len(queries)
+            needs_vector = []
+            for i, (query, hits) in enumerate(zip(queries, lexical)):
+                if self._is_exact_term(query, hits, k):
+                    per_query[i] = [doc for doc, _, _, _ in hits[:candidates]]
+                    with self._lock:
+                        self.lexical_only += 1
+                else:
+                    needs_vector.append(i)
+            lexical_span.set(lexical_only=len(queries) - len(needs_vector))
+
+        if needs_vector:
+            vector = self.vector_search_many(
+                [queries[i] for i in needs_vector], k=fetch_k, sources=[sources[i] for i in needs_vector]
+            )
+            for i, vector_docs in zip(needs_vector, vector):
+                lexical_docs = [doc for doc, _, _, _ in lexical[i]]
+                per_query[i] = reciprocal_rank_fusion([vector_docs, lexical_docs], candidates)
+        return per_query
+
+    def search(self, query: str, k: int = 5, sources=None):
+        return self.search_many([query], k=k, sources=[sources or []])[0]
+
+    def cache_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "api_calls": self.embeddings.api_calls,
+                "lexical_only": self.lexical_only,
+                "persistent": self.embeddings.cache.stats(),
+            }
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_retriever() -> Retriever:
+    """
+    Returns the process-wide Retriever, creating it on first use.
+    """
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY not found.")
+                _retriever = Retriever(api_key)
+    return _retriever
+
+_index_versions = {}
+
+def index_version(db_dir: str = DB_DIR) -> str:
+    """
+    Short hash of the ingest manifest (file hashes plus chunking/embedding
+    params): changes whenever ingestion changes what can be retrieved.
+    Re-read only when the manifest's mtime changes.
+    """
+    path = os.path.join(db_dir, "ingest_manifest.json")
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return "no-index"
+    cached = _index_versions.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "rb") as f:
+            cached = (mtime, hashlib.sha256(f.read()).hexdigest()[:16])
+        _index_versions[path] = cached
+    return cached[1]
+
+def format_documents(docs) -> str:
+    """
+    Renders retrieved chunks as the DOCUMENT SEGMENT blocks the Researcher expects.
+    """
+    formatted_results = []
+    for doc in docs:
+        source = doc.metadata.get("source", "Unknown")
+        page = doc.metadata.get("page", "Unknown")
+        # Clean up newlines for cleaner injection into LLM prompt
+        content = doc.page_content.replace("\n", " ")
         
-        # Perform Search
-        results = vector_store.similarity_search(query, k=k)
+        formatted_results.append(
+            f"--- DOCUMENT SEGMENT ---\n"
+            f"SOURCE: {source}, PAGE: {page}\n"
+            f"CONTENT: {content}\n"
+        )
         
-        formatted_results = []
-        for doc in results:
-            source = doc.metadata.get("source", "Unknown")
-            page = doc.metadata.get("page", "Unknown")
-            # Clean up newlines for cleaner injection into LLM prompt
-            content = doc.page_content.replace("\n", " ")
-            
-            formatted_results.append(
-                f"--- DOCUMENT SEGMENT ---\n"
-                f"SOURCE: {source}, PAGE: {page}\n"
-                f"CONTENT: {content}\n"
-            )
-            
-        return "\n".join(formatted_results)
+    return "\n".join(formatted_results)
+
+def retrieve_documents(query: str, k: int = 5, sources=None) -> str:
+    """
+    Retrieves documents from ChromaDB, fused with the BM25 index, from
+    `sources` only if given.
+    """
+    try:
+        with span("retrieval", kind="retrieval", queries=1, k=k) as retrieval_span:
+            results = get_retriever().search(query, k=k, sources=sources)
+            retrieval_span.set(chunks=len(results))
+        return format_documents(results)
     except Exception as e:
-        return f"Error retrieving documents: {e}"
\ No newline at end of file
+        return f"Error retrieving documents: {e}"
+
+
+def retrieve_many(queries, k: int = 5, sources=None):
+    """
+    Batched retrieval for several queries (e.g. all plan steps at once).
+    One embedding request covers every uncached query that is not answered
+    lexically, and all vector searches go to Chroma together (one query per
+    distinct source filter; `sources` is aligned with `queries`).
+
+    Returns:
+        {"results": [[Document, ...], ...] aligned with `queries`,
+         "chunk_ids": ordered union of retrieved chunk IDs}
+    """
+    queries = list(queries)
+    filtered = sum(1 for query_sources in sources or [] if query_sources)
+    with span("retrieval", kind="retrieval", queries=len(queries), k=k, filtered=filtered) as retrieval_span:
+        per_query = get_retriever().search_many(queries, k=k, sources=sources)
+        chunk_ids = []
+        seen = set()
+        for docs in per_query:
+            for doc in docs:
+                if doc.id not in seen:
+                    seen.add(doc.id)
+                    chunk_ids.append(doc.id)
+        retrieval_span.set(chunks=len(chunk_ids))
+    return {"results": per_query, "chunk_ids": chunk_ids}
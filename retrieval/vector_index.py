@@ -0,0 +1,444 @@
+"""
+In-process vector index (VECTOR_BACKEND=numpy), exported from the Chroma
+store at the end of each ingest run.
+
+The scanned matrix can be stored quantized (VECTOR_QUANTIZATION, or
+`python retrieval/ingest.py --quantize int8`): float16, or int8 with one
+scale per vector. Quantized scores pick VECTOR_RERANK_CANDIDATES rows per
+query, which are re-scored at full precision. To see what each setting
+costs in recall on the current index:
+
+    python retrieval/vector_index.py --recall
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Lives inside the vector store directory so --rebuild wipes both together
+DB_DIR = "./chroma_db"
+VECTOR_INDEX_DIR = os.path.join(DB_DIR, "vector_index")
+
+# Rows of the embedding matrix scored per matrix product; bounds the
+# temporary float32 copy of a quantized block and the score block
+SCAN_BLOCK_ROWS = int(os.environ.get("VECTOR_SCAN_BLOCK_ROWS", "4096"))
+
+# Storage of the scanned matrix: "none" (float32), "float16" or "int8"
+QUANTIZATIONS = ("none", "float16", "int8")
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "none")
+# Candidates per query re-scored at full precision after a quantized scan
+RERANK_CANDIDATES = int(os.environ.get("VECTOR_RERANK_CANDIDATES", "50"))
+
+# Fixed-width per-chunk metadata; chunk text lives in texts.bin at [start, end)
+META_DTYPE = np.dtype([
+    ("id", "U32"), ("source", "i4"), ("page", "i4"), ("start", "i8"), ("end", "i8"),
+])
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def quantize(vectors, quantization):
+    """
+    Returns (matrix, scales) for a float32 matrix. int8 rows are scaled so
+    their largest component maps to 127; scales is None for the float types.
+    """
+    if quantization == "float16":
+        return vectors.astype(np.float16), None
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if quantization != "none":
+        raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+    return vectors, None
+
+def scan(queries, matrix, scales=None):
+    """
+    (queries x rows) dot products of normalized queries with a stored
+    matrix, SCAN_BLOCK_ROWS rows per product.
+    """
+    blocks = []
+    for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + SCAN_BLOCK_ROWS])
+        scores = queries @ block.astype(np.float32, copy=False).T
+        if scales is not None:
+            scores *= scales[start:start + SCAN_BLOCK_ROWS]
+        blocks.append(scores)
+    return blocks[0] if len(blocks) == 1 else np.hstack(blocks)
+
+def top_rows(scores, k):
+    """
+    Row numbers and scores of the k best columns per query, best first.
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((len(scores), 0))
+        return empty.astype(np.int64), empty
+    # Partial selection, then sort only the k winners
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+def rerank(queries, vectors, candidates, k):
+    """
+    Re-scores each query's candidate rows against the full-precision
+    matrix and keeps the k best. Only candidate rows are read.
+    """
+    rows, values = [], []
+    for query, candidate_rows in zip(queries, candidates):
+        # Ascending rows keep the reads from the mapped file sequential
+        candidate_rows = np.sort(candidate_rows)
+        exact = np.asarray(vectors[candidate_rows]) @ query
+        best, best_scores = top_rows(exact[None, :], k)
+        rows.append(candidate_rows[best[0]])
+        values.append(best_scores[0])
+    return rows, values
+
+# Names the live version directory inside an index directory
+CURRENT_FILE = "CURRENT"
+_INDEX_FILES = ("index.json", "vectors.npy", "quantized.npy", "scales.npy", "meta.npy", "texts.bin")
+
+def current_dir(index_dir):
+    """
+    Directory holding the live index files: the version named in
+    index_dir/CURRENT, or `index_dir` itself for indexes written before
+    versioning (files directly inside it).
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE)) as f:
+            version = f.read().strip()
+    except OSError:
+        return index_dir
+    return os.path.join(index_dir, version) if version else index_dir
+
+def _publish(index_dir, version):
+    """
+    Makes `version` the live index with one atomic rename of CURRENT (or
+    unpublishes the index with version None), then deletes other versions.
+    Readers that already mapped an old version keep its files open.
+    """
+    if version is None:
+        if os.path.exists(os.path.join(index_dir, CURRENT_FILE)):
+            os.remove(os.path.join(index_dir, CURRENT_FILE))
+    else:
+        tmp_path = os.path.join(index_dir, f"{CURRENT_FILE}.{version}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(index_dir, CURRENT_FILE))
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if name.startswith("v-") and name != version and os.path.isdir(path):
+            # Can fail where open files can't be deleted; retried next export
+            shutil.rmtree(path, ignore_errors=True)
+        elif name in _INDEX_FILES:
+            os.remove(path)
+
+def build_vector_index(ids, embeddings, documents, metadatas, index_dir=VECTOR_INDEX_DIR,
+                       quantization=VECTOR_QUANTIZATION):
+    """
+    Writes the index files for the given chunks into a new version
+    directory (index_dir/v-<id>/):
+
+    - vectors.npy:   float32 (chunks x dim) matrix of L2-normalized embeddings
+    - quantized.npy: the same matrix as float16/int8 (plus scales.npy for
+                     int8), unless quantization is "none"
+    - meta.npy:      META_DTYPE row per chunk (id, source number, page, text
+                     span); rows are ordered by source
+    - texts.bin:     UTF-8 chunk texts, back to back
+    - index.json:    source names, dimension, count and quantization
+
+    Only when every file is complete is the version published by renaming
+    index_dir/CURRENT over the old one, so a reader resolves either the old
+    or the new index and never a mix of both.
+
+    Returns the number of indexed chunks.
+    """
+    version = f"v-{uuid.uuid4().hex[:12]}"
+    version_dir = os.path.join(index_dir, version)
+    os.makedirs(version_dir)
+    sources = sorted({(metadata or {}).get("source", "Unknown") for metadata in metadatas})
+    source_numbers = {source: n for n, source in enumerate(sources)}
+
+    # Rows are grouped by source, so each source is a contiguous partition
+    order = sorted(
+        range(len(ids)), key=lambda i: (source_numbers[(metadatas[i] or {}).get("source", "Unknown")], ids[i])
+    )
+    ids = [ids[i] for i in order]
+    embeddings = [embeddings[i] for i in order]
+    documents = [documents[i] for i in order]
+    metadatas = [metadatas[i] for i in order]
+
+    meta = np.zeros(len(ids), dtype=META_DTYPE)
+    blob = bytearray()
+    for row, (chunk_id, text, metadata) in enumerate(zip(ids, documents, metadatas)):
+        metadata = metadata or {}
+        encoded = text.encode("utf-8")
+        page = metadata.get("page")
+        meta[row] = (
+            chunk_id, source_numbers[metadata.get("source", "Unknown")],
+            page if isinstance(page, int) else -1, len(blob), len(blob) + len(encoded)
+        )
+        blob.extend(encoded)
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if vectors.ndim != 2:
+        vectors = vectors.reshape(len(ids), -1)
+    vectors = _normalize_rows(vectors)
+    quantized, scales = quantize(vectors, quantization)
+
+    def write(name, save):
+        with open(os.path.join(version_dir, name), "wb") as f:
+            save(f)
+
+    write("texts.bin", lambda f: f.write(bytes(blob)))
+    write("meta.npy", lambda f: np.save(f, meta))
+    write("vectors.npy", lambda f: np.save(f, vectors))
+    if quantization != "none":
+        write("quantized.npy", lambda f: np.save(f, quantized))
+    if scales is not None:
+        write("scales.npy", lambda f: np.save(f, scales))
+    write("index.json", lambda f: f.write(json.dumps({
+        "sources": sources, "dim": int(vectors.shape[1]), "count": len(ids), "quantization": quantization,
+    }).encode("utf-8")))
+    _publish(index_dir, version)
+    return len(ids)
+
+def build_from_chroma(db_dir=DB_DIR, index_dir=None, batch_size=5000, quantization=VECTOR_QUANTIZATION):
+    """
+    Exports every chunk of the Chroma store at `db_dir` (embeddings, text,
+    metadata) into a vector index. Needs no parsing or embedding.
+    """
+    from langchain_chroma import Chroma
+
+    collection = Chroma(persist_directory=db_dir)._collection
+    ids, embeddings, documents, metadatas = [], [], [], []
+    for offset in range(0, collection.count(), batch_size):
+        stored = collection.get(
+            include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset
+        )
+        ids.extend(stored["ids"])
+        embeddings.extend(stored["embeddings"])
+        documents.extend(stored["documents"])
+        metadatas.extend(stored["metadatas"])
+    index_dir = index_dir or os.path.join(db_dir, "vector_index")
+    if not ids:
+        # Nothing to serve: readers fall back to Chroma
+        if os.path.isdir(index_dir):
+            _publish(index_dir, None)
+        return 0
+    return build_vector_index(ids, embeddings, documents, metadatas, index_dir, quantization)
+
+class NumpyVectorIndex:
+    """
+    In-process cosine-similarity index over the files written by
+    build_vector_index().
+
+    The embedding matrices and texts are memory-mapped, so loading costs
+    only the metadata read and pages are shared between processes. A batch
+    of queries is scored with one matrix product per SCAN_BLOCK_ROWS rows,
+    on the quantized matrix if there is one, followed by a full-precision
+    re-rank of the best `rerank_candidates` rows. Searches restricted to
+    some sources scan only those sources' row ranges. All files of a load
+    come from the one version CURRENT named at the time; a new version is
+    mapped when ingest publishes it. Safe to share across threads.
+    """
+
+    def __init__(self, index_dir=VECTOR_INDEX_DIR, rerank_candidates=RERANK_CANDIDATES):
+        self.index_dir = index_dir
+        self.rerank_candidates = rerank_candidates
+        self._lock = threading.Lock()
+        self._loaded_key = None
+        self._snapshot = None
+        self._rows_by_id = None
+
+    def exists(self):
+        return os.path.exists(os.path.join(current_dir(self.index_dir), "index.json"))
+
+    def _load(self, attempts=3):
+        """
+        Maps the files of the live version, again only if a new one was
+        published since the last load. Returns (info, vectors, quantized,
+        scales, meta, texts).
+        """
+        for attempt in range(attempts):
+            try:
+                return self._load_version(current_dir(self.index_dir))
+            except FileNotFoundError:
+                # Replaced and deleted while being opened: resolve CURRENT again
+                if attempt == attempts - 1:
+                    raise
+
+    def _load_version(self, version_dir):
+        key = (version_dir, os.path.getmtime(os.path.join(version_dir, "index.json")))
+        with self._lock:
+            if key != self._loaded_key:
+                path = lambda name: os.path.join(version_dir, name)
+                with open(path("index.json")) as f:
+                    info = json.load(f)
+                quantization = info.get("quantization", "none")
+                self._snapshot = (
+                    info,
+                    np.load(path("vectors.npy"), mmap_mode="r"),
+                    np.load(path("quantized.npy"), mmap_mode="r") if quantization != "none" else None,
+                    np.load(path("scales.npy")) if quantization == "int8" else None,
+                    np.load(path("meta.npy")),
+                    np.memmap(path("texts.bin"), dtype=np.uint8, mode="r") if os.path.getsize(path("texts.bin")) else b"",
+                )
+                self._loaded_key = key
+            return self._snapshot
+
+    def __len__(self):
+        return len(self._load()[4])
+
+    @property
+    def quantization(self):
+        return self._load()[0].get("quantization", "none")
+
+    def document(self, row):
+        info, _, _, _, meta, texts = self._load()
+        entry = meta[row]
+        metadata = {"source": info["sources"][entry["source"]]}
+        if entry["page"] >= 0:
+            metadata["page"] = int(entry["page"])
+        text = bytes(texts[entry["start"]:entry["end"]]).decode("utf-8")
+        return Document(id=str(entry["id"]), page_content=text, metadata=metadata)
+
+    def vectors_for(self, ids):
+        """
+        Full-precision vectors of the chunks with these IDs, as {id: vector};
+        unknown IDs are left out.
+        """
+        _, vectors, _, _, meta, _ = self._load()
+        with self._lock:
+            if self._rows_by_id is None or self._rows_by_id[0] is not meta:
+                self._rows_by_id = (meta, {str(chunk_id): row for row, chunk_id in enumerate(meta["id"])})
+            rows = self._rows_by_id[1]
+        return {chunk_id: np.asarray(vectors[rows[chunk_id]]) for chunk_id in ids if chunk_id in rows}
+
+    def partitions(self, sources):
+        """
+        Row ranges (slices) holding the chunks of the named sources; unknown
+        names are ignored.
+        """
+        info, _, _, _, meta, _ = self._load()
+        numbers = {name: n for n, name in enumerate(info["sources"])}
+        column = meta["source"]
+        ranges = []
+        for name in dict.fromkeys(sources):
+            if name in numbers:
+                start = int(np.searchsorted(column, numbers[name], side="left"))
+                stop = int(np.searchsorted(column, numbers[name], side="right"))
+                if stop > start:
+                    ranges.append(slice(start, stop))
+        return ranges
+
+    def _scan(self, queries, matrix, scales, ranges):
+        """
+        scan() over the whole matrix, or over `ranges` only. Returns the
+        scores and the row number of each score column (None for all rows).
+        """
+        if ranges is None:
+            return scan(queries, matrix, scales), None
+        scores = np.hstack([
+            scan(queries, matrix[part], scales[part] if scales is not None else None) for part in ranges
+        ])
+        return scores, np.concatenate([np.arange(part.start, part.stop) for part in ranges])
+
+    def top_k(self, query_vectors, k=5, rerank_results=True, sources=None):
+        """
+        Row numbers and similarities of the k best chunks per query, best
+        first, optionally among the chunks of `sources` only. Without
+        `rerank_results`, a quantized index returns its raw quantized ranking.
+        """
+        _, vectors, quantized, scales, _, _ = self._load()
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_vectors, dtype=np.float32)))
+        ranges = self.partitions(sources) if sources else None
+        if ranges == []:
+            return [([], []) for _ in queries]
+        if quantized is None:
+            scores, columns = self._scan(queries, vectors, None, ranges)
+            rows, values = top_rows(scores, k)
+        else:
+            scores, columns = self._scan(queries, quantized, scales, ranges)
+            rows, values = top_rows(scores, k if not rerank_results else max(k, self.rerank_candidates))
+        if columns is not None:
+            rows = columns[rows]
+        if quantized is not None and rerank_results:
+            rows, values = rerank(queries, vectors, rows, k)
+        return [(list(map(int, r)), list(map(float, v))) for r, v in zip(rows, values)]
+
+    def search_many(self, query_vectors, k=5, sources=None):
+        """
+        Top-k Documents per query embedding, aligned with `query_vectors`,
+        optionally among the chunks of `sources` only.
+        """
+        return [[self.document(row) for row in rows] for rows, _ in self.top_k(query_vectors, k, sources=sources)]
+
+def recall_report(vectors, k=5, sample=200, candidates=RERANK_CANDIDATES, seed=0):
+    """
+    Recall@k of each quantization against the exact float32 ranking, with
+    and without the full-precision re-rank, plus stored matrix size and
+    scan time. Queries are `sample` stored chunk vectors, each excluded
+    from its own results.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    sampled = rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)
+    queries = vectors[sampled]
+    positions = np.arange(len(sampled))
+
+    def ranked(matrix, scales, count):
+        started = time.perf_counter()
+        scores = scan(queries, matrix, scales)
+        elapsed = time.perf_counter() - started
+        scores[positions, sampled] = -np.inf
+        top = top_rows(scores, count + 1)[0]
+        return [rows[rows != own][:count] for rows, own in zip(top, sampled)], elapsed
+
+    truth, exact_seconds = ranked(vectors, None, k)
+    truth = [set(rows.tolist()) for rows in truth]
+    recall = lambda results: round(float(np.mean([
+        len(truth_rows & set(np.asarray(rows).tolist())) / len(truth_rows)
+        for truth_rows, rows in zip(truth, results) if truth_rows
+    ])), 4)
+
+    report = {"none": {"bytes": int(vectors.nbytes), "scan_seconds": round(exact_seconds, 6), f"recall_at_{k}": 1.0}}
+    for quantization in QUANTIZATIONS[1:]:
+        matrix, scales = quantize(vectors, quantization)
+        scanned, scan_seconds = ranked(matrix, scales, max(k, candidates))
+        reranked, _ = rerank(queries, vectors, scanned, k)
+        report[quantization] = {
+            "bytes": int(matrix.nbytes + (scales.nbytes if scales is not None else 0)),
+            "scan_seconds": round(scan_seconds, 6),
+            f"recall_at_{k}": recall([rows[:k] for rows in scanned]),
+            f"recall_at_{k}_reranked": recall(reranked),
+        }
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the in-process vector index.")
+    parser.add_argument("--recall", action="store_true", help="Report recall@k of each quantization setting.")
+    parser.add_argument("--index-dir", default=VECTOR_INDEX_DIR)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--sample", type=int, default=200, help="Chunks used as queries.")
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES, help="Rows re-ranked per query.")
+    args = parser.parse_args()
+
+    index = NumpyVectorIndex(args.index_dir)
+    if not index.exists():
+        sys.exit(f"No vector index in {args.index_dir}. Run retrieval/ingest.py first.")
+    vectors = index._load()[1]
+    print(f"{len(index)} chunks, {vectors.shape[1]} dims, stored quantization: {index.quantization}")
+    if args.recall:
+        for quantization, row in recall_report(vectors, args.k, args.sample, args.candidates).items():
+            print(f"  {quantization:8s} {row}")
@@ -0,0 +1,75 @@
+"""
+Shared setup for the offline test suite.
+
+Every on-disk cache is pointed at a scratch directory before any project
+module reads its config, and the LLM is replaced with the deterministic
+fake from agents/fakes.py. No test calls Gemini.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="copilot-tests-")
+os.environ.setdefault("GOOGLE_API_KEY", "offline-tests")
+os.environ["LLM_CACHE"] = "0"
+os.environ["RESULT_CACHE"] = "0"
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    A fresh FakeChatModel behind agents.llm.get_llm; its `stats` count calls.
+    """
+    import agents.llm as llm_module
+    from agents.fakes import FakeChatModel
+
+    model = FakeChatModel()
+    monkeypatch.setattr(llm_module, "get_llm", lambda temperature=0: model)
+    return model
+
+CORPUS_SOURCES = ["DHL Logistics Trend Radar.pdf", "KPMG The Future of Supply Chain.pdf", "WEF Resilience Pulse Check 2025.pdf"]
+CORPUS_WORDS = (
+    "supply chain resilience logistics freight port congestion inventory supplier visibility "
+    "digital twin procurement nearshoring tariff risk demand forecasting warehouse automation"
+).split()
+EMBEDDING_DIM = 16
+
+@pytest.fixture
+def corpus(tmp_path):
+    """
+    A small Chroma store plus BM25 index (chunks_per_source chunks for each
+    of CORPUS_SOURCES, fake embeddings), laid out as ingest writes it.
+    Returns (db_dir, documents).
+    """
+    import random
+
+    from langchain_chroma import Chroma
+    from langchain_core.documents import Document
+
+    from retrieval.fakes import fake_vector
+    from retrieval.lexical_index import LexicalIndex
+
+    rng = random.Random(0)
+    db_dir = str(tmp_path / "chroma_db")
+    docs = []
+    for n, source in enumerate(CORPUS_SOURCES):
+        file_key = f"{n:016x}"
+        for i in range(6):
+            text = f"{source.removesuffix('.pdf')}. " + " ".join(rng.choice(CORPUS_WORDS) for _ in range(40))
+            docs.append(Document(id=f"{file_key}-{i:05d}", page_content=text, metadata={"source": source, "page": i // 2}))
+    store = Chroma(persist_directory=db_dir)
+    store._collection.upsert(
+        ids=[doc.id for doc in docs],
+        embeddings=[fake_vector(doc.page_content, EMBEDDING_DIM) for doc in docs],
+        documents=[doc.page_content for doc in docs],
+        metadatas=[doc.metadata for doc in docs]
+    )
+    lexical = LexicalIndex(os.path.join(db_dir, "lexical_index.sqlite"))
+    for source in CORPUS_SOURCES:
+        source_docs = [doc for doc in docs if doc.metadata["source"] == source]
+        lexical.replace_source(source, source_docs, [doc.id for doc in source_docs])
+    return db_dir, docs
@@ -0,0 +1,56 @@
+from agents import budget
+from agents.budget import adaptive_k, estimate_tokens, fact_score, pack_blocks, trim_notes
+
+NOTES = [
+    "### Research for: port congestion risks\n"
+    "- Unrelated remark about office furniture.\n"
+    "- Port congestion risks grew in Asia [E1]\n"
+    "- Freight rates doubled [E2]",
+    "### Research for: supplier visibility\n"
+    "- Supplier visibility beyond tier 1 is rare [E3]\n"
+    "- Control towers improve visibility [E4]",
+]
+
+def test_adaptive_k_stays_within_bounds():
+    assert adaptive_k(None, 0, default=5) == 5
+    assert adaptive_k(10 ** 6, 0) == budget.RETRIEVAL_MAX_K
+    assert adaptive_k(100, 90) == budget.RETRIEVAL_MIN_K
+    assert adaptive_k(budget.CHUNK_TOKENS * 4 + 300, 300) == max(budget.RETRIEVAL_MIN_K, min(budget.RETRIEVAL_MAX_K, 4))
+
+def test_pack_blocks_cuts_the_first_block_that_does_not_fit():
+    blocks = ["a" * 400, "b" * 2000, "c" * 400]
+    kept, dropped = pack_blocks(blocks, budget=300)
+    assert kept[0] == blocks[0]
+    assert kept[1].startswith("b") and kept[1].endswith(" ...")
+    assert len("\n".join(kept)) <= 300 * budget.CHARS_PER_TOKEN
+    assert dropped["blocks"] == 1 and dropped["cut"] == 1
+    assert pack_blocks(blocks, None) == (blocks, {"blocks": 0, "cut": 0, "tokens": 0})
+
+def test_fact_score_prefers_cited_on_topic_lines():
+    terms = {"port", "congestion", "risks"}
+    assert fact_score("", terms) < fact_score("- Unrelated remark.", terms)
+    assert fact_score("- Unrelated remark.", terms) < fact_score("- Freight rates doubled [E2]", terms)
+    assert fact_score("- Freight rates doubled [E2]", terms) < fact_score("- Port congestion risks grew [E1]", terms)
+
+def test_trim_notes_drops_the_least_relevant_line_first():
+    full = estimate_tokens("\n\n".join(NOTES))
+    kept, dropped = trim_notes(NOTES, full - 5)
+    assert "Unrelated remark" not in kept[0]
+    assert kept[0].splitlines() == [line for line in NOTES[0].splitlines() if "Unrelated" not in line]
+    assert kept[1] == NOTES[1]
+    assert dropped["lines"] == 1 and dropped["notes"] == 0 and dropped["tokens"] > 0
+
+def test_trim_notes_keeps_every_header_before_dropping_notes():
+    headers = [note.splitlines()[0] for note in NOTES]
+    kept, dropped = trim_notes(NOTES, estimate_tokens("\n\n".join(headers)))
+    assert kept == headers
+    assert dropped["lines"] == 5 and dropped["notes"] == 0
+
+def test_trim_notes_reports_dropped_notes_separately():
+    kept, dropped = trim_notes(NOTES, estimate_tokens(NOTES[0].splitlines()[0]))
+    assert kept == [NOTES[0].splitlines()[0]]
+    assert dropped["notes"] == 1
+    assert dropped["lines"] == 5
+
+def test_trim_notes_without_budget_is_a_no_op():
+    assert trim_notes(NOTES, None) == (NOTES, {"lines": 0, "notes": 0, "tokens": 0})
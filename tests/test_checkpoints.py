@@ -0,0 +1,38 @@
+from typing import TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+import graph
+from graph import prune_checkpoints, run_config, sqlite_checkpointer
+
+class CounterState(TypedDict):
+    count: int
+
+def run_threads(path, count):
+    workflow = StateGraph(CounterState)
+    workflow.add_node("step", lambda state: {"count": state["count"] + 1})
+    workflow.add_edge(START, "step")
+    workflow.add_edge("step", END)
+    compiled = workflow.compile(checkpointer=sqlite_checkpointer(path))
+    for n in range(count):
+        compiled.invoke({"count": 0}, run_config(f"t{n:02d}"))
+
+def thread_ids(saver):
+    return {checkpoint.config["configurable"]["thread_id"] for checkpoint in saver.list(None)}
+
+def test_opening_the_checkpointer_keeps_every_thread(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    run_threads(path, graph.CHECKPOINT_MAX_THREADS + 5)
+    assert len(thread_ids(sqlite_checkpointer(path))) == graph.CHECKPOINT_MAX_THREADS + 5
+
+def test_prune_keeps_the_most_recent_threads(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    run_threads(path, 5)
+    saver = sqlite_checkpointer(path)
+    assert prune_checkpoints(saver, keep=2) == 3
+    assert thread_ids(saver) == {"t03", "t04"}
+
+def test_eval_checkpoints_are_kept_apart_from_the_app():
+    from eval.run_eval import GRAPH_CHECKPOINT_PATH
+
+    assert GRAPH_CHECKPOINT_PATH != graph.CHECKPOINT_PATH
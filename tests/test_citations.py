@@ -0,0 +1,56 @@
+from agents.citations import check_citations, extract_claims, has_uncited_figure, source_matches
+
+EVIDENCE = {
+    "E1": {"chunk_id": "a-00001", "source": "WEF_Resilience_Pulse_Check_2025.pdf", "page": 4, "text": "..."},
+    "E2": {"chunk_id": "b-00007", "source": "DHL Logistics Trend Radar.pdf", "page": 12, "text": "..."},
+}
+NOTES = "### Research for: resilience\n- Leaders prioritise resilience [E1]\n- Control towers spread [E2]"
+
+def test_extract_claims_parses_grouped_citations():
+    draft = (
+        "# Summary\n"
+        "Resilience is the top priority (Source: WEF Resilience Pulse Check 2025, Page 4; "
+        "Source: DHL Logistics Trend Radar, Page 12). Budgets are flat.\n"
+        "Port data was not found in sources."
+    )
+    claims = extract_claims(draft)
+    assert [claim["claim"] for claim in claims] == ["Resilience is the top priority.", "Budgets are flat."]
+    assert claims[0]["citations"] == [
+        {"source": "WEF Resilience Pulse Check 2025", "page": "4"},
+        {"source": "DHL Logistics Trend Radar", "page": "12"},
+    ]
+    assert claims[1]["citations"] == []
+
+def test_source_matches_tolerates_file_name_variants():
+    known = "WEF_Resilience_Pulse_Check_2025.pdf"
+    assert source_matches("WEF Resilience Pulse Check 2025", known)
+    assert source_matches("wef resilience pulse check", known)
+    assert not source_matches("DHL Logistics Trend Radar", known)
+    assert not source_matches("", known)
+
+def test_uncited_figures_are_flagged_outside_tables():
+    assert has_uncited_figure({"claim": "Logistics costs rose 37% year over year.", "citations": []})
+    assert not has_uncited_figure({"claim": "In 2025 leaders focus on resilience.", "citations": []})
+    assert not has_uncited_figure({"claim": "| Map suppliers | Procurement | Q3 | 85% |", "citations": []})
+    assert not has_uncited_figure({"claim": "Costs rose 37%.", "citations": [{"source": "x", "page": "1"}]})
+
+def test_check_citations_matches_against_cited_evidence():
+    draft = (
+        "Resilience leads (Source: WEF Resilience Pulse Check 2025, Page 4).\n"
+        "Control towers spread (Source: DHL Logistics Trend Radar, Page 99).\n"
+        "Tariffs rise (Source: KPMG The Future of Supply Chain, Page 2).\n"
+        "Costs rose 37% last year."
+    )
+    report = check_citations(draft, NOTES, EVIDENCE)
+    statuses = [[c["status"] for c in claim["citations"]] for claim in report["claims"]]
+    assert statuses == [["ok"], ["unknown_page"], ["unknown_source"], []]
+    assert report["citations"] == 3
+    assert report["cited_claims"] == 3
+    assert [claim["claim"] for claim in report["flagged"]] == [
+        "Control towers spread.", "Tariffs rise.", "Costs rose 37% last year."
+    ]
+
+def test_evidence_not_cited_in_notes_does_not_back_a_citation():
+    notes = "### Research for: resilience\n- Leaders prioritise resilience [E1]"
+    report = check_citations("Control towers spread (Source: DHL Logistics Trend Radar, Page 12).", notes, EVIDENCE)
+    assert report["claims"][0]["citations"][0]["status"] == "unknown_source"
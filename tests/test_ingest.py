@@ -0,0 +1,111 @@
+import os
+import random
+
+import pytest
+
+import retrieval.ingest as ingest
+from retrieval.fakes import FakeEmbeddings
+from retrieval.rate_limit import AdaptiveRateLimiter
+from retrieval.vector_index import NumpyVectorIndex
+
+from conftest import CORPUS_WORDS, EMBEDDING_DIM
+
+def write_pdf(path, seed, pages=2):
+    import fitz
+
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    for _ in range(pages):
+        page = pdf.new_page()
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), " ".join(rng.choice(CORPUS_WORDS) for _ in range(300)), fontsize=8)
+    pdf.save(str(path))
+    pdf.close()
+
+def stored_sources():
+    from langchain_chroma import Chroma
+
+    stored = Chroma(persist_directory=ingest.DB_DIR)._collection.get(include=["metadatas"])
+    return sorted({metadata["source"] for metadata in stored["metadatas"]})
+
+def stored_chunks(source):
+    from langchain_chroma import Chroma
+
+    return len(Chroma(persist_directory=ingest.DB_DIR)._collection.get(where={"source": source})["ids"])
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    # ./data is read from the working directory; the store path is made
+    # absolute because Chroma reuses clients by path across tests
+    monkeypatch.chdir(tmp_path)
+    db_dir = str(tmp_path / "chroma_db")
+    monkeypatch.setattr(ingest, "DB_DIR", db_dir)
+    monkeypatch.setattr(ingest, "MANIFEST_PATH", os.path.join(db_dir, "ingest_manifest.json"))
+    monkeypatch.setattr(ingest, "LEXICAL_INDEX_PATH", os.path.join(db_dir, "lexical_index.sqlite"))
+    monkeypatch.setattr(ingest, "VECTOR_INDEX_DIR", os.path.join(db_dir, "vector_index"))
+    os.makedirs("data")
+    write_pdf("data/a.pdf", seed=1)
+    write_pdf("data/b.pdf", seed=2)
+    embeddings = FakeEmbeddings(dim=EMBEDDING_DIM)
+
+    def run(**kwargs):
+        ingest.ingest_documents(embeddings=embeddings, workers=1, limiter=AdaptiveRateLimiter(rate=1000), **kwargs)
+        return ingest.load_manifest()
+    return run, embeddings
+
+def test_first_run_ingests_every_file(workspace):
+    run, embeddings = workspace
+    manifest = run()
+    assert sorted(manifest["files"]) == ["a.pdf", "b.pdf"]
+    assert manifest["params"] == ingest.ingest_params()
+    assert manifest["files"]["a.pdf"]["sha256"] == ingest.file_sha256("data/a.pdf")
+    assert stored_sources() == ["a.pdf", "b.pdf"]
+    index = NumpyVectorIndex(ingest.VECTOR_INDEX_DIR)
+    assert len(index) == embeddings.texts == sum(entry["chunks"] for entry in manifest["files"].values())
+
+def test_unchanged_files_are_not_embedded_again(workspace):
+    run, embeddings = workspace
+    first = run()
+    texts = embeddings.texts
+    assert run() == first
+    assert embeddings.texts == texts
+
+def test_changed_added_and_removed_files_are_synced(workspace):
+    run, embeddings = workspace
+    first = run()
+    texts = embeddings.texts
+    write_pdf("data/a.pdf", seed=3)
+    os.remove("data/b.pdf")
+    write_pdf("data/c.pdf", seed=4)
+    manifest = run()
+
+    assert sorted(manifest["files"]) == ["a.pdf", "c.pdf"]
+    assert manifest["files"]["a.pdf"]["sha256"] != first["files"]["a.pdf"]["sha256"]
+    assert stored_sources() == ["a.pdf", "c.pdf"]
+    # Only the changed and the new file were embedded
+    assert embeddings.texts - texts == manifest["files"]["a.pdf"]["chunks"] + manifest["files"]["c.pdf"]["chunks"]
+    assert len(NumpyVectorIndex(ingest.VECTOR_INDEX_DIR)) == manifest["files"]["a.pdf"]["chunks"] + manifest["files"]["c.pdf"]["chunks"]
+
+def test_changed_params_reprocess_every_file(workspace, monkeypatch):
+    run, embeddings = workspace
+    run()
+    texts = embeddings.texts
+    monkeypatch.setattr(ingest, "CHUNK_SIZE", 1500)
+    manifest = run()
+    assert manifest["params"]["chunk_size"] == 1500
+    assert sorted(manifest["files"]) == ["a.pdf", "b.pdf"]
+    assert embeddings.texts - texts == sum(entry["chunks"] for entry in manifest["files"].values())
+
+def test_identical_files_under_two_names_keep_their_own_chunks(workspace):
+    import shutil
+
+    run, _ = workspace
+    shutil.copy("data/a.pdf", "data/copy of a.pdf")
+    manifest = run()
+    chunks = manifest["files"]["a.pdf"]["chunks"]
+    assert manifest["files"]["copy of a.pdf"]["chunks"] == chunks
+    assert stored_chunks("a.pdf") == chunks and stored_chunks("copy of a.pdf") == chunks
+
+    # Removing the copy leaves the original's chunks in place
+    os.remove("data/copy of a.pdf")
+    run()
+    assert stored_chunks("a.pdf") == chunks and stored_chunks("copy of a.pdf") == 0
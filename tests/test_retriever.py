@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import retrieval.retriever as retriever_module
+from retrieval.embedding_cache import EmbeddingCache
+from retrieval.fakes import FakeEmbeddings
+from retrieval.retriever import (
+    Retriever, join_overlapping, match_sources, max_marginal_relevance, merge_adjacent
+)
+from retrieval.vector_index import build_from_chroma
+
+from conftest import CORPUS_SOURCES, EMBEDDING_DIM
+
+def make_retriever(db_dir, tmp_path, **kwargs):
+    retriever = Retriever("offline-tests", db_dir=db_dir, **kwargs)
+    retriever.embeddings.embeddings = FakeEmbeddings(dim=EMBEDDING_DIM)
+    retriever.embeddings.cache = EmbeddingCache(path=str(tmp_path / "embeddings.sqlite"))
+    return retriever
+
+def test_match_sources_by_exact_name_or_substring():
+    available = ["WEF Resilience Pulse Check 2025.pdf", "WEF Global Value Chains.pdf", "DHL Logistics Trend Radar.pdf"]
+    assert match_sources(["wef resilience pulse check 2025"], available) == ["WEF Resilience Pulse Check 2025.pdf"]
+    assert match_sources(["WEF"], available) == available[:2]
+    assert match_sources(["Gartner", ""], available) == []
+
+def test_mmr_skips_near_duplicates():
+    base = np.eye(4, dtype=np.float32)
+    duplicate = base[0] + 0.01 * base[1]
+    vectors = [base[0], duplicate, base[1], base[2], base[3]]
+    assert max_marginal_relevance(vectors, 3, lambda_mult=0.5) == [0, 2, 3]
+    # Relevance only: the plain ranking
+    assert max_marginal_relevance(vectors, 3, lambda_mult=1.0) == [0, 1, 2]
+
+def test_mmr_never_penalizes_candidates_without_embeddings():
+    base = np.eye(3, dtype=np.float32)
+    assert max_marginal_relevance([base[0], None, base[0], base[1]], 2, lambda_mult=0.5) == [0, 1]
+    assert max_marginal_relevance([None, None], 1) == [0]
+
+def test_merge_adjacent_joins_consecutive_splits_without_overlap():
+    overlap = "shared overlap text between splits"
+    meta = {"source": "a.pdf", "page": 1}
+    docs = [
+        Document(id="f00d-00003", page_content=f"{overlap} and the tail", metadata=meta),
+        Document(id="beef-00001", page_content="other file", metadata=meta),
+        Document(id="f00d-00002", page_content=f"first part {overlap}", metadata=meta),
+    ]
+    merged = merge_adjacent(docs)
+    assert [doc.id for doc in merged] == ["f00d-00002+f00d-00003", "beef-00001"]
+    assert merged[0].page_content == join_overlapping(docs[2].page_content, docs[0].page_content)
+    assert merged[0].page_content == f"first part {overlap} and the tail"
+    assert join_overlapping("abc", "xyz") == "abc\nxyz"
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_source_filter_restricts_results(corpus, tmp_path, backend):
+    db_dir, _ = corpus
+    if backend == "numpy":
+        build_from_chroma(db_dir)
+    retriever = make_retriever(db_dir, tmp_path, mode="vector", backend=backend)
+    target = CORPUS_SOURCES[1]
+    docs = retriever.search("port congestion risk", k=3, sources=[target])
+    assert len(docs) == 3
+    assert {doc.metadata["source"] for doc in docs} == {target}
+
+def test_filter_matching_nothing_retries_all_sources(corpus, tmp_path):
+    db_dir, _ = corpus
+    retriever = make_retriever(db_dir, tmp_path, mode="vector")
+    docs = retriever.search("port congestion risk", k=3, sources=["Unknown report.pdf"])
+    assert len(docs) == 3
+
+@pytest.mark.parametrize("backend", ["chroma", "numpy"])
+def test_mmr_rerank_returns_k_distinct_candidates(corpus, tmp_path, backend):
+    db_dir, _ = corpus
+    if backend == "numpy":
+        build_from_chroma(db_dir)
+    plain = make_retriever(db_dir, tmp_path, mode="vector", backend=backend, rerank="none")
+    diverse = make_retriever(db_dir, tmp_path, mode="vector", backend=backend, rerank="mmr")
+    query = "supplier visibility and digital twin"
+    top = plain.search(query, k=4)
+    picked = diverse.search(query, k=4)
+    assert len(picked) == 4 and len({doc.id for doc in picked}) == 4
+    # MMR always keeps the best-ranked candidate
+    assert picked[0].id == top[0].id
+
+def test_query_cache_can_be_bypassed(corpus, tmp_path, monkeypatch):
+    db_dir, _ = corpus
+    retriever = make_retriever(db_dir, tmp_path, mode="vector")
+    retriever.embed_query("inventory risk")
+    retriever.embed_query("inventory risk")
+    assert retriever.embeddings.embeddings.calls == 1
+    monkeypatch.setattr(retriever_module, "QUERY_CACHE_ENABLED", False)
+    retriever.embed_query("inventory risk")
+    assert retriever.embeddings.embeddings.calls == 2
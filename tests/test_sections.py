@@ -0,0 +1,19 @@
+from agents.sections import assemble, parse_sections, render_with_markers, sections_named_in
+
+NAMES = ["title", "summary", "email", "actions", "sources"]
+
+def test_sections_round_trip_through_markers():
+    sections = {"title": "# Briefing", "summary": "Resilience leads.", "email": "Subject: Findings"}
+    assert parse_sections(render_with_markers(sections)) == sections
+    assert assemble(sections) == "# Briefing\n\nResilience leads.\n\nSubject: Findings"
+
+def test_only_tagged_sections_are_named():
+    critique = "REVISE: [summary] The 37% figure has no citation. [actions] Owners are missing."
+    assert sections_named_in(critique, NAMES) == ["summary", "actions"]
+
+def test_untagged_words_do_not_name_sections():
+    assert sections_named_in("REVISE: [summary] The summary's subject is unclear.", NAMES) == ["summary"]
+    assert sections_named_in("REVISE: the summary's subject is unclear; check the sources.", NAMES) == []
+
+def test_tags_outside_available_sections_are_ignored():
+    assert sections_named_in("REVISE: [email] Tone. [E3] is miscited.", ["summary"]) == []
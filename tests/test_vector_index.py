@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pytest
+
+from retrieval.vector_index import CURRENT_FILE, NumpyVectorIndex, build_vector_index, current_dir, quantize
+
+def random_vectors(count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def build(index_dir, vectors, quantization="none", sources=("a.pdf", "b.pdf", "c.pdf")):
+    ids = [f"c{i:03d}" for i in range(len(vectors))]
+    metadatas = [{"source": sources[i % len(sources)], "page": i} for i in range(len(vectors))]
+    build_vector_index(ids, vectors.tolist(), [f"text of {chunk_id}" for chunk_id in ids], metadatas,
+                       index_dir=str(index_dir), quantization=quantization)
+    return NumpyVectorIndex(str(index_dir), rerank_candidates=20)
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantize_keeps_vectors_close(quantization):
+    vectors = random_vectors(50)
+    matrix, scales = quantize(vectors, quantization)
+    restored = matrix.astype(np.float32) * (scales[:, None] if scales is not None else 1.0)
+    assert np.abs(restored - vectors).max() < 0.01
+    assert (scales is not None) == (quantization == "int8")
+
+def test_quantize_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        quantize(random_vectors(2), "int4")
+
+@pytest.mark.parametrize("quantization", ["none", "float16", "int8"])
+def test_top_k_matches_exact_ranking(tmp_path, quantization):
+    vectors = random_vectors(300)
+    index = build(tmp_path / "index", vectors, quantization)
+    queries = vectors[:10] + 0.1 * random_vectors(10, seed=1)
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :5]
+    ids = [[index.document(row).id for row in rows] for rows, _ in index.top_k(queries, k=5)]
+    assert ids == [[f"c{row:03d}" for row in rows] for rows in exact]
+
+def test_search_many_returns_documents_with_metadata(tmp_path):
+    vectors = random_vectors(30)
+    index = build(tmp_path / "index", vectors)
+    (doc, *_), = index.search_many(vectors[4:5], k=3)
+    assert (doc.id, doc.page_content, doc.metadata) == ("c004", "text of c004", {"source": "b.pdf", "page": 4})
+
+def test_source_filter_scans_only_that_partition(tmp_path):
+    index = build(tmp_path / "index", random_vectors(60))
+    assert sum(part.stop - part.start for part in index.partitions(["b.pdf"])) == 20
+    assert index.partitions(["missing.pdf"]) == []
+    results = index.search_many(random_vectors(3, seed=2), k=5, sources=["b.pdf", "c.pdf"])
+    assert all(doc.metadata["source"] in ("b.pdf", "c.pdf") for docs in results for doc in docs)
+    assert index.search_many(random_vectors(1, seed=2), k=5, sources=["missing.pdf"]) == [[]]
+
+def test_int8_rerank_reads_full_precision_scores(tmp_path):
+    vectors = random_vectors(100)
+    index = build(tmp_path / "index", vectors, "int8")
+    (rows, scores), = index.top_k(vectors[7], k=1)
+    assert index.document(rows[0]).id == "c007"
+    assert scores[0] == pytest.approx(1.0, abs=1e-5)
+
+def test_reexport_swaps_in_a_new_version(tmp_path):
+    index_dir = tmp_path / "index"
+    index = build(index_dir, random_vectors(30), "int8")
+    first = current_dir(str(index_dir))
+    assert len(index) == 30 and index.quantization == "int8"
+
+    build(index_dir, random_vectors(40, seed=3), "none")
+    assert current_dir(str(index_dir)) != first
+    assert not os.path.exists(first)
+    assert sorted(os.listdir(index_dir)) == sorted([CURRENT_FILE, os.path.basename(current_dir(str(index_dir)))])
+    # The open handle picks up the new version on its next search
+    assert len(index) == 40 and index.quantization == "none"
+
+def test_vectors_for_returns_stored_rows(tmp_path):
+    vectors = random_vectors(12)
+    index = build(tmp_path / "index", vectors)
+    found = index.vectors_for(["c003", "missing"])
+    assert list(found) == ["c003"]
+    assert np.allclose(found["c003"], vectors[3])
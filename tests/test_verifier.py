@@ -0,0 +1,31 @@
+from agents.sections import render_with_markers, section_hash
+
+EVIDENCE = {"E1": {"chunk_id": "a-00001", "source": "WEF Resilience Pulse Check 2025.pdf", "page": 4, "text": "..."}}
+NOTES = ["### Research for: resilience\n- Leaders prioritise resilience [E1]"]
+CITED = "Leaders prioritise resilience (Source: WEF Resilience Pulse Check 2025, Page 4)."
+
+def verifier_state(sections, approved=()):
+    return {
+        "task": "resilience briefing",
+        "draft": render_with_markers(sections),
+        "draft_sections": sections,
+        "section_approvals": {name: section_hash(sections[name]) for name in approved},
+        "research_notes": NOTES,
+        "evidence": EVIDENCE,
+    }
+
+def test_changed_section_with_valid_citations_is_approved_locally(fake_llm):
+    from agents.verifier import verifier_node
+
+    result = verifier_node(verifier_state({"summary": CITED}))
+    assert result["verification"]["method"] == "local"
+    assert fake_llm.stats["calls"] == 0
+
+def test_uncited_rewrite_is_not_vouched_for_by_approved_sections(fake_llm):
+    from agents.verifier import verifier_node
+
+    sections = {"summary": CITED, "email": "Subject: Findings\n\nHi team, resilience is the priority."}
+    result = verifier_node(verifier_state(sections, approved=["summary"]))
+    assert result["verification"]["sections_checked"] == ["email"]
+    assert result["verification"]["method"] == "llm_full"
+    assert fake_llm.stats["calls"] == 1
@@ -0,0 +1,392 @@
+"""
+Span-level tracing for graph runs.
+
+Code under measurement opens nested spans:
+
+    with span("vector_search", kind="retrieval", queries=3) as s:
+        ...
+        s.set(results=15)
+
+Spans nest through a context variable, so a node span started by the graph
+parents the retrieval, embedding and LLM spans opened inside it (worker
+threads must be started with contextvars.copy_context().run to inherit it).
+Every finished span is
+
+- appended to TRACE_FILE as one JSON line (rotated by size, keeping
+  TRACE_FILE_BACKUPS older files: traces.jsonl.1, traces.jsonl.2, ...),
+- folded into process-wide Prometheus counters/histograms, served as text
+  by start_metrics_server() (or rendered with render_prometheus()),
+- kept in memory per trace, so a caller that opened the root span can
+  fetch the whole tree with trace_spans() and build its tables from it
+  (node_summary, trace_summary).
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CACHE_DIR = os.environ.get("CACHE_DIR", "./.cache")
+# JSONL export of every finished span; set TRACE_FILE= (empty) to disable
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(CACHE_DIR, "traces.jsonl"))
+# Size at which the JSONL file is rotated, and rotated files kept
+TRACE_FILE_MAX_MB = float(os.environ.get("TRACE_FILE_MAX_MB", "20"))
+TRACE_FILE_BACKUPS = int(os.environ.get("TRACE_FILE_BACKUPS", "2"))
+# Prometheus text endpoint, started by the app and eval runner when set
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# Finished traces kept in memory for trace_spans()
+TRACE_BUFFER = int(os.environ.get("TRACE_BUFFER", "256"))
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """
+    One timed operation. `node` is the graph node the span runs under, so
+    LLM and retrieval metrics can be broken down per agent.
+    """
+
+    def __init__(self, name, kind, parent=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.node = name if kind == "node" else (parent.node if parent else None)
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.error = None
+        self.start = time.time()
+        self.duration = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "node": self.node,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+def current_span():
+    return _current.get()
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """
+    Times the enclosed block as a child of the current span (or as the root
+    of a new trace). Exceptions mark the span as failed and propagate.
+    """
+    parent = _current.get()
+    current = Span(name, kind, parent, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - current._start
+        _current.reset(token)
+        _recorder.record(current)
+
+def event(name, kind="event", **attributes):
+    """
+    Records a zero-duration span (a decision or outcome worth counting).
+    """
+    with span(name, kind, **attributes):
+        pass
+
+def traced_node(name, node):
+    """
+    Wraps a graph node so every execution runs inside a "node" span.
+    """
+    def run(state):
+        with span(name, kind="node") as node_span:
+            update = node(state)
+            # The node's own verdict on its run ("Success", "Blocked", ...)
+            statuses = [m["status"] for m in (update or {}).get("metrics", []) if "status" in m]
+            if statuses:
+                node_span.set(outcome=statuses[-1])
+            return update
+    run.__name__ = getattr(node, "__name__", name)
+    return run
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+class MetricsRegistry:
+    """
+    Process-wide aggregates over finished spans, in Prometheus text format.
+    """
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def _inc(self, metric, labels, value=1):
+        key = (metric, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, record):
+        labels = {"name": record.name, "kind": record.kind, "node": record.node or ""}
+        with self._lock:
+            self._inc("copilot_spans_total", {**labels, "status": record.status})
+            key = tuple(sorted(labels.items()))
+            histogram = self._histograms.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if record.duration <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += record.duration
+            histogram["count"] += 1
+
+            attributes = record.attributes
+            node = {"node": record.node or ""}
+            for direction in ("input", "output"):
+                if attributes.get(f"{direction}_tokens"):
+                    self._inc("copilot_llm_tokens_total", {**node, "direction": direction}, attributes[f"{direction}_tokens"])
+            if record.kind == "speculation":
+                self._inc("copilot_speculation_total", {"outcome": attributes.get("outcome", "")})
+                if attributes.get("wasted_tokens"):
+                    self._inc("copilot_speculation_wasted_tokens_total", {}, attributes["wasted_tokens"])
+            if "cache_hit" in attributes:
+                self._inc("copilot_cache_lookups_total", {"name": record.name, **node})
+                if attributes["cache_hit"]:
+                    self._inc("copilot_cache_hits_total", {"name": record.name, **node})
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        seen = set()
+        for (metric, labels), value in counters:
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{{{_labels(labels)}}} {value}")
+        if histograms:
+            lines.append("# TYPE copilot_span_duration_seconds histogram")
+        for labels, histogram in histograms:
+            for bound, count in zip(self.buckets, histogram["buckets"]):
+                lines.append(f'copilot_span_duration_seconds_bucket{{{_labels(labels)},le="{bound}"}} {count}')
+            lines.append(f'copilot_span_duration_seconds_bucket{{{_labels(labels)},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"copilot_span_duration_seconds_sum{{{_labels(labels)}}} {histogram['sum']:.6f}")
+            lines.append(f"copilot_span_duration_seconds_count{{{_labels(labels)}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+class SpanRecorder:
+    """
+    Sink for finished spans: JSONL export, metrics and the in-memory trace
+    buffer. Safe to use from any thread.
+    """
+
+    def __init__(self, path=TRACE_FILE, buffer=TRACE_BUFFER,
+                 max_bytes=int(TRACE_FILE_MAX_MB * 1024 * 1024), backups=TRACE_FILE_BACKUPS):
+        self.path = path
+        self.buffer = buffer
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.metrics = MetricsRegistry()
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+        self._file = None
+        self._size = 0
+
+    def _rotate(self):
+        """
+        Shifts traces.jsonl -> .1 -> .2 ..., dropping the oldest beyond
+        `backups` (with none, the file just starts over).
+        """
+        self._file.close()
+        self._file = None
+        for n in range(self.backups, 0, -1):
+            source = self.path if n == 1 else f"{self.path}.{n - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{n}")
+        if not self.backups:
+            os.remove(self.path)
+
+    def record(self, record):
+        self.metrics.observe(record)
+        data = record.to_dict()
+        with self._lock:
+            spans = self._traces.setdefault(record.trace_id, [])
+            self._traces.move_to_end(record.trace_id)
+            spans.append(data)
+            while len(self._traces) > self.buffer:
+                self._traces.popitem(last=False)
+            if self.path:
+                try:
+                    if self._file is not None and self._size >= self.max_bytes:
+                        self._rotate()
+                    if self._file is None:
+                        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                        self._file = open(self.path, "a")
+                        self._size = self._file.tell()
+                    line = json.dumps(data, default=str) + "\n"
+                    self._file.write(line)
+                    self._file.flush()
+                    self._size += len(line)
+                except OSError as e:
+                    # Tracing must never break a run
+                    print(f"  ! Trace export disabled: {e}")
+                    self.path = None
+
+    def spans(self, trace_id):
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+_recorder = SpanRecorder()
+
+def trace_spans(trace_id):
+    """
+    Finished spans of a trace (dicts as exported), in start order. Served
+    from the in-memory buffer of the last TRACE_BUFFER traces; the JSONL
+    file is only written, never read back.
+    """
+    return sorted(_recorder.spans(trace_id), key=lambda s: s["start"])
+
+def render_prometheus():
+    return _recorder.metrics.render()
+
+def _sum(spans, kind, field=None):
+    if field is None:
+        return sum(s["duration"] for s in spans if s["kind"] == kind)
+    return sum(s["attributes"].get(field, 0) or 0 for s in spans if s["kind"] == kind)
+
+def _outermost(spans, kind):
+    # Nested spans of the same kind (retrieval inside retrieval) count once
+    ids = {s["span_id"] for s in spans if s["kind"] == kind}
+    return [s for s in spans if s["kind"] == kind and s["parent_id"] not in ids]
+
+def node_summary(spans):
+    """
+    One row per node execution, in run order: wall-clock latency plus the
+    time its LLM, retrieval and embedding spans took, and its token and
+    cache figures. Child spans may overlap (parallel research steps), so
+    their times can add up to more than the node's latency.
+    """
+    by_id = {s["span_id"]: s for s in spans}
+    children = {}
+    for s in spans:
+        parent = by_id.get(s["parent_id"])
+        while parent is not None and parent["kind"] != "node":
+            parent = by_id.get(parent["parent_id"])
+        if parent is not None:
+            children.setdefault(parent["span_id"], []).append(s)
+    rows = []
+    for s in spans:
+        if s["kind"] != "node":
+            continue
+        inner = children.get(s["span_id"], [])
+        llm = [c for c in inner if c["kind"] == "llm"]
+        input_tokens = sum(c["attributes"].get("input_tokens", 0) for c in llm)
+        output_tokens = sum(c["attributes"].get("output_tokens", 0) for c in llm)
+        rows.append({
+            "agent": s["name"].capitalize(),
+            "status": s["attributes"].get("outcome", "Success") if s["status"] == "ok" else "Error",
+            "latency": s["duration"],
+            "llm_calls": len(llm),
+            "llm_latency": _sum(llm, "llm"),
+            "retrieval_latency": _sum(_outermost(inner, "retrieval"), "retrieval"),
+            "embedding_latency": _sum(inner, "embedding"),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cache_hits": sum(1 for c in llm if c["attributes"].get("cache_hit")),
+        })
+    return rows
+
+def span_tree(spans):
+    """
+    Spans in depth-first order with their nesting depth, for display.
+    """
+    children = {}
+    for s in spans:
+        children.setdefault(s["parent_id"], []).append(s)
+    ids = {s["span_id"] for s in spans}
+    rows = []
+
+    def visit(s, depth):
+        rows.append({**s, "depth": depth})
+        for child in children.get(s["span_id"], []):
+            visit(child, depth + 1)
+
+    for s in spans:
+        # Roots, plus spans whose parent fell outside the trace buffer
+        if s["parent_id"] is None or s["parent_id"] not in ids:
+            visit(s, 0)
+    return rows
+
+def trace_summary(spans):
+    """
+    Whole-run totals for a trace (eval rows, benchmarks).
+    """
+    rows = node_summary(spans)
+    llm = [s for s in spans if s["kind"] == "llm"]
+    return {
+        "latency": sum(s["duration"] for s in spans if s["parent_id"] is None),
+        "llm_calls": len(llm),
+        "llm_latency": _sum(llm, "llm"),
+        "retrieval_latency": _sum(_outermost(spans, "retrieval"), "retrieval"),
+        "embedding_latency": _sum(spans, "embedding"),
+        "input_tokens": sum(row["input_tokens"] for row in rows),
+        "output_tokens": sum(row["output_tokens"] for row in rows),
+        "total_tokens": sum(row["total_tokens"] for row in rows),
+        "llm_cache_hits": sum(row["cache_hits"] for row in rows),
+    }
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=METRICS_PORT, host="0.0.0.0"):
+    """
+    Serves render_prometheus() at http://host:port/metrics from a daemon
+    thread. Idempotent; returns the server (None when port is 0).
+    """
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+            print(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return _server